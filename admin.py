@@ -1,7 +1,18 @@
-from flask import Blueprint, request, jsonify
+from contextlib import nullcontext
+from math import ceil
+
+from flask import Blueprint, Response, current_app, request, jsonify, stream_with_context
+from sqlalchemy import func, select
+from sqlalchemy.orm import selectinload
 from flask_jwt_extended import jwt_required, get_jwt_identity
-from models.user import User
+from models.user import db, User
 from models.transaction import Transaction
+from services.ledger_projection import balances_at, ledger_snapshot, project
+from services.sharding import is_sharded, shard_scope, unavailable_when_sharded
+from services.stats_service import StatsService
+from services.user_service import UserService
+from services.balance_service import BalanceService
+from services.export_service import ExportService, EXPORT_FORMATS
 
 
 admin_bp = Blueprint('admin', __name__, url_prefix='/admin')
@@ -16,25 +27,26 @@ def get_all_users():
     if not user or not user.is_admin:
         return jsonify({"message": "Access forbidden: Admins only"}), 403
 
-    users = User.query.all()
-    return jsonify({
-        "users": [
-            {
-                "id": u.id,
-                "username": u.username,
-                "email": u.email,
-                "balances": [
-                    {
-                        "currency": balance.currency,
-                        "balance": round(balance.balance, 2)
-                    } for balance in u.balances
-                ],
-                "is_admin": u.is_admin,
-                "created_at": u.created_at.isoformat()
-            }
-            for u in users
-        ]
-    }), 200
+    is_admin = request.args.get('is_admin')
+    if is_admin is not None:
+        is_admin = is_admin.lower() in ('1', 'true', 'yes')
+
+    result, status_code = UserService.search_users(
+        q=request.args.get('q'),
+        username=request.args.get('username'),
+        email=request.args.get('email'),
+        created_from=request.args.get('created_from'),
+        created_to=request.args.get('created_to'),
+        is_admin=is_admin,
+        min_balance=request.args.get('min_balance', type=float),
+        max_balance=request.args.get('max_balance', type=float),
+        currency=request.args.get('currency'),
+        sort=request.args.get('sort', default='id'),
+        order=request.args.get('order', default='asc'),
+        limit=request.args.get('limit', type=int),
+        cursor=request.args.get('cursor')
+    )
+    return jsonify(result), status_code
 
 @admin_bp.route('/transactions', methods=['GET'])
 @jwt_required()
@@ -47,129 +59,105 @@ def get_all_transactions_by_id():
         return jsonify({"message": "Access forbidden: Admins only"}), 403
 
     user_id = request.args.get('user_id', type=int)
-    page = request.args.get('page', default=1, type=int)
-    page_size = request.args.get('page_size', default=20, type=int)
+    # Without a user the page would come from the primary, whose ledger is empty once sharded
+    if not user_id and is_sharded():
+        response, status = unavailable_when_sharded()
+        return jsonify(response), status
 
-    query = Transaction.query
+    page = max(request.args.get('page', default=1, type=int), 1)
+    page_size = request.args.get('page_size', default=20, type=int)
+    if page_size < 1:
+        page_size = 20
 
+    statement = select(Transaction).options(selectinload(Transaction.user), selectinload(Transaction.target_user))
+    count = select(func.count(Transaction.id))
     if user_id:
-        query = query.filter(
-            (Transaction.user_id == user_id) | (Transaction.target_user_id == user_id)
-        )
+        involved = (Transaction.user_id == user_id) | (Transaction.target_user_id == user_id)
+        statement = statement.where(involved)
+        count = count.where(involved)
 
-    pagination = query.order_by(Transaction.created_at.asc()).paginate(page=page, per_page=page_size, error_out=False)
-    transactions = pagination.items
+    with shard_scope(user_id) if user_id else nullcontext(), ledger_snapshot():
+        total = db.session.scalar(count)
 
-    transactions_response = []
-
-    usd_balance = 0 
-    eur_balance = 0
-    
-
-   
-    for t in transactions:  
-        sender = User.query.get(t.user_id)
-        receiver = User.query.get(t.target_user_id) if t.target_user_id else None
-
-      
-        if t.type == "transfer":
-            if user_id:  
-                if t.user_id == user_id:
-                    status = "debited"
-                elif t.target_user_id == user_id:
-                    status = "credited"
-                else:
-                    status = "debited"  
+        # Page 1 holds the oldest rows and each page is shown newest first. The
+        # page is read from whichever end of the ledger is closer, so the first
+        # pages do not skip over all the newer rows
+        start = (page - 1) * page_size
+        end = min(start + page_size, total)
+        transactions = []
+        if start < end:
+            if start <= total - end:
+                transactions = db.session.scalars(
+                    statement.order_by(Transaction.seq).offset(start).limit(end - start)
+                ).all()
             else:
-                status = "debited"  
-        else:
-            status = "credited" if t.type == "top_up" else "debited"
-
-        transaction_obj = {
-            "id": t.id,
-            "type": t.type,
-            "amount": round(t.amount, 2),
-            "currency": t.currency,
-            "currency_symbol": t.currency_symbol,
-            "timestamp": t.created_at.isoformat(),
-            "status": status,
-        }
-
-       
-        if t.type == "transfer":
-            if status == "debited":
-                if receiver:
-                    transaction_obj["target_user"] = {
-                        "target_user_id": receiver.id,
-                        "target_username": receiver.username
-                    }
-                    transaction_obj["to"] = f"{t.amount:.2f}{t.currency_symbol}"
-                else:
-                    transaction_obj["to"] = "-"
-            elif status == "credited":
-                if sender:
-                    transaction_obj["received_from"] = sender.username
-                    transaction_obj["received_from_id"] = sender.id
-                    transaction_obj["to"] = f"{t.amount:.2f}{t.currency_symbol}"
-                else:
-                    transaction_obj["to"] = "-"
-
-        elif t.type == "top_up":
-            transaction_obj["to"] = "-"
-
-        elif t.type == "exchange":
-            transaction_obj["to"] = "-"
-            transaction_obj["currency_from"] = t.currency_from
-            transaction_obj["currency_to"] = t.currency_to
-            transaction_obj["converted_amount"] = round(t.converted_amount, 2) if t.converted_amount else None
-
-        # Update balance
-        if t.type == "exchange":
-            if t.currency_from == "USD" and t.currency_to == "EUR":
-                usd_balance -= t.amount
-                eur_balance += t.converted_amount
-            elif t.currency_from == "EUR" and t.currency_to == "USD":
-                eur_balance -= t.amount
-                usd_balance += t.converted_amount
-        else:
-            if t.currency == "USD":
-                if status == "credited":
-                    usd_balance += t.amount
-                elif status == "debited":
-                    usd_balance -= t.amount
-            elif t.currency == "EUR":
-                if status == "credited":
-                    eur_balance += t.amount
-                elif status == "debited":
-                    eur_balance -= t.amount
-
-        # Set correct balance according to transaction currency
-        if t.type == "exchange":
-            if t.currency_to == "USD":
-                transaction_obj["balance"] = round(usd_balance, 2)
-            elif t.currency_to == "EUR":
-                transaction_obj["balance"] = round(eur_balance, 2)
-        else:
-            if t.currency == "USD":
-                transaction_obj["balance"] = round(usd_balance, 2)
-            elif t.currency == "EUR":
-                transaction_obj["balance"] = round(eur_balance, 2)
-
-        transactions_response.append(transaction_obj)
-
-    # Reverse back because you reversed to calculate balance
-    transactions_response = list(reversed(transactions_response))
+                transactions = db.session.scalars(
+                    statement.order_by(Transaction.seq.desc()).offset(total - end).limit(end - start)
+                ).all()[::-1]
+
+        # The running balance of the whole ledger would sum every row before the
+        # page, it is only shown for a user, whose sum is one indexed lookup
+        opening = balances_at(user_id, transactions[0].seq) if user_id and transactions else {}
+        transactions_response = [
+            _admin_transaction_entry(t, status, balances if user_id else None)
+            for t, status, balances in project(transactions, user_id, opening)
+        ][::-1]
 
     return jsonify({
         "transactions": transactions_response,
-        "total": pagination.total,
-        "page": pagination.page,
-        "pages": pagination.pages,
+        "total": total,
+        "page": page,
+        "pages": ceil(total / page_size),
         "user_id": user_id,
         "username": User.query.get(user_id).username if user_id else None
     }), 200
 
 
+def _admin_transaction_entry(t, status, balances):
+    transaction_obj = {
+        "id": t.id,
+        "type": t.type,
+        "amount": round(t.amount, 2),
+        "currency": t.currency,
+        "currency_symbol": t.currency_symbol,
+        "timestamp": t.created_at.isoformat(),
+        "status": status,
+    }
+
+    if t.type == "transfer":
+        if status == "debited":
+            if t.target_user:
+                transaction_obj["target_user"] = {
+                    "target_user_id": t.target_user.id,
+                    "target_username": t.target_user.username
+                }
+                transaction_obj["to"] = f"{t.amount:.2f}{t.currency_symbol}"
+            else:
+                transaction_obj["to"] = "-"
+        elif status == "credited":
+            if t.user:
+                transaction_obj["received_from"] = t.user.username
+                transaction_obj["received_from_id"] = t.user.id
+                transaction_obj["to"] = f"{t.amount:.2f}{t.currency_symbol}"
+            else:
+                transaction_obj["to"] = "-"
+
+    elif t.type == "exchange":
+        transaction_obj["to"] = "-"
+        transaction_obj["currency_from"] = t.currency_from
+        transaction_obj["currency_to"] = t.currency_to
+        transaction_obj["converted_amount"] = round(t.converted_amount, 2) if t.converted_amount else None
+
+    else:
+        transaction_obj["to"] = "-"
+
+    # Exchanges show the balance of the currency bought
+    currency = t.currency_to if t.type == "exchange" else t.currency
+    transaction_obj["balance"] = round(balances.get(currency, 0.0), 2) if balances is not None else None
+
+    return transaction_obj
+
+
 
 @admin_bp.route('/user/<int:id>', methods=['GET'])
 @jwt_required()
@@ -190,12 +178,165 @@ def get_user_by_id_admin(id):
         "email": user.email,
         "balances": [
             {
-                "currency": balance.currency,
-                "balance": round(balance.balance, 2)
-            } for balance in user.balances
+                "currency": wallet.currency,
+                "balance": round(wallet.balance, 2)
+            } for wallet in BalanceService.wallets(user.id)
         ],
         "is_admin": user.is_admin,
         "created_at": user.created_at.isoformat()
     }), 200
 
 
+# POST so that hundreds of ids fit in the body instead of the query string
+@admin_bp.route('/balances', methods=['POST'])
+@jwt_required()
+def get_balances():
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"message": "Request body must be a JSON object"}), 400
+
+    response, status = BalanceService.batch(data.get('user_ids'), data.get('currencies'))
+    return jsonify(response), status
+
+
+@admin_bp.route('/user/<int:id>/balance-slots', methods=['PUT'])
+@jwt_required()
+def set_balance_slots(id):
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    user = User.query.get(id)
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    data = request.get_json() or {}
+    if not isinstance(data, dict):
+        return jsonify({"message": "Request body must be a JSON object"}), 400
+
+    response, status = BalanceService.set_slots(user, data.get('slots'))
+    return jsonify(response), status
+
+
+@admin_bp.route('/user/<int:id>/logout', methods=['POST'])
+@jwt_required()
+def force_logout(id):
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    user = User.query.get(id)
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    current_app.extensions["token_revocation"].revoke_user(user.id)
+
+    return jsonify({"message": f"All sessions of {user.username} were revoked"}), 200
+
+
+@admin_bp.route('/stats', methods=['GET'])
+@jwt_required()
+def get_stats():
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    result, status_code = StatsService.get_stats(
+        start=request.args.get('start'),
+        end=request.args.get('end'),
+        group_by=request.args.get('group_by'),
+        transaction_type=request.args.get('type'),
+        currency=request.args.get('currency')
+    )
+    return jsonify(result), status_code
+
+
+
+@admin_bp.route('/export/users', methods=['GET'])
+@jwt_required()
+def export_users():
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    export_format = request.args.get('format', default='csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"message": "format must be csv or ndjson"}), 400
+    if is_sharded():
+        # Exports stream from the primary only
+        response, status = unavailable_when_sharded()
+        return jsonify(response), status
+
+    return Response(
+        stream_with_context(ExportService.stream_users(export_format)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=users.{export_format}"}
+    )
+
+
+@admin_bp.route('/export/transactions', methods=['GET'])
+@jwt_required()
+def export_transactions():
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    export_format = request.args.get('format', default='csv')
+    if export_format not in EXPORT_FORMATS:
+        return jsonify({"message": "format must be csv or ndjson"}), 400
+    if is_sharded():
+        # Exports stream from the primary only
+        response, status = unavailable_when_sharded()
+        return jsonify(response), status
+
+    user_id = request.args.get('user_id', type=int)
+
+    return Response(
+        stream_with_context(ExportService.stream_transactions(export_format, user_id)),
+        mimetype=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f"attachment; filename=transactions.{export_format}"}
+    )
+
+
+@admin_bp.route('/profiles', methods=['GET'])
+@jwt_required()
+def get_profiles():
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    return jsonify({"profiles": current_app.extensions["request_profiler"].summaries()}), 200
+
+
+@admin_bp.route('/profiles/<profile_id>', methods=['GET'])
+@jwt_required()
+def get_profile(profile_id):
+    identity = get_jwt_identity()
+    admin_user = User.query.get(identity)
+
+    if not admin_user or not admin_user.is_admin:
+        return jsonify({"message": "Access forbidden: Admins only"}), 403
+
+    profile = current_app.extensions["request_profiler"].get(profile_id)
+    if not profile:
+        return jsonify({"message": "Profile not found"}), 404
+
+    return jsonify(profile), 200
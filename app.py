@@ -4,15 +4,37 @@ from flask_migrate import Migrate
 from flask_jwt_extended import JWTManager
 from flask_cors import CORS 
 from flasgger import Swagger
+from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
 import os
+import time
+import click
 
 from models.user import db
 from auth import auth_bp  
-from controllers.user_controller import user_bp
+from controllers.user_controller import user_bp, stream_token_only_for_events
 from controllers.exchange_controller import exchange_bp
 from controllers.transaction_controller import transaction_bp
+from controllers.scheduled_transfer_controller import scheduled_transfer_bp
+from controllers.health_controller import health_bp
+from controllers.report_controller import report_bp
 from admin import admin_bp
+from utils.replica import ReplicaRouter
+from utils.profiling import RequestProfiler
+from utils.admission import AdmissionControl
+from utils.warmup import WarmUp
+from services.stats_service import StatsService
+from services.balance_service import BalanceService
+from utils.events import EventHub
+from services.history_cache import HistoryCache
+from services.ledger_writer import LedgerWriter
+from services.token_revocation import TokenRevocation
+from services.velocity import VelocityLimiter
+from services.report_jobs import ReportJobs
+from services.sharding import ShardRouter, is_sharded, unavailable_when_sharded
+from services.transfer_saga import TransferSagaService
+from services.scheduled_transfer_service import ScheduledTransferService
+from services import postings
 
 # Load environment variables from .env file
 load_dotenv()
@@ -28,15 +50,106 @@ def create_app(config_name="development"):
 
     app.config['JWT_VERIFY_SUB'] = False
 
+    # Optional read replica for the read-only endpoints
+    app.config['REPLICA_DATABASE_URL'] = os.getenv('REPLICA_DATABASE_URL')
+    app.config['REPLICA_MAX_LAG_SECONDS'] = float(os.getenv('REPLICA_MAX_LAG_SECONDS', 5))
+    app.config['REPLICA_READ_YOUR_WRITES_SECONDS'] = float(os.getenv('REPLICA_READ_YOUR_WRITES_SECONDS', 10))
+    # Cookie carrying the end of the read-your-writes window to whichever worker serves the next read
+    app.config['REPLICA_WRITE_COOKIE'] = os.getenv('REPLICA_WRITE_COOKIE', 'recent_write')
+
+    # Async engine of the ASGI read path (asgi.py), derived from DATABASE_URL when unset
+    app.config['ASYNC_DATABASE_URL'] = os.getenv('ASYNC_DATABASE_URL')
+
+    # "memory" keeps balance events inside this process, "spool" shares them
+    # between the workers of one host through EVENT_SPOOL_PATH
+    app.config['EVENT_BROKER'] = os.getenv('EVENT_BROKER', 'memory')
+    app.config['EVENT_SPOOL_PATH'] = os.getenv('EVENT_SPOOL_PATH', '/tmp/goldenia-events.log')
+    # Every open stream holds a worker thread
+    app.config['EVENT_MAX_STREAMS'] = int(os.getenv('EVENT_MAX_STREAMS', 100))
+    app.config['EVENT_MAX_STREAMS_PER_USER'] = int(os.getenv('EVENT_MAX_STREAMS_PER_USER', 3))
+
+    app.config['HISTORY_CACHE_SIZE'] = int(os.getenv('HISTORY_CACHE_SIZE', 10000))
+    app.config['HISTORY_CACHE_TTL'] = int(os.getenv('HISTORY_CACHE_TTL', 30))
+
+    # Transfers to these account ids are applied in group-committed batches
+    app.config['LEDGER_WRITER_ENABLED'] = os.getenv('LEDGER_WRITER_ENABLED', 'false').lower() == 'true'
+    app.config['LEDGER_HOT_ACCOUNTS'] = [
+        int(account) for account in os.getenv('LEDGER_HOT_ACCOUNTS', '').split(',') if account.strip()
+    ]
+    app.config['LEDGER_BATCH_SIZE'] = int(os.getenv('LEDGER_BATCH_SIZE', 100))
+    app.config['LEDGER_BATCH_WAIT_MS'] = int(os.getenv('LEDGER_BATCH_WAIT_MS', 5))
+
+    app.config['SCHEDULED_TRANSFER_BATCH_SIZE'] = int(os.getenv('SCHEDULED_TRANSFER_BATCH_SIZE', 100))
+
+    # Seconds an exchange quote keeps its locked rate
+    app.config['EXCHANGE_QUOTE_TTL_SECONDS'] = int(os.getenv('EXCHANGE_QUOTE_TTL_SECONDS', 30))
+
+    # Comma-separated database URLs; when set, wallets and ledgers are spread over them by user id
+    app.config['SHARD_DATABASE_URLS'] = [
+        url.strip() for url in os.getenv('SHARD_DATABASE_URLS', '').split(',') if url.strip()
+    ]
+
+    # Per user and currency within VELOCITY_WINDOW_SECONDS, checked before the transfer or exchange
+    app.config['VELOCITY_WINDOW_SECONDS'] = int(os.getenv('VELOCITY_WINDOW_SECONDS', 3600))
+    app.config['VELOCITY_LIMITS'] = {
+        'transfer': {
+            'count': int(os.getenv('VELOCITY_MAX_TRANSFERS', 100)),
+            'amount': float(os.getenv('VELOCITY_MAX_TRANSFER_AMOUNT', 50000)),
+        },
+        'exchange': {
+            'count': int(os.getenv('VELOCITY_MAX_EXCHANGES', 100)),
+            'amount': float(os.getenv('VELOCITY_MAX_EXCHANGE_AMOUNT', 50000)),
+        },
+    }
+
+    app.config['ADMISSION_CONTROL_ENABLED'] = os.getenv('ADMISSION_CONTROL_ENABLED', 'true').lower() == 'true'
+    app.config['MAX_CONCURRENT_EXPENSIVE'] = int(os.getenv('MAX_CONCURRENT_EXPENSIVE', 8))
+    # Proxies in front of the app whose X-Forwarded-For is trusted; anonymous
+    # rate limits (login, signup) key on the client address it yields
+    app.config['PROXY_FIX_X_FOR'] = int(os.getenv('PROXY_FIX_X_FOR', 0))
+
+    # Admins can profile a single request by sending the X-Profile header
+    app.config['PROFILING_ENABLED'] = os.getenv('PROFILING_ENABLED', 'true').lower() == 'true'
+    app.config['PROFILE_STORE_SIZE'] = int(os.getenv('PROFILE_STORE_SIZE', 50))
+    app.config['PROFILE_MAX_STATEMENTS'] = int(os.getenv('PROFILE_MAX_STATEMENTS', 100))
+
+    # Reports are built by REPORT_WORKERS processes per app worker and written to REPORT_DIRECTORY
+    app.config['REPORT_DIRECTORY'] = os.getenv('REPORT_DIRECTORY', '/tmp/goldenia-reports')
+    app.config['REPORT_WORKERS'] = int(os.getenv('REPORT_WORKERS', 2))
+    app.config['REPORT_MAX_PENDING'] = int(os.getenv('REPORT_MAX_PENDING', 20))
+    app.config['REPORT_MAX_PENDING_PER_USER'] = int(os.getenv('REPORT_MAX_PENDING_PER_USER', 3))
+    # prune-reports deletes the jobs and files older than this
+    app.config['REPORT_RETENTION_DAYS'] = float(os.getenv('REPORT_RETENTION_DAYS', 7))
+
+    # Open connections and fill caches in create_app; /health/ready answers 503 until done
+    app.config['WARMUP_ENABLED'] = os.getenv('WARMUP_ENABLED', 'true').lower() == 'true'
+    app.config['WARMUP_POOL_CONNECTIONS'] = int(os.getenv('WARMUP_POOL_CONNECTIONS', 5))
+
     if config_name == 'testing':
         app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
         app.config['TESTING'] = True
         app.config['JWT_SECRET_KEY'] = 'supersecretkey'
+        # Tests create their tables after create_app
+        app.config['WARMUP_ENABLED'] = False
 
     db.init_app(app)              
     migrate = Migrate(app, db)
     jwt = JWTManager(app)
+    TokenRevocation(app, jwt)
+    jwt.token_verification_loader(stream_token_only_for_events)
+    # Registered first so rejected requests never reach the database
+    AdmissionControl(app)
+    ReplicaRouter(app)
+    ShardRouter(app)
+    EventHub(app)
+    HistoryCache(app)
+    LedgerWriter(app)
+    VelocityLimiter(app)
+    ReportJobs(app)
+    RequestProfiler(app)
     CORS(app)
+    if app.config['PROXY_FIX_X_FOR']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['PROXY_FIX_X_FOR'])
 
 
     swagger = Swagger(app, template_file='swagger.yml')
@@ -46,11 +159,84 @@ def create_app(config_name="development"):
     app.register_blueprint(user_bp)
     app.register_blueprint(exchange_bp)
     app.register_blueprint(transaction_bp)
+    app.register_blueprint(scheduled_transfer_bp)
     app.register_blueprint(admin_bp)
+    app.register_blueprint(health_bp)
+    app.register_blueprint(report_bp)
 
     @app.route('/')
     def home():
         return "🎉 Goldenia Wallet API Running!"
+
+    # After every route and extension it warms up is registered
+    WarmUp(app, swagger)
+
+    @app.cli.command('refresh-rollups')
+    @click.option('--watch', type=float, default=None,
+                  help='Keep running and refresh every WATCH seconds.')
+    def refresh_rollups(watch):
+        """Refresh the hourly transaction rollups used by /admin/stats."""
+        if is_sharded():
+            raise click.ClickException(unavailable_when_sharded()[0]["message"])
+        while True:
+            StatsService.refresh_rollups()
+            if watch is None:
+                break
+            db.session.remove()
+            time.sleep(watch)
+
+    @app.cli.command('prune-revoked-tokens')
+    def prune_revoked_tokens():
+        """Delete revocations whose tokens have all expired."""
+        count = app.extensions['token_revocation'].prune_table()
+        click.echo(f"Pruned {count} revoked tokens")
+
+    @app.cli.command('prune-reports')
+    def prune_reports():
+        """Delete the report jobs and files older than REPORT_RETENTION_DAYS."""
+        jobs, files = app.extensions['report_jobs'].prune()
+        click.echo(f"Pruned {jobs} report jobs and {files} report files")
+
+    @app.cli.command('run-scheduled-transfers')
+    @click.option('--watch', type=float, default=None,
+                  help='Keep running and poll for due transfers every WATCH seconds.')
+    def run_scheduled_transfers(watch):
+        """Execute the scheduled transfers that are due, in batches."""
+        while True:
+            result = ScheduledTransferService.run_due(app.config['SCHEDULED_TRANSFER_BATCH_SIZE'])
+            click.echo(f"Executed {result['executed']} scheduled transfers, {result['failed']} failed")
+            if watch is None:
+                break
+            db.session.remove()
+            time.sleep(watch)
+
+    @app.cli.command('consolidate-balances')
+    def consolidate_balances():
+        """Fold the slots of sharded wallets back into a single row."""
+        count = BalanceService.consolidate()
+        click.echo(f"Consolidated {count} wallets")
+
+    @app.cli.command('init-shards')
+    def init_shards():
+        """Create the wallet and ledger tables on every shard in SHARD_DATABASE_URLS."""
+        shards = app.extensions.get('shard_router')
+        if shards is None:
+            click.echo("SHARD_DATABASE_URLS is not set")
+            return
+        shards.create_schema()
+        click.echo(f"Initialised {shards.shard_count} shards")
+
+    @app.cli.command('backfill-postings')
+    def backfill_postings():
+        """Write the double-entry postings of ledger rows that have none, e.g. on the shards."""
+        count = postings.backfill()
+        click.echo(f"Posted {count} ledger rows")
+
+    @app.cli.command('resume-transfer-sagas')
+    def resume_transfer_sagas():
+        """Complete or refund cross-shard transfers left unfinished."""
+        count = TransferSagaService.resume()
+        click.echo(f"Resumed {count} transfer sagas")
     
     return app
 
@@ -0,0 +1,5 @@
+# ASGI entry point, e.g. `uvicorn asgi:application --workers 4`
+from app import create_app
+from utils.asgi import AsyncReadApp
+
+application = AsyncReadApp(create_app())
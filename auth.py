@@ -1,5 +1,5 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token
+from flask import Blueprint, current_app, request, jsonify
+from flask_jwt_extended import create_access_token, get_jwt, get_jwt_identity, jwt_required
 from models.user import db, User
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/auth')
@@ -47,3 +47,35 @@ def login():
         'access_token': access_token,
         'role': role
         }), 200
+
+
+@auth_bp.route('/logout', methods=['POST'])
+@jwt_required()
+def logout():
+
+    current_app.extensions['token_revocation'].revoke_token(get_jwt())
+
+    return jsonify({'message': 'Logged out successfully'}), 200
+
+
+@auth_bp.route('/change-password', methods=['POST'])
+@jwt_required()
+def change_password():
+
+    data = request.get_json() or {}
+    current_password = data.get('current_password')
+    new_password = data.get('new_password')
+
+    if not current_password or not new_password:
+        return jsonify({'message': 'Missing required fields'}), 400
+
+    user = db.session.get(User, int(get_jwt_identity()))
+
+    if not user or not user.check_password(current_password):
+        return jsonify({'message': 'Invalid password'}), 401
+
+    user.set_password(new_password)
+    # Commits the new password together with the revocation of every existing token
+    current_app.extensions['token_revocation'].revoke_user(user.id)
+
+    return jsonify({'message': 'Password changed, please log in again'}), 200
@@ -12,9 +12,32 @@ def exchange_currency():
     identity = get_jwt_identity()
     user = User.query.get(identity)
     data = request.get_json()
+
+    if data.get('quote_id'):
+        # Quote ids are hex strings, other JSON values cannot be looked up
+        if not isinstance(data['quote_id'], str):
+            return jsonify({"status": "error", "message": "quote_id must be a string"}), 400
+        result, status_code = ExchangeService.exchange_quote(user, data.get('quote_id'))
+        return jsonify(result), status_code
+
     amount = data.get('amount')
     currency_from = data.get('currency_from')
     currency_to = data.get('currency_to')
 
     result, status_code = ExchangeService.exchange(user, amount, currency_from, currency_to)
-    return jsonify(result), status_code
\ No newline at end of file
+    return jsonify(result), status_code
+
+
+@exchange_bp.route('/exchange/quote', methods=['POST'])
+@jwt_required()
+def exchange_quote():
+
+    identity = get_jwt_identity()
+    user = User.query.get(identity)
+    data = request.get_json()
+    amount = data.get('amount')
+    currency_from = data.get('currency_from')
+    currency_to = data.get('currency_to')
+
+    result, status_code = ExchangeService.quote(user, amount, currency_from, currency_to)
+    return jsonify(result), status_code
@@ -0,0 +1,27 @@
+from flask import Blueprint, current_app, jsonify
+
+from utils.warmup import engines, pool_stats
+
+health_bp = Blueprint('health', __name__, url_prefix='/health')
+
+
+# Polled by the load balancer, so it needs no token
+@health_bp.route('/ready', methods=['GET'])
+def ready():
+
+    warm_up = current_app.extensions.get('warm_up')
+    if warm_up is not None:
+        warm_up.retry_if_failed()
+        result = warm_up.report()
+    else:
+        result = {"status": "disabled", "ready": True}
+
+    result["pools"] = {name: pool_stats(engine) for name, engine in engines().items()}
+
+    caches = {}
+    history_cache = current_app.extensions.get('history_cache')
+    if history_cache is not None:
+        caches["history"] = history_cache.pages.stats()
+    result["caches"] = caches
+
+    return jsonify(result), 200 if result["ready"] else 503
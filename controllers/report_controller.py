@@ -0,0 +1,62 @@
+import os
+
+from flask import Blueprint, current_app, request, jsonify, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.user import User
+
+report_bp = Blueprint('report', __name__, url_prefix='/reports')
+
+
+@report_bp.route('', methods=['POST'])
+@jwt_required()
+def create_report():
+
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+    data = request.get_json() or {}
+
+    result, status_code = current_app.extensions['report_jobs'].create(
+        user,
+        kind=data.get('kind', 'statement'),
+        user_id=data.get('user_id'),
+        date_from=data.get('date_from'),
+        date_to=data.get('date_to')
+    )
+    return jsonify(result), status_code
+
+
+@report_bp.route('/<job_id>', methods=['GET'])
+@jwt_required()
+def get_report(job_id):
+
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    result, status_code = current_app.extensions['report_jobs'].status(user, job_id)
+    return jsonify(result), status_code
+
+
+@report_bp.route('/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_report(job_id):
+
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    reports = current_app.extensions['report_jobs']
+    job = reports.get(user, job_id)
+    if job is None:
+        return jsonify({"message": "Report not found"}), 404
+    if job.state != "done":
+        return jsonify({"message": f"Report is {job.state}", "state": job.state}), 409
+
+    path = reports.path(job)
+    if not os.path.exists(path):
+        # Built on another host, or removed since
+        return jsonify({"message": "Report file not found"}), 404
+
+    return send_file(path, mimetype="application/gzip", as_attachment=True,
+                     download_name=f"{job.kind}-{job.id}.csv.gz")
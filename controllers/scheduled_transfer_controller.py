@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from models.user import User
+from services.scheduled_transfer_service import ScheduledTransferService
+
+scheduled_transfer_bp = Blueprint('scheduled_transfer', __name__, url_prefix='/user')
+
+
+@scheduled_transfer_bp.route('/scheduled-transfers', methods=['POST'])
+@jwt_required()
+def create_scheduled_transfer():
+
+    user = User.query.get(get_jwt_identity())
+    data = request.get_json()
+
+    result, status_code = ScheduledTransferService.create(
+        user,
+        target_user_id=data.get('target_user_id'),
+        amount=data.get('amount'),
+        currency=data.get('currency'),
+        interval_seconds=data.get('interval_seconds'),
+        start_at=data.get('start_at')
+    )
+    return jsonify(result), status_code
+
+
+@scheduled_transfer_bp.route('/scheduled-transfers', methods=['GET'])
+@jwt_required()
+def get_scheduled_transfers():
+
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    result, status_code = ScheduledTransferService.list_for_user(user)
+    return jsonify(result), status_code
+
+
+@scheduled_transfer_bp.route('/scheduled-transfers/<int:id>', methods=['DELETE'])
+@jwt_required()
+def cancel_scheduled_transfer(id):
+
+    user = User.query.get(get_jwt_identity())
+    if not user:
+        return jsonify({"message": "User not found"}), 404
+
+    result, status_code = ScheduledTransferService.cancel(user, id)
+    return jsonify(result), status_code
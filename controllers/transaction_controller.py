@@ -1,4 +1,4 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models.user import User
 from services.transaction_service import TransactionService
@@ -47,8 +47,12 @@ def get_transactions():
 
     identity = get_jwt_identity()
     user = User.query.get(int(identity))
+    limit = request.args.get('limit', type=int)
+    before = request.args.get('before', type=int)
 
-    result,status_code = TransactionService.transaction(user)
+    result,status_code = TransactionService.transaction(user, limit=limit, before=before)
+    if isinstance(result, Response):
+        return result, status_code
     return jsonify(
         result
     ), status_code
@@ -1,7 +1,13 @@
-from flask import Blueprint, request, jsonify
-from flask_jwt_extended import jwt_required, get_jwt_identity
+import json
+from datetime import timedelta
+
+from flask import Blueprint, Response, current_app, request, jsonify
+from flask_jwt_extended import (
+    create_access_token, get_jwt, get_jwt_identity, get_jwt_request_location, jwt_required
+)
 from services.user_service import UserService
-from models.user import User
+from models.user import db, User
+from utils.events import STREAM_TOKEN_CLAIM, STREAM_TOKEN_SCOPE, is_stream_token
 
 user_bp = Blueprint('user', __name__, url_prefix='/user')
 
@@ -14,3 +20,71 @@ def get_profile():
     result = UserService.get_user_profile(user)
 
     return jsonify(result), 200
+
+
+def _sse(event_type, data):
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+def stream_token_only_for_events(jwt_header, jwt_data):
+    """JWT claims check: stream tokens are accepted by /user/events and nowhere else."""
+    return not is_stream_token(jwt_data) or request.endpoint == "user.stream_events"
+
+
+# EventSource cannot send headers, so it gets a stream token to pass as ?jwt=
+# instead of the access token, which would end up in access and proxy logs
+@user_bp.route('/events/token', methods=['POST'])
+@jwt_required()
+def create_stream_token():
+
+    expires_in = current_app.config["EVENT_STREAM_TOKEN_SECONDS"]
+    stream_token = create_access_token(
+        identity=get_jwt_identity(),
+        additional_claims={STREAM_TOKEN_CLAIM: STREAM_TOKEN_SCOPE},
+        expires_delta=timedelta(seconds=expires_in)
+    )
+    return jsonify({"stream_token": stream_token, "expires_in": expires_in}), 200
+
+
+@user_bp.route('/events', methods=['GET'])
+@jwt_required(locations=["headers", "query_string"])
+def stream_events():
+
+    if get_jwt_request_location() == "query_string" and not is_stream_token(get_jwt()):
+        return jsonify({"message": "Pass a stream token from POST /user/events/token as jwt"}), 401
+
+    identity = get_jwt_identity()
+    hub = current_app.extensions["event_hub"]
+    keepalive = current_app.config["EVENT_KEEPALIVE_SECONDS"]
+
+    # Subscribe before taking the snapshot so no event falls between the two
+    subscription = hub.subscribe(identity)
+    if subscription is None:
+        return jsonify({"message": "Too many open event streams"}), 429
+
+    user = User.query.get(identity)
+    if not user:
+        subscription.close()
+        return jsonify({"message": "User not found"}), 404
+
+    snapshot = UserService.get_user_profile(user)
+
+    # The stream can stay open for hours, do not hold a pooled connection meanwhile
+    db.session.remove()
+
+    def stream():
+        yield _sse("profile", snapshot)
+        while True:
+            event = subscription.get(timeout=keepalive)
+            if event is None:
+                yield ": keepalive\n\n"
+            else:
+                yield _sse(event["type"], event)
+
+    response = Response(
+        stream(),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    response.call_on_close(subscription.close)
+    return response
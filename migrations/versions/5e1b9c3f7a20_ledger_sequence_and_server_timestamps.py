@@ -0,0 +1,88 @@
+"""ledger sequence and server timestamps
+
+Revision ID: 5e1b9c3f7a20
+Revises: a4d2f8e61b07
+Create Date: 2026-10-19 14:05:37.220914
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e1b9c3f7a20'
+down_revision = 'a4d2f8e61b07'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    is_postgresql = op.get_bind().dialect.name == 'postgresql'
+    if is_postgresql:
+        now = sa.text("TIMEZONE('utc', CURRENT_TIMESTAMP)")
+    else:
+        now = sa.text("(STRFTIME('%Y-%m-%d %H:%M:%f000', 'now'))")
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('seq', sa.BigInteger(), nullable=True))
+
+    # Number existing rows in the best order available before this migration
+    op.execute(
+        'UPDATE "transaction" SET seq = numbered.rn FROM ('
+        'SELECT id, row_number() OVER (ORDER BY created_at, id) AS rn FROM "transaction"'
+        ') AS numbered WHERE "transaction".id = numbered.id'
+    )
+    op.execute(f'UPDATE "transaction" SET created_at = {now.text} WHERE created_at IS NULL')
+
+    if is_postgresql:
+        op.execute(sa.schema.CreateSequence(sa.Sequence('transaction_seq')))
+        op.execute("SELECT setval('transaction_seq', COALESCE(MAX(seq), 0) + 1, false) FROM \"transaction\"")
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.alter_column('seq', existing_type=sa.BigInteger(), nullable=False)
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               server_default=now,
+               nullable=False)
+        batch_op.create_unique_constraint('transaction_seq_key', ['seq'])
+        batch_op.create_index('ix_transaction_user_id_seq', ['user_id', 'seq'], unique=False)
+        batch_op.create_index('ix_transaction_target_user_id_seq', ['target_user_id', 'seq'], unique=False)
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               server_default=now,
+               existing_nullable=False)
+
+    if not is_postgresql:
+        _restore_user_expression_indexes()
+
+
+def _restore_user_expression_indexes():
+    # SQLite batch mode rebuilds the table and cannot reflect expression indexes
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_username_lower ON "user" (lower(username))')
+    op.execute('CREATE INDEX IF NOT EXISTS ix_user_email_lower ON "user" (lower(email))')
+
+
+def downgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               server_default=None,
+               existing_nullable=False)
+
+    if op.get_bind().dialect.name != 'postgresql':
+        _restore_user_expression_indexes()
+
+    with op.batch_alter_table('transaction', schema=None) as batch_op:
+        batch_op.drop_index('ix_transaction_target_user_id_seq')
+        batch_op.drop_index('ix_transaction_user_id_seq')
+        batch_op.drop_constraint('transaction_seq_key', type_='unique')
+        batch_op.alter_column('created_at',
+               existing_type=sa.DateTime(),
+               server_default=None,
+               nullable=True)
+        batch_op.drop_column('seq')
+
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(sa.schema.DropSequence(sa.Sequence('transaction_seq')))
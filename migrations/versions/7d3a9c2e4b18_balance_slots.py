@@ -0,0 +1,66 @@
+"""balance slots
+
+Revision ID: 7d3a9c2e4b18
+Revises: 5e1b9c3f7a20
+Create Date: 2026-10-19 16:12:08.441930
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d3a9c2e4b18'
+down_revision = '5e1b9c3f7a20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('user', sa.Column('balance_slots', sa.Integer(), server_default='1', nullable=False))
+
+    # Concurrent first top-ups could create several rows for one wallet; merge
+    # them into the oldest row so the unique key below can be created
+    op.execute(
+        'UPDATE user_balance SET balance = ('
+        'SELECT SUM(duplicates.balance) FROM user_balance AS duplicates '
+        'WHERE duplicates.user_id = user_balance.user_id AND duplicates.currency = user_balance.currency'
+        ') WHERE id IN ('
+        'SELECT MIN(id) FROM user_balance GROUP BY user_id, currency HAVING COUNT(*) > 1'
+        ')'
+    )
+    op.execute(
+        'DELETE FROM user_balance WHERE id NOT IN ('
+        'SELECT MIN(id) FROM user_balance GROUP BY user_id, currency'
+        ')'
+    )
+
+    with op.batch_alter_table('user_balance', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('slot', sa.Integer(), server_default='0', nullable=False))
+        # The unique key leads with (user_id, currency) and replaces the plain index
+        batch_op.drop_index('ix_user_balance_user_currency')
+        batch_op.create_unique_constraint('uq_user_balance_slot', ['user_id', 'currency', 'slot'])
+
+
+def downgrade():
+    # Fold the slots back into one row per wallet before dropping the column
+    op.execute(
+        'UPDATE user_balance SET balance = ('
+        'SELECT SUM(slots.balance) FROM user_balance AS slots '
+        'WHERE slots.user_id = user_balance.user_id AND slots.currency = user_balance.currency'
+        ') WHERE slot = 0'
+    )
+    op.execute('DELETE FROM user_balance WHERE slot > 0')
+
+    with op.batch_alter_table('user_balance', schema=None) as batch_op:
+        batch_op.drop_constraint('uq_user_balance_slot', type_='unique')
+        batch_op.create_index('ix_user_balance_user_currency', ['user_id', 'currency'], unique=False)
+        batch_op.drop_column('slot')
+
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('balance_slots')
+
+    if op.get_bind().dialect.name != 'postgresql':
+        # SQLite batch mode rebuilds the table and cannot reflect expression indexes
+        op.execute('CREATE INDEX IF NOT EXISTS ix_user_username_lower ON "user" (lower(username))')
+        op.execute('CREATE INDEX IF NOT EXISTS ix_user_email_lower ON "user" (lower(email))')
@@ -0,0 +1,38 @@
+"""admin user search indexes
+
+Revision ID: a4d2f8e61b07
+Revises: 3c9e5b7a1d42
+Create Date: 2026-10-19 11:40:52.907114
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a4d2f8e61b07'
+down_revision = '3c9e5b7a1d42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        # text_pattern_ops lets LIKE 'prefix%' use the index under any collation
+        op.execute('CREATE INDEX ix_user_username_lower ON "user" (lower(username) text_pattern_ops)')
+        op.execute('CREATE INDEX ix_user_email_lower ON "user" (lower(email) text_pattern_ops)')
+    else:
+        op.create_index('ix_user_username_lower', 'user', [sa.text('lower(username)')], unique=False)
+        op.create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], unique=False)
+
+    op.create_index('ix_user_created_at_id', 'user', ['created_at', 'id'], unique=False)
+    op.create_index('ix_user_balance_user_currency', 'user_balance', ['user_id', 'currency'], unique=False)
+    op.create_index('ix_user_balance_currency_balance', 'user_balance', ['currency', 'balance'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_user_balance_currency_balance', table_name='user_balance')
+    op.drop_index('ix_user_balance_user_currency', table_name='user_balance')
+    op.drop_index('ix_user_created_at_id', table_name='user')
+    op.drop_index('ix_user_email_lower', table_name='user')
+    op.drop_index('ix_user_username_lower', table_name='user')
@@ -0,0 +1,23 @@
+from models.user import db
+from models.sql_functions import utcnow
+
+class ExchangeQuote(db.Model):
+    """A rate locked for one user and amount until ``expires_at``, usable once."""
+    __tablename__ = 'exchange_quote'
+
+    id = db.Column(db.String(32), primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency_from = db.Column(db.String(3), nullable=False)
+    currency_to = db.Column(db.String(3), nullable=False)
+    rate = db.Column(db.Float, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+    used_at = db.Column(db.DateTime, nullable=True)
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_exchange_quote_user_expires_at', user_id, expires_at),
+    )
+
+    def __repr__(self):
+        return f"<ExchangeQuote {self.id} {self.currency_from}->{self.currency_to} @ {self.rate}>"
@@ -0,0 +1,28 @@
+from models.user import db
+
+
+class Posting(db.Model):
+    """One leg of a ledger row: a credit (positive amount) or debit (negative) of one account.
+
+    Every Transaction is written with its legs, whose amounts add up to zero per
+    currency (see ``services.postings.legs``), so the balance of an account up
+    to any ledger position is a single SUM over ``(account, currency, seq)``.
+    """
+    __tablename__ = 'posting'
+
+    id = db.Column(db.Integer, primary_key=True)
+    transaction_id = db.Column(db.Integer, db.ForeignKey('transaction.id'), nullable=False, index=True)
+    # The seq of the transaction, so balances and statements never join it
+    seq = db.Column(db.BigInteger, nullable=False)
+    # "user:<id>", or one of the system accounts in services.postings
+    account = db.Column(db.String(32), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+
+    __table_args__ = (
+        # Carries the amount so sums over a range are answered from the index on PostgreSQL
+        db.Index('ix_posting_account_currency_seq', account, currency, seq, postgresql_include=['amount']),
+    )
+
+    def __repr__(self):
+        return f"<Posting {self.account} {self.amount} {self.currency} at {self.seq}>"
@@ -0,0 +1,27 @@
+from models.user import db
+from models.sql_functions import utcnow
+
+class ReportJob(db.Model):
+    """A report built in the background: queued, running, then done or failed.
+
+    ``kind`` is "statement" (one account with running balances) or
+    "transactions" (ledger rows, of one user or of everyone). The result is a
+    gzip-compressed CSV named after the job id in ``REPORT_DIRECTORY``.
+    """
+    __tablename__ = 'report_job'
+
+    id = db.Column(db.String(32), primary_key=True)
+    kind = db.Column(db.String(20), nullable=False)
+    requested_by = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=True)  # None for the whole ledger
+    date_from = db.Column(db.DateTime, nullable=True)
+    date_to = db.Column(db.DateTime, nullable=True)
+    state = db.Column(db.String(20), nullable=False, default='queued')
+    rows = db.Column(db.Integer, nullable=True)
+    size = db.Column(db.Integer, nullable=True)  # bytes of the compressed file
+    error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
+    finished_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"<ReportJob {self.id} {self.kind} {self.state}>"
@@ -0,0 +1,17 @@
+from models.user import db
+from models.sql_functions import utcnow
+
+class RevokedToken(db.Model):
+    """A revoked access token (jti), or every token of a user issued before ``revoked_before``."""
+    __tablename__ = 'revoked_token'
+
+    id = db.Column(db.Integer, primary_key=True)
+    jti = db.Column(db.String(36), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    revoked_before = db.Column(db.DateTime, nullable=True)
+    # Once every token it covers has expired the row can be pruned
+    expires_at = db.Column(db.DateTime, nullable=True, index=True)
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False, index=True)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti or 'all'} for User {self.user_id}>"
@@ -0,0 +1,26 @@
+from models.user import db
+from models.sql_functions import utcnow
+
+class ScheduledTransfer(db.Model):
+    """A transfer executed at ``next_run_at``, then every ``interval_seconds`` if recurring."""
+    __tablename__ = 'scheduled_transfer'
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False, index=True)
+    target_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    interval_seconds = db.Column(db.Integer, nullable=True)  # None for a one-off transfer
+    next_run_at = db.Column(db.DateTime, nullable=False)
+    active = db.Column(db.Boolean, nullable=False, default=True, server_default=db.true())
+    last_run_at = db.Column(db.DateTime, nullable=True)
+    last_status = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
+
+    __table_args__ = (
+        # The worker's due query: active rows ordered by next_run_at
+        db.Index('ix_scheduled_transfer_due', active, next_run_at),
+    )
+
+    def __repr__(self):
+        return f"<ScheduledTransfer {self.id}: {self.amount} {self.currency} to User {self.target_user_id}>"
@@ -0,0 +1,26 @@
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql import expression
+from sqlalchemy.types import DateTime
+
+
+class utcnow(expression.FunctionElement):
+    """Current UTC time evaluated by the database server."""
+    type = DateTime()
+    inherit_cache = True
+
+
+@compiles(utcnow)
+def _default_utcnow(element, compiler, **kw):
+    return "CURRENT_TIMESTAMP"
+
+
+@compiles(utcnow, "sqlite")
+def _sqlite_utcnow(element, compiler, **kw):
+    # UTC with the microsecond layout SQLAlchemy uses for SQLite DateTime values,
+    # so stored timestamps compare correctly against bound parameters
+    return "(STRFTIME('%Y-%m-%d %H:%M:%f000', 'now'))"
+
+
+@compiles(utcnow, "postgresql")
+def _postgresql_utcnow(element, compiler, **kw):
+    return "TIMEZONE('utc', CURRENT_TIMESTAMP)"
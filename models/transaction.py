@@ -1,10 +1,16 @@
+import threading
+
+from sqlalchemy import event, func, select
 from models.user import db
-from datetime import datetime, timezone
+from models.sql_functions import utcnow
 
 class Transaction(db.Model):
     __tablename__ = 'transaction'
 
     id = db.Column(db.Integer, primary_key=True)
+    # Position in the ledger, strictly increasing in insert order; use it for ordering and cursors.
+    # It is not commit order on PostgreSQL, see ledger_snapshot for reads that rely on it
+    seq = db.Column(db.BigInteger, db.Sequence('transaction_seq'), nullable=False, unique=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     type = db.Column(db.String(50), nullable=False)  # top_up, exchange, transfer
     amount = db.Column(db.Float, nullable=False)
@@ -13,13 +19,42 @@ class Transaction(db.Model):
     currency_from = db.Column(db.String(3), nullable=True)
     currency_to = db.Column(db.String(3), nullable=True)
     converted_amount = db.Column(db.Float, nullable=True)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False, index=True)
     target_user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=True)
 
     user = db.relationship("User", back_populates="transactions", foreign_keys=[user_id])
 
     target_user = db.relationship("User", back_populates="received_transactions", foreign_keys=[target_user_id])
 
+    __table_args__ = (
+        # History of one user in ledger order, as sender and as recipient
+        db.Index('ix_transaction_user_id_seq', user_id, seq),
+        db.Index('ix_transaction_target_user_id_seq', target_user_id, seq),
+    )
+
+    # Fetch seq and created_at during the flush instead of on first access
+    __mapper_args__ = {"eager_defaults": True}
+
 
     def __repr__(self):
         return f"<Transaction {self.type} {self.amount}{self.currency_symbol} by User {self.user_id}>"
+
+
+# Process-local; two processes picking the same number collide on the unique
+# constraint of seq and the later flush fails instead of duplicating it
+_seq_lock = threading.Lock()
+_last_seq = {}
+
+
+@event.listens_for(Transaction, "before_insert")
+def _assign_seq_without_sequences(mapper, connection, target):
+    """Number ledger rows on databases without sequences (SQLite in development and tests)."""
+    if connection.dialect.supports_sequences or target.seq is not None:
+        return
+
+    key = str(connection.engine.url)
+    with _seq_lock:
+        current = connection.execute(select(func.max(Transaction.seq))).scalar() or 0
+        # Rows of the same flush are numbered before any of them is inserted
+        target.seq = max(current, _last_seq.get(key, 0)) + 1
+        _last_seq[key] = target.seq
@@ -0,0 +1,18 @@
+from models.user import db
+
+class TransactionRollup(db.Model):
+    __tablename__ = 'transaction_rollup'
+
+    id = db.Column(db.Integer, primary_key=True)
+    hour = db.Column(db.DateTime, nullable=False)  # start of the hour bucket
+    type = db.Column(db.String(50), nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    volume = db.Column(db.Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        db.UniqueConstraint('hour', 'type', 'currency', name='uq_transaction_rollup_bucket'),
+    )
+
+    def __repr__(self):
+        return f"<TransactionRollup {self.hour} {self.type} {self.currency}: {self.count}>"
@@ -0,0 +1,46 @@
+from models.user import db
+from models.sql_functions import utcnow
+
+class TransferSaga(db.Model):
+    """A transfer between users on different shards, driven step by step.
+
+    Kept on the primary database: pending, debited (sender's shard committed),
+    completed (recipient's shard committed), failed or compensated (refunded).
+    """
+    __tablename__ = 'transfer_saga'
+
+    id = db.Column(db.String(32), primary_key=True)
+    sender_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    target_user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    amount = db.Column(db.Float, nullable=False)
+    currency = db.Column(db.String(3), nullable=False)
+    state = db.Column(db.String(20), nullable=False, default='pending')
+    attempts = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_error = db.Column(db.String(255), nullable=True)
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
+    updated_at = db.Column(db.DateTime, server_default=utcnow(), onupdate=utcnow(), nullable=False)
+
+    __table_args__ = (
+        # Recovery looks for sagas left pending or debited
+        db.Index('ix_transfer_saga_state_updated_at', state, updated_at),
+    )
+
+    def __repr__(self):
+        return f"<TransferSaga {self.id} {self.state}: {self.amount} {self.currency}>"
+
+
+class TransferSagaStep(db.Model):
+    """Marks a saga step as applied on a shard, in the same transaction as the step.
+
+    Lives on the shards. The primary key makes each step happen at most once: a
+    step is fenced off by inserting it with outcome "aborted" first.
+    """
+    __tablename__ = 'transfer_saga_step'
+
+    saga_id = db.Column(db.String(32), primary_key=True)
+    step = db.Column(db.String(10), primary_key=True)  # debit, credit, refund
+    outcome = db.Column(db.String(10), nullable=False, default='done')  # done, aborted
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
+
+    def __repr__(self):
+        return f"<TransferSagaStep {self.saga_id} {self.step} {self.outcome}>"
@@ -1,9 +1,9 @@
 from flask_sqlalchemy import SQLAlchemy
-from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
-from datetime import datetime, timezone
+from utils.replica import RoutingSession
+from models.sql_functions import utcnow
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class User(db.Model):
 
@@ -14,8 +14,10 @@ class User(db.Model):
     email = db.Column(db.String(120), unique=True, nullable=False)
     password_hash = db.Column(db.String(256), nullable=False)
     is_admin = db.Column(db.Boolean, default=False)
-    created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc), nullable=False)
+    created_at = db.Column(db.DateTime, server_default=utcnow(), nullable=False)
     currency = db.Column(db.String(3), default="USD")
+    # Number of sub-balance rows per currency, above 1 for contended wallets
+    balance_slots = db.Column(db.Integer, nullable=False, default=1, server_default='1')
     
     # Transactions initiated by the user
     transactions = db.relationship(
@@ -35,6 +37,21 @@ class User(db.Model):
 
     balances = db.relationship("UserBalance", back_populates="user", lazy=True)
 
+    __table_args__ = (
+        # Case-insensitive prefix search and keyset pagination for the admin listing
+        db.Index(
+            'ix_user_username_lower',
+            db.func.lower(username).label('username_lower'),
+            postgresql_ops={'username_lower': 'text_pattern_ops'}
+        ),
+        db.Index(
+            'ix_user_email_lower',
+            db.func.lower(email).label('email_lower'),
+            postgresql_ops={'email_lower': 'text_pattern_ops'}
+        ),
+        db.Index('ix_user_created_at_id', created_at, id),
+    )
+
     def set_password(self, password):
         self.password_hash = generate_password_hash(password)
 
@@ -7,8 +7,15 @@ class UserBalance(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     currency = db.Column(db.String(3), nullable=False)
     balance = db.Column(db.Float, default=0.0)
+    # Sharded wallets spread their balance over several slots, see BalanceService
+    slot = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
     user = db.relationship("User", back_populates="balances")
 
+    __table_args__ = (
+        db.UniqueConstraint(user_id, currency, slot, name='uq_user_balance_slot'),
+        db.Index('ix_user_balance_currency_balance', currency, balance),
+    )
+
     def __repr__(self):
-        return f"<Balance {self.currency}: {self.balance} for User {self.user_id}>"  
\ No newline at end of file
+        return f"<Balance {self.currency}[{self.slot}]: {self.balance} for User {self.user_id}>"  
\ No newline at end of file
@@ -0,0 +1,96 @@
+import json
+
+from sqlalchemy import func, or_, select
+
+from models.user import User
+from models.user_balance import UserBalance
+from models.transaction import Transaction
+from services.balance_service import BalanceService
+from services.ledger_projection import balance_statements, snapshot_options, sum_balances
+from services.transaction_service import TransactionService, HISTORY_BATCH_SIZE, MAX_HISTORY_PAGE_SIZE
+from services.user_service import UserService
+
+
+class AsyncReadService:
+    """The /user/profile and /user/transactions reads on an ``AsyncSession``.
+
+    Statements and serialisation are shared with UserService and
+    TransactionService, so both paths return the same responses; only the
+    round trips are awaited instead of blocking a worker. A full history is
+    returned as an async iterator of JSON chunks, like the streamed response
+    of the sync path.
+    """
+
+    @staticmethod
+    async def profile(session, user_id):
+        user = await session.get(User, int(user_id))
+        if not user:
+            return {"message": "User not found"}, 404
+
+        balances = await session.scalars(
+            select(UserBalance).where(UserBalance.user_id == user.id).order_by(UserBalance.id)
+        )
+        return UserService.profile_response(user, BalanceService.totals(balances)), 200
+
+    @staticmethod
+    async def transactions(session, user_id, limit=None, before=None, cache=None):
+        # The rows and their balances are read in one snapshot, see ledger_snapshot
+        options = snapshot_options(session.bind.dialect)
+        if options:
+            await session.connection(execution_options=options)
+
+        user = await session.get(User, int(user_id))
+        if not user:
+            return {"error": "User not found"}, 404
+
+        if not limit:
+            # Like the sync path, full histories are streamed and not cached
+            return AsyncReadService._stream_history(session, user.id), 200
+        limit = min(limit, MAX_HISTORY_PAGE_SIZE)
+
+        if cache is not None:
+            cached = cache.get(user.id, limit, before)
+            if cached is not None:
+                return cached, 200
+            generation = cache.generation(user.id)
+
+        rows = (await session.scalars(TransactionService.history_statement(user.id, limit, before))).all()
+        transactions, next_cursor = TransactionService.history_page(rows, limit)
+
+        sums = []
+        if transactions:
+            for statement in balance_statements(user.id, transactions[0].seq, inclusive=True):
+                sums.extend(await session.execute(statement))
+
+        result = {
+            "transactions": list(TransactionService.serialize_history(user.id, transactions, sum_balances(sums))),
+            "next_cursor": next_cursor
+        }
+
+        if cache is not None:
+            cache.set(user.id, limit, before, result, generation)
+        return result, 200
+
+    @staticmethod
+    async def _stream_history(session, user_id):
+        """The chunks of TransactionService.stream_history, fetched in batches."""
+        yield '{"transactions": ['
+        involved = or_(Transaction.user_id == user_id, Transaction.target_user_id == user_id)
+        newest = await session.scalar(select(func.max(Transaction.seq)).where(involved))
+        if newest is not None:
+            sums = []
+            for statement in balance_statements(user_id, newest, inclusive=True):
+                sums.extend(await session.execute(statement))
+            # Updated in place by each batch, so the running balances carry over
+            closing = sum_balances(sums)
+
+            rows = await session.stream_scalars(
+                TransactionService.history_statement(user_id).where(Transaction.seq <= newest),
+                execution_options={"yield_per": HISTORY_BATCH_SIZE}
+            )
+            separator = ""
+            async for batch in rows.partitions():
+                entries = TransactionService.serialize_history(user_id, batch, closing)
+                yield separator + ", ".join(json.dumps(entry) for entry in entries)
+                separator = ", "
+        yield "]}"
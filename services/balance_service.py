@@ -0,0 +1,245 @@
+import random
+from collections import namedtuple
+
+from flask import current_app
+from sqlalchemy import func, select
+from sqlalchemy.exc import IntegrityError
+
+from models.user import db, User
+from models.user_balance import UserBalance
+from services.sharding import each_shard, shard_scope
+
+# Balance of one currency of a wallet, summed over its slots
+Wallet = namedtuple("Wallet", ["currency", "balance"])
+
+MAX_BALANCE_SLOTS = 64
+
+# Users per batch balance request, and ids per IN list (SQLite binds at most 32766 parameters)
+MAX_BATCH_BALANCE_USERS = 10000
+BATCH_BALANCE_CHUNK_SIZE = 1000
+
+
+class BalanceService:
+    """Reads and writes wallet balances, which may be split over several slots.
+
+    A wallet normally has a single UserBalance row (slot 0). A user with
+    ``balance_slots`` above 1 gets that many rows per currency: credits increment
+    one slot picked at random so concurrent writers rarely update the same row,
+    debits lock the wallet's slots and draw them down, and reads sum the slots.
+    """
+
+    @staticmethod
+    def totals(balances):
+        """Sum UserBalance rows per currency, in order of first appearance."""
+        totals = {}
+        for balance in balances:
+            totals[balance.currency] = totals.get(balance.currency, 0.0) + (balance.balance or 0.0)
+        return [Wallet(currency, amount) for currency, amount in totals.items()]
+
+    @staticmethod
+    def wallets(user_id):
+        """The user's balance per currency, read from the user's shard."""
+        with shard_scope(user_id):
+            return BalanceService.totals(
+                UserBalance.query.filter_by(user_id=user_id).order_by(UserBalance.id)
+            )
+
+    @staticmethod
+    def batch(user_ids, currencies=None):
+        """Balances per currency of many users, one grouped IN query per chunk of ids.
+
+        Every requested user is in the result, in request order, with an empty
+        list when they have no wallet (or do not exist).
+        """
+        if (
+            not isinstance(user_ids, list) or not user_ids
+            or any(isinstance(user_id, bool) or not isinstance(user_id, int) for user_id in user_ids)
+        ):
+            return {"message": "user_ids must be a non-empty list of integers"}, 400
+        if len(user_ids) > MAX_BATCH_BALANCE_USERS:
+            return {"message": f"At most {MAX_BATCH_BALANCE_USERS} user_ids per request"}, 400
+        if currencies is not None and (
+            not isinstance(currencies, list) or not all(isinstance(currency, str) for currency in currencies)
+        ):
+            return {"message": "currencies must be a list of currency codes"}, 400
+
+        wallets = BalanceService.balances_by_user(user_ids, currencies)
+        return {
+            "users": [
+                {"user_id": user_id, "balances": wallets.get(user_id, [])}
+                for user_id in dict.fromkeys(user_ids)
+            ]
+        }, 200
+
+    @staticmethod
+    def balances_by_user(user_ids, currencies=None):
+        """Rounded balances per currency of each user with a wallet, read shard by shard."""
+        statement = (
+            select(UserBalance.user_id, UserBalance.currency, func.sum(UserBalance.balance))
+            .group_by(UserBalance.user_id, UserBalance.currency)
+            .order_by(UserBalance.user_id, UserBalance.currency)
+        )
+        if currencies:
+            statement = statement.where(UserBalance.currency.in_({currency.upper() for currency in currencies}))
+
+        # Wallets live on their user's shard, so each shard gets its own IN lists
+        shards = current_app.extensions.get("shard_router")
+        groups = {}
+        for user_id in dict.fromkeys(user_ids):
+            groups.setdefault(shards.shard_for(user_id) if shards else None, []).append(user_id)
+
+        wallets = {}
+        for ids in groups.values():
+            with shard_scope(ids[0]):
+                for start in range(0, len(ids), BATCH_BALANCE_CHUNK_SIZE):
+                    chunk = ids[start:start + BATCH_BALANCE_CHUNK_SIZE]
+                    for user_id, currency, balance in db.session.execute(
+                        statement.where(UserBalance.user_id.in_(chunk))
+                    ):
+                        wallets.setdefault(user_id, []).append(
+                            {"currency": currency, "balance": round(balance or 0.0, 2)}
+                        )
+        return wallets
+
+    @staticmethod
+    def get_balance(user_id, currency):
+        return db.session.query(func.coalesce(func.sum(UserBalance.balance), 0.0)).filter(
+            UserBalance.user_id == user_id, UserBalance.currency == currency
+        ).scalar()
+
+    @staticmethod
+    def load_slots(user_ids, currencies, lock=False):
+        """Slot rows of several wallets keyed by (user_id, currency), read in a stable order."""
+        query = UserBalance.query.filter(
+            UserBalance.user_id.in_(user_ids), UserBalance.currency.in_(currencies)
+        ).order_by(UserBalance.user_id, UserBalance.currency, UserBalance.slot)
+        if lock:
+            # Rows already in the session are refreshed with the locked values
+            query = query.with_for_update().populate_existing()
+
+        wallets = {}
+        for balance in query:
+            wallets.setdefault((balance.user_id, balance.currency), []).append(balance)
+        return wallets
+
+    @staticmethod
+    def draw_down(slots, amount):
+        """Take ``amount`` from the slots, fullest first. Returns the new total, or None if short."""
+        total = sum(slot.balance for slot in slots)
+        if not slots or total < amount:
+            return None
+
+        remaining = amount
+        for slot in sorted(slots, key=lambda slot: slot.balance, reverse=True):
+            if remaining <= 0:
+                break
+            taken = min(slot.balance, remaining)
+            slot.balance -= taken
+            remaining -= taken
+        return total - amount
+
+    @staticmethod
+    def debit(user, currency, amount):
+        """Debit the user's wallet. Returns the new total, or None if the balance is too low."""
+        # Locked until commit, also for a single slot: the check and the absolute
+        # value written back must not race with other debits or the credits' increments
+        slots = BalanceService.load_slots([user.id], [currency], lock=True).get((user.id, currency), [])
+        return BalanceService.draw_down(slots, amount)
+
+    @staticmethod
+    def credit(user, currency, amount):
+        """Credit the user's wallet and return its new total."""
+        slot = random.randrange(user.balance_slots) if user.balance_slots > 1 else 0
+        balance = UserBalance.query.filter_by(user_id=user.id, currency=currency, slot=slot).first()
+
+        if balance is None:
+            try:
+                with db.session.begin_nested():
+                    db.session.add(UserBalance(user_id=user.id, currency=currency, slot=slot, balance=amount))
+            except IntegrityError:
+                # Another writer created the slot first
+                UserBalance.query.filter_by(user_id=user.id, currency=currency, slot=slot).update(
+                    {UserBalance.balance: UserBalance.balance + amount}, synchronize_session=False
+                )
+        else:
+            # Increment in SQL, other writers may credit the same slot
+            balance.balance = UserBalance.balance + amount
+            db.session.flush()
+
+        return BalanceService.get_balance(user.id, currency)
+
+    @staticmethod
+    def set_slots(user, slots):
+        """Change how many slots the user's wallets are spread over."""
+        if isinstance(slots, bool) or not isinstance(slots, int) or not 1 <= slots <= MAX_BALANCE_SLOTS:
+            return {"message": f"slots must be an integer between 1 and {MAX_BALANCE_SLOTS}"}, 400
+
+        user.balance_slots = slots
+        db.session.commit()
+
+        with shard_scope(user.id):
+            # Create the slots up front so credits increment existing rows instead of inserting
+            balances = UserBalance.query.filter_by(user_id=user.id).order_by(UserBalance.id).all()
+            existing = {(balance.currency, balance.slot) for balance in balances}
+            for currency in {currency for currency, _ in existing}:
+                for slot in range(slots):
+                    if (currency, slot) not in existing:
+                        db.session.add(UserBalance(user_id=user.id, currency=currency, slot=slot, balance=0.0))
+            wallets = BalanceService.totals(balances)
+            db.session.commit()
+
+        return {
+            "id": user.id,
+            "balance_slots": user.balance_slots,
+            "balances": [
+                {"currency": wallet.currency, "balance": round(wallet.balance, 2)}
+                for wallet in wallets
+            ]
+        }, 200
+
+    @staticmethod
+    def consolidate(user_id=None):
+        """Fold the balance of every slot into slot 0, one wallet per transaction, on every shard.
+
+        Slots the wallet still uses are kept at zero so credits keep spreading over
+        them; slots beyond the user's current ``balance_slots`` are deleted.
+        Returns the number of wallets consolidated.
+        """
+        count = 0
+        for _ in each_shard():
+            # Slots live on their user's shard and users on the primary, so they are not joined
+            extra_slots = db.session.query(
+                UserBalance.user_id, UserBalance.currency, UserBalance.slot, UserBalance.balance
+            ).filter(UserBalance.slot > 0)
+            if user_id is not None:
+                extra_slots = extra_slots.filter(UserBalance.user_id == user_id)
+
+            wallets = {}
+            for wallet_user_id, currency, slot, balance in extra_slots:
+                wallets.setdefault((wallet_user_id, currency), []).append((slot, balance))
+
+            for (wallet_user_id, currency), extra in wallets.items():
+                user = db.session.get(User, wallet_user_id)
+                if user is None or not any(balance != 0 or slot >= user.balance_slots for slot, balance in extra):
+                    continue
+
+                slots = BalanceService.load_slots([wallet_user_id], [currency], lock=True).get(
+                    (wallet_user_id, currency), []
+                )
+                primary = next((slot for slot in slots if slot.slot == 0), None)
+                if primary is None:
+                    primary = UserBalance(user_id=wallet_user_id, currency=currency, slot=0, balance=0.0)
+                    db.session.add(primary)
+
+                for slot in slots:
+                    if slot is primary:
+                        continue
+                    primary.balance += slot.balance
+                    if slot.slot >= user.balance_slots:
+                        db.session.delete(slot)
+                    else:
+                        slot.balance = 0.0
+                db.session.commit()
+                count += 1
+
+        return count
@@ -1,46 +1,158 @@
+import time
+import uuid
+from datetime import timedelta
+
 from models.user import db
-from models.user_balance import UserBalance
 from models.transaction import Transaction
-from flask import jsonify
-from utils.utils import get_currency_symbol 
+from models.exchange_quote import ExchangeQuote
+from flask import current_app, jsonify
+from utils.utils import get_currency_symbol, utc_now
+from utils.events import transaction_event, publish_events
+from services.balance_service import BalanceService, Wallet
+from services.velocity import within_velocity_limits
+from services.sharding import shard_scope
+
+EXCHANGE_RATES = {
+    ("USD", "EUR"): 0.87896,
+    ("EUR", "USD"): 1.1379,
+}
+
+MAX_OPEN_QUOTES_PER_USER = 20
+
+
+def _validate(amount, currency_from, currency_to):
+    """The rate for the request, or an error response."""
+    if not amount or amount <= 0:
+        return None, ({"status": "error","message": "Amount must be greater than zero"}, 400)
+    if currency_from == currency_to:
+        return None, ({"status": "error", "message": "Currencies must be different"}, 400)
+
+    rate = EXCHANGE_RATES.get((currency_from, currency_to))
+
+    if not rate:
+        return None, ({ "status": "error","message": "Currency pair not supported"}, 400)
+    return rate, None
+
 
 class ExchangeService:
 
+    @staticmethod
+    def quote(user, amount, currency_from, currency_to):
+        """Lock the current rate for ``amount`` until the quote expires."""
+
+        if not user:
+            return {"message": "User not found"}, 404
+
+        rate, error = _validate(amount, currency_from, currency_to)
+        if error:
+            return error
+
+        now = utc_now()
+        ExchangeService.prune_quotes()
+        open_quotes = ExchangeQuote.query.filter(
+            ExchangeQuote.user_id == user.id, ExchangeQuote.expires_at > now
+        ).count()
+        if open_quotes >= MAX_OPEN_QUOTES_PER_USER:
+            return {"status": "error", "message": "Too many open quotes, use or let some expire first"}, 429
+
+        quote = ExchangeQuote(
+            id=uuid.uuid4().hex,
+            user_id=user.id,
+            amount=amount,
+            currency_from=currency_from,
+            currency_to=currency_to,
+            rate=rate,
+            expires_at=now + timedelta(seconds=current_app.config.get("EXCHANGE_QUOTE_TTL_SECONDS", 30))
+        )
+        db.session.add(quote)
+        db.session.commit()
+
+        return {
+            "quote_id": quote.id,
+            "rate": rate,
+            "amount": round(amount, 2),
+            "converted_amount": round(amount * rate, 2),
+            "currency_from": currency_from,
+            "currency_to": currency_to,
+            "expires_at": quote.expires_at.isoformat()
+        }, 201
+
+    @staticmethod
+    def exchange_quote(user, quote_id):
+        """Execute a quote at its locked rate, without looking the rate up again."""
+
+        if not user:
+            return {"message": "User not found"}, 404
+
+        quote = db.session.get(ExchangeQuote, quote_id)
+        if not quote or quote.user_id != user.id:
+            return {"status": "error", "message": "Quote not found"}, 404
+
+        amount, currency_from, currency_to, rate = quote.amount, quote.currency_from, quote.currency_to, quote.rate
+
+        # Claim the quote in the same transaction as the exchange, so it is used at most once
+        claimed = ExchangeQuote.query.filter(
+            ExchangeQuote.id == quote_id,
+            ExchangeQuote.used_at.is_(None),
+            ExchangeQuote.expires_at > utc_now()
+        ).update({ExchangeQuote.used_at: utc_now()}, synchronize_session=False)
+        if not claimed:
+            db.session.rollback()
+            return {"status": "error", "message": "Quote expired or already used"}, 400
+
+        return ExchangeService._execute(user, amount, currency_from, currency_to, rate)
+
+    @staticmethod
+    def prune_quotes(force=False):
+        """Delete expired quotes, at most once per EXCHANGE_QUOTE_PRUNE_SECONDS unless forced."""
+        state = current_app.extensions.setdefault("exchange_quote_prune", {"pruned_at": None})
+        interval = current_app.config.get("EXCHANGE_QUOTE_PRUNE_SECONDS", 60)
+        now = time.monotonic()
+        if not force and state["pruned_at"] is not None and now - state["pruned_at"] < interval:
+            return 0
+
+        state["pruned_at"] = now
+        return ExchangeQuote.query.filter(ExchangeQuote.expires_at <= utc_now()).delete(
+            synchronize_session=False
+        )
+
     @staticmethod
     def exchange(user,amount, currency_from,  currency_to ):
          
         if not user:
             return {"message": "User not found"}, 404
 
-    
-        if not amount or amount <= 0:
-            return {"status": "error","message": "Amount must be greater than zero"}, 400
-        if currency_from == currency_to:
-            return {"status": "error", "message": "Currencies must be different"}, 400
+        rate, error = _validate(amount, currency_from, currency_to)
+        if error:
+            return error
 
-        exchange_rates = {
-            ("USD", "EUR"): 0.87896,
-            ("EUR", "USD"): 1.1379,
-        }
+        return ExchangeService._execute(user, amount, currency_from, currency_to, rate)
 
-        rate = exchange_rates.get((currency_from, currency_to))
+    @staticmethod
+    def _execute(user, amount, currency_from, currency_to, rate):
+        with shard_scope(user.id):
+            result, status_code = within_velocity_limits(
+                user.id, "exchange", currency_from, amount,
+                lambda: ExchangeService._apply(user, amount, currency_from, currency_to, rate)
+            )
+        # Settles a quote claimed for this exchange; with shards the wallet was committed on its own
+        if status_code == 200:
+            db.session.commit()
+        else:
+            db.session.rollback()
+        return result, status_code
 
-        if not rate:
-            return { "status": "error","message": "Currency pair not supported"}, 400
+    @staticmethod
+    def _apply(user, amount, currency_from, currency_to, rate):
 
-        balance_from = next((b for b in user.balances if b.currency == currency_from), None)
-        balance_to = next((b for b in user.balances if b.currency == currency_to), None)
+        converted_amount = amount * rate
 
-        if not balance_from or balance_from.balance < amount:
+        balance_from = BalanceService.debit(user, currency_from, amount)
+        if balance_from is None:
+            db.session.rollback()
             return {"status": "error", "message": f"Insufficient balance in {currency_from}"}, 400
 
-        if not balance_to:
-            balance_to = UserBalance(user_id=user.id, currency=currency_to, balance=0.0)
-            db.session.add(balance_to)
-
-        converted_amount = amount * rate
-        balance_from.balance -= amount
-        balance_to.balance += converted_amount
+        balance_to = BalanceService.credit(user, currency_to, converted_amount)
 
         transaction = Transaction(
             user_id=user.id,
@@ -54,15 +166,18 @@ class ExchangeService:
         )
 
         db.session.add(transaction)
+        db.session.flush()
+        events = [(user.id, transaction_event(
+            transaction, "debited", [Wallet(currency_from, balance_from), Wallet(currency_to, balance_to)]
+        ))]
         db.session.commit()
-
-        user.balance = sum([b.balance for b in user.balances])
+        publish_events(events)
 
         return {
             "message": "Exchange successful",
             "converted_amount": round(converted_amount, 2),
-            "balance_from": round(balance_from.balance, 2),
-            "balance_to": round(balance_to.balance, 2),
+            "balance_from": round(balance_from, 2),
+            "balance_to": round(balance_to, 2),
             "currency_from": currency_from,
             "currency_to": currency_to,
             "currency_symbol": get_currency_symbol(currency_to)
@@ -0,0 +1,127 @@
+import csv
+import io
+import json
+
+from sqlalchemy import select
+
+from models.user import db, User
+from models.user_balance import UserBalance
+from models.transaction import Transaction
+
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "ndjson": "application/x-ndjson",
+}
+
+# Rows fetched per round trip from the server-side cursor
+EXPORT_BATCH_SIZE = 1000
+
+USER_FIELDS = ["id", "username", "email", "is_admin", "created_at", "balances"]
+
+TRANSACTION_FIELDS = [
+    "id", "seq", "created_at", "type", "user_id", "target_user_id", "amount",
+    "currency", "currency_from", "currency_to", "converted_amount",
+]
+
+
+def _stream(records, fields, export_format):
+    """Serialize dict records as CSV or NDJSON, yielding one chunk per batch."""
+    buffer = io.StringIO()
+    writer = None
+
+    if export_format == "csv":
+        writer = csv.writer(buffer)
+        writer.writerow(fields)
+
+    pending = 0
+    for record in records:
+        if writer:
+            writer.writerow([_csv_value(record[field]) for field in fields])
+        else:
+            buffer.write(json.dumps(record))
+            buffer.write("\n")
+
+        pending += 1
+        if pending >= EXPORT_BATCH_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+            pending = 0
+
+    if buffer.tell():
+        yield buffer.getvalue()
+
+
+def _csv_value(value):
+    if isinstance(value, dict):
+        return ";".join(f"{key}={amount:.2f}" for key, amount in value.items())
+    if value is None:
+        return ""
+    return value
+
+
+def _rounded_balances(record):
+    record["balances"] = {currency: round(amount, 2) for currency, amount in record["balances"].items()}
+    return record
+
+
+class ExportService:
+
+    @staticmethod
+    def stream_users(export_format):
+        """Users with their balances, one record per user, ordered by id."""
+        statement = (
+            select(
+                User.id, User.username, User.email, User.is_admin, User.created_at,
+                UserBalance.currency, UserBalance.balance,
+            )
+            .outerjoin(UserBalance, UserBalance.user_id == User.id)
+            .order_by(User.id)
+        )
+
+        def records():
+            rows = db.session.execute(
+                statement, execution_options={"yield_per": EXPORT_BATCH_SIZE}
+            )
+            current = None
+            for user_id, username, email, is_admin, created_at, currency, balance in rows:
+                if current is None or current["id"] != user_id:
+                    if current is not None:
+                        yield _rounded_balances(current)
+                    current = {
+                        "id": user_id,
+                        "username": username,
+                        "email": email,
+                        "is_admin": is_admin,
+                        "created_at": created_at.isoformat(),
+                        "balances": {},
+                    }
+                if currency is not None:
+                    # Sharded wallets have one row per slot
+                    balances = current["balances"]
+                    balances[currency] = balances.get(currency, 0.0) + (balance or 0.0)
+            if current is not None:
+                yield _rounded_balances(current)
+
+        return _stream(records(), USER_FIELDS, export_format)
+
+    @staticmethod
+    def stream_transactions(export_format, user_id=None):
+        """Transactions in ledger order, optionally limited to one user."""
+        statement = select(*(getattr(Transaction, field) for field in TRANSACTION_FIELDS))
+        if user_id:
+            statement = statement.where(
+                (Transaction.user_id == user_id) | (Transaction.target_user_id == user_id)
+            )
+        statement = statement.order_by(Transaction.seq.asc())
+
+        def records():
+            rows = db.session.execute(
+                statement, execution_options={"yield_per": EXPORT_BATCH_SIZE}
+            )
+            for row in rows:
+                record = dict(zip(TRANSACTION_FIELDS, row))
+                record["created_at"] = record["created_at"].isoformat()
+                yield record
+
+        return _stream(records(), TRANSACTION_FIELDS, export_format)
@@ -0,0 +1,68 @@
+from flask import current_app, has_app_context
+from sqlalchemy import event
+
+from models.transaction import Transaction
+from utils.cache import LRUCache
+from utils.replica import RoutingSession
+
+
+class HistoryCache:
+    """Serialized /user/transactions pages, keyed by user and cursor.
+
+    Pages of a user are dropped as soon as a transaction that involves them
+    (as sender or recipient) commits in this process; the TTL bounds how long
+    other workers may keep serving a page from before that commit.
+    """
+
+    def __init__(self, app=None):
+        self.pages = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("HISTORY_CACHE_SIZE", 10000)
+        app.config.setdefault("HISTORY_CACHE_TTL", 30)
+        self.pages = LRUCache(
+            maxsize=app.config["HISTORY_CACHE_SIZE"],
+            ttl=app.config["HISTORY_CACHE_TTL"]
+        )
+        app.extensions["history_cache"] = self
+
+    def get(self, user_id, limit, before):
+        return self.pages.get((user_id, limit, before))
+
+    def generation(self, user_id):
+        return self.pages.generation(user_id)
+
+    def set(self, user_id, limit, before, page, generation):
+        self.pages.set((user_id, limit, before), page, group=user_id, generation=generation)
+
+    def invalidate(self, user_id):
+        self.pages.invalidate_group(user_id)
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _collect_ledger_users(session, flush_context):
+    for obj in session.new:
+        if isinstance(obj, Transaction):
+            users = session.info.setdefault("ledger_users", set())
+            users.add(obj.user_id)
+            if obj.target_user_id:
+                users.add(obj.target_user_id)
+
+
+@event.listens_for(RoutingSession, "after_commit")
+def _invalidate_history(session):
+    users = session.info.pop("ledger_users", None)
+    if not users or not has_app_context():
+        return
+
+    cache = current_app.extensions.get("history_cache")
+    if cache is not None:
+        for user_id in users:
+            cache.invalidate(user_id)
+
+
+@event.listens_for(RoutingSession, "after_rollback")
+def _forget_ledger_users(session):
+    session.info.pop("ledger_users", None)
@@ -0,0 +1,138 @@
+from contextlib import contextmanager
+
+from sqlalchemy import and_, case, func, select
+
+from models.user import db
+from models.transaction import Transaction
+from services.postings import balances_statement, user_account
+
+
+# Ledger positions come from a sequence on PostgreSQL and follow the order they
+# were handed out in, not the commit order: a row with a lower seq can commit
+# after a higher one was read. Reads that take a bound or balances first and
+# the rows after must then share one snapshot to agree with each other.
+SNAPSHOT_ISOLATION_LEVEL = "REPEATABLE READ"
+
+
+def snapshot_options(dialect):
+    """Execution options of a connection whose reads share one snapshot."""
+    if dialect.name == "postgresql":
+        return {"isolation_level": SNAPSHOT_ISOLATION_LEVEL}
+    # SQLite, used in development and tests, has no such isolation level
+    return {}
+
+
+@contextmanager
+def ledger_snapshot():
+    """Run the ledger reads of the block in one snapshot.
+
+    The block gets a session of its own, like ``shard_scope``, whose ledger
+    connection is opened with ``snapshot_options``; objects loaded inside are
+    detached when it ends.
+    """
+    bind_arguments = {"mapper": Transaction.__mapper__}
+    options = snapshot_options(db.session.get_bind(**bind_arguments).dialect)
+    if not options:
+        yield
+        return
+
+    outer = db.session.registry()
+    session = db.session.session_factory()
+    db.session.registry.set(session)
+    try:
+        session.connection(bind_arguments=bind_arguments, execution_options=options)
+        yield
+    finally:
+        session.close()
+        db.session.registry.set(outer)
+
+
+def row_effects(transaction, user_id=None):
+    """The status of a ledger row and the (currency, delta) pairs it applies.
+
+    ``user_id`` is the account whose balances are projected: a transfer credits
+    it as recipient and debits it as sender. Without one (the whole ledger)
+    every transfer counts as the sender's debit.
+    """
+    t = transaction
+    if t.type in ("top_up", "refund"):
+        return "credited", ((t.currency, t.amount),)
+    if t.type == "exchange":
+        if t.converted_amount is None:
+            return "unknown", ()
+        status = "debited" if t.currency_from == t.currency else "credited"
+        return status, ((t.currency_from, -t.amount), (t.currency_to, t.converted_amount))
+    if t.type == "transfer":
+        if user_id is not None and t.target_user_id == user_id:
+            return "credited", ((t.currency, t.amount),)
+        return "debited", ((t.currency, -t.amount),)
+    return "unknown", ()
+
+
+def project(rows, user_id=None, balances=None, descending=False):
+    """Yield ``(transaction, status, balances)`` with the balances right after each row.
+
+    Ascending rows start from the balances before the first row; descending rows
+    (newest first) start from the balances after the first row and undo each
+    row once it was yielded, so neither order needs the rows in memory. The
+    balances dict is updated in place, read it before advancing.
+    """
+    balances = {} if balances is None else balances
+    for transaction in rows:
+        status, effects = row_effects(transaction, user_id)
+        for currency, _ in effects:
+            balances.setdefault(currency, 0.0)
+        balances.setdefault(transaction.currency, 0.0)
+
+        if not descending:
+            for currency, delta in effects:
+                balances[currency] += delta
+        yield transaction, status, balances
+        if descending:
+            for currency, delta in effects:
+                balances[currency] -= delta
+
+
+def balance_statements(user_id, seq, inclusive=False):
+    """Statements summing the balances per currency up to ledger position ``seq``.
+
+    Their rows (currency, amount) add up, see ``sum_balances``, to what
+    ``project`` holds before the row at ``seq``, or after it if ``inclusive``.
+    A user's balances are one indexed sum over their postings; the whole
+    ledger (``user_id`` None) has no account of its own and is summed from
+    the ledger rows.
+    """
+    if user_id is not None:
+        return (balances_statement(user_account(user_id), seq, inclusive),)
+
+    position = Transaction.seq <= seq if inclusive else Transaction.seq < seq
+
+    # Exchanges debit currency_from, which is stored as the transaction currency
+    signed_amount = case(
+        (Transaction.type.in_(("top_up", "refund")), Transaction.amount),
+        (Transaction.type == "transfer", -Transaction.amount),
+        (and_(Transaction.type == "exchange", Transaction.converted_amount.isnot(None)), -Transaction.amount),
+        else_=0.0
+    )
+    return (
+        select(Transaction.currency, func.sum(signed_amount)).where(position).group_by(Transaction.currency),
+        select(Transaction.currency_to, func.sum(Transaction.converted_amount))
+        .where(position, Transaction.type == "exchange")
+        .group_by(Transaction.currency_to),
+    )
+
+
+def sum_balances(rows):
+    balances = {}
+    for currency, amount in rows:
+        if currency is not None:
+            balances[currency] = balances.get(currency, 0.0) + (amount or 0.0)
+    return balances
+
+
+def balances_at(user_id, seq, inclusive=False):
+    """The balances per currency before ledger position ``seq``, or after it if ``inclusive``."""
+    rows = []
+    for statement in balance_statements(user_id, seq, inclusive):
+        rows.extend(db.session.execute(statement))
+    return sum_balances(rows)
@@ -0,0 +1,189 @@
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError
+
+from models.user import db, User
+from models.transaction import Transaction
+from utils.utils import get_currency_symbol
+from utils.events import transaction_event, publish_events
+from services.balance_service import BalanceService, Wallet
+
+logger = logging.getLogger(__name__)
+
+
+class _PendingTransfer:
+
+    def __init__(self, sender_id, target_user, amount, currency):
+        self.sender_id = sender_id
+        self.target_user_id = target_user.id
+        self.target_username = target_user.username
+        self.amount = amount
+        self.currency = currency
+        self.future = Future()
+
+
+class LedgerWriter:
+    """Group commit for transfers to hot merchant accounts.
+
+    Transfers to an account listed in ``LEDGER_HOT_ACCOUNTS`` are queued and a
+    single writer thread per account applies them in micro-batches: one locked
+    read of the senders' balances, one increment of the receiver's balance, one
+    bulk insert of the Transaction rows and one commit for the whole batch.
+    Each caller blocks until the batch containing its transfer committed.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self.hot_accounts = frozenset()
+        self._queues = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("LEDGER_WRITER_ENABLED", False)
+        app.config.setdefault("LEDGER_HOT_ACCOUNTS", ())
+        app.config.setdefault("LEDGER_BATCH_SIZE", 100)
+        app.config.setdefault("LEDGER_BATCH_WAIT_MS", 5)
+        app.config.setdefault("LEDGER_WRITER_TIMEOUT", 10)
+
+        self.app = app
+        if app.config["LEDGER_WRITER_ENABLED"]:
+            self.hot_accounts = frozenset(int(account) for account in app.config["LEDGER_HOT_ACCOUNTS"])
+        app.extensions["ledger_writer"] = self
+
+    def is_hot(self, user_id):
+        return int(user_id) in self.hot_accounts
+
+    def transfer(self, sender_id, target_user, amount, currency):
+        """Queue a transfer to a hot account and wait for its batch to commit."""
+        pending = _PendingTransfer(int(sender_id), target_user, amount, currency)
+        # Waiting callers must not each pin a pooled connection
+        db.session.close()
+        self._queue_for(pending.target_user_id).put(pending)
+
+        try:
+            return pending.future.result(timeout=self.app.config["LEDGER_WRITER_TIMEOUT"])
+        except TimeoutError:
+            if pending.future.cancel():
+                return {"message": "Transfer could not be processed, please retry"}, 503
+            # The writer already picked the transfer up, its batch finishes shortly
+            return pending.future.result()
+        except Exception:
+            return {"message": "Transfer failed"}, 500
+
+    def _queue_for(self, receiver_id):
+        with self._lock:
+            pending = self._queues.get(receiver_id)
+            if pending is None:
+                pending = queue.Queue()
+                self._queues[receiver_id] = pending
+                threading.Thread(
+                    target=self._run,
+                    args=(receiver_id, pending),
+                    name=f"ledger-writer-{receiver_id}",
+                    daemon=True
+                ).start()
+            return pending
+
+    def _run(self, receiver_id, pending):
+        batch_size = self.app.config["LEDGER_BATCH_SIZE"]
+        wait = self.app.config["LEDGER_BATCH_WAIT_MS"] / 1000
+
+        while True:
+            batch = [pending.get()]
+            deadline = time.monotonic() + wait
+            while len(batch) < batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(pending.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Skip transfers whose caller gave up waiting
+            batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            with self.app.app_context():
+                try:
+                    results = self._apply_batch(receiver_id, batch)
+                except Exception as error:
+                    db.session.rollback()
+                    logger.exception("Ledger batch for account %s failed", receiver_id)
+                    for item in batch:
+                        item.future.set_exception(error)
+                    continue
+                finally:
+                    db.session.remove()
+
+            for item, result in zip(batch, results):
+                item.future.set_result(result)
+
+    def _apply_batch(self, receiver_id, batch):
+        sender_ids = sorted({item.sender_id for item in batch})
+        currencies = {item.currency for item in batch}
+
+        # Lock the senders' balances in a stable order so batches cannot deadlock
+        sender_slots = BalanceService.load_slots(sender_ids, currencies, lock=True)
+        receiver = db.session.get(User, receiver_id)
+
+        results = []
+        accepted = []
+        credits = {}
+        for item in batch:
+            sender_balance = BalanceService.draw_down(
+                sender_slots.get((item.sender_id, item.currency), []), item.amount
+            )
+            if sender_balance is None:
+                results.append(({"message": f"Insufficient balance in {item.currency}"}, 400))
+                continue
+
+            credits[item.currency] = credits.get(item.currency, 0.0) + item.amount
+            # A sender can appear more than once in a batch, keep the balance after this transfer
+            balance_after = Wallet(item.currency, sender_balance)
+            accepted.append((item, balance_after, Transaction(
+                user_id=item.sender_id,
+                type="transfer",
+                amount=item.amount,
+                currency=item.currency,
+                target_user_id=receiver_id,
+                currency_symbol=get_currency_symbol(item.currency),
+                currency_from=item.currency
+            )))
+            results.append(None)
+
+        db.session.add_all([transaction for _, _, transaction in accepted])
+        # One increment of the receiver's wallet per currency for the whole batch
+        receiver_balances = {
+            currency: Wallet(currency, BalanceService.credit(receiver, currency, total))
+            for currency, total in credits.items()
+        }
+        db.session.flush()
+
+        events = []
+        for item, sender_balance, transaction in accepted:
+            events.append((item.sender_id, transaction_event(transaction, "debited", [sender_balance])))
+            events.append((receiver_id, transaction_event(
+                transaction, "credited", [receiver_balances[item.currency]]
+            )))
+        responses = iter([
+            ({
+                "message": "Transfer successful",
+                "balance": round(sender_balance.balance, 2),
+                "currency": item.currency,
+                "target_user_id": receiver_id,
+                "target_username": item.target_username,
+                "amount": round(item.amount, 2)
+            }, 200)
+            for item, sender_balance, _ in accepted
+        ])
+
+        db.session.commit()
+        publish_events(events)
+
+        return [result if result is not None else next(responses) for result in results]
@@ -0,0 +1,109 @@
+from sqlalchemy import event, func, select
+
+from models.user import db
+from models.posting import Posting
+from models.transaction import Transaction
+from services.sharding import each_shard, is_local
+from utils.replica import RoutingSession
+
+# System accounts on the other side of the users' legs
+EXTERNAL_ACCOUNT = "external"  # money entering through top-ups
+FX_ACCOUNT = "fx"  # the desk every exchange trades with
+TRANSIT_ACCOUNT = "transit"  # transfers between shards, until credited or refunded
+
+
+def user_account(user_id):
+    return f"user:{user_id}"
+
+
+def legs(transaction):
+    """The (account, currency, amount) legs of a ledger row, zero-sum per currency.
+
+    Inside a shard scope a cross-shard transfer has a copy of its row on both
+    shards; the leg of the user living on the other shard is booked against
+    the transit account instead, so each shard balances on its own.
+    """
+    t = transaction
+    if t.type == "top_up":
+        return [(EXTERNAL_ACCOUNT, t.currency, -t.amount), (user_account(t.user_id), t.currency, t.amount)]
+    if t.type == "refund":
+        return [(TRANSIT_ACCOUNT, t.currency, -t.amount), (user_account(t.user_id), t.currency, t.amount)]
+    if t.type == "transfer":
+        sender = user_account(t.user_id) if is_local(t.user_id) else TRANSIT_ACCOUNT
+        recipient = user_account(t.target_user_id) if is_local(t.target_user_id) else TRANSIT_ACCOUNT
+        return [(sender, t.currency, -t.amount), (recipient, t.currency, t.amount)]
+    if t.type == "exchange" and t.converted_amount is not None:
+        return [
+            (user_account(t.user_id), t.currency_from, -t.amount),
+            (FX_ACCOUNT, t.currency_from, t.amount),
+            (FX_ACCOUNT, t.currency_to, -t.converted_amount),
+            (user_account(t.user_id), t.currency_to, t.converted_amount),
+        ]
+    return []
+
+
+def posting_rows(transaction):
+    return [
+        {
+            "transaction_id": transaction.id,
+            "seq": transaction.seq,
+            "account": account,
+            "currency": currency,
+            "amount": amount,
+        }
+        for account, currency, amount in legs(transaction)
+    ]
+
+
+def balances_statement(account, seq=None, inclusive=False):
+    """Balance of ``account`` per currency, up to ledger position ``seq`` if given."""
+    statement = (
+        select(Posting.currency, func.sum(Posting.amount))
+        .where(Posting.account == account)
+        .group_by(Posting.currency)
+    )
+    if seq is not None:
+        statement = statement.where(Posting.seq <= seq if inclusive else Posting.seq < seq)
+    return statement
+
+
+def backfill(batch_size=1000):
+    """Write the postings of ledger rows that have none, on the primary or on every shard.
+
+    Returns the number of ledger rows posted.
+    """
+    unposted = (
+        select(Transaction)
+        .where(~select(Posting.id).where(Posting.transaction_id == Transaction.id).exists())
+        .order_by(Transaction.seq)
+        .limit(batch_size)
+    )
+    count = 0
+    for _ in each_shard():
+        after = None
+        while True:
+            statement = unposted if after is None else unposted.where(Transaction.seq > after)
+            transactions = db.session.scalars(statement).all()
+            rows = [row for transaction in transactions for row in posting_rows(transaction)]
+            if rows:
+                db.session.execute(Posting.__table__.insert(), rows)
+            db.session.commit()
+
+            count += len(transactions)
+            if len(transactions) < batch_size:
+                break
+            after = transactions[-1].seq
+    return count
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _write_postings(session, flush_context):
+    # Same flush and transaction as the ledger rows, in one executemany
+    rows = [
+        row
+        for obj in session.new
+        if isinstance(obj, Transaction)
+        for row in posting_rows(obj)
+    ]
+    if rows:
+        session.execute(Posting.__table__.insert(), rows)
@@ -0,0 +1,349 @@
+import csv
+import gzip
+import logging
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta, timezone
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy import func, or_, select, update
+
+from models.user import db, User
+from models.report_job import ReportJob
+from models.transaction import Transaction
+from services.export_service import TRANSACTION_FIELDS
+from services.ledger_projection import balance_statements, project, snapshot_options, sum_balances
+from utils.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+REPORT_KINDS = ("statement", "transactions")
+
+# Rows fetched per round trip from the server-side cursor
+REPORT_BATCH_SIZE = 1000
+
+STATEMENT_FIELDS = [
+    "seq", "created_at", "type", "status", "amount", "currency", "currency_from", "currency_to",
+    "converted_amount", "counterparty_id", "balance", "balance_to",
+]
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    value = datetime.fromisoformat(value)
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def _serialize(job):
+    return {
+        "id": job.id,
+        "kind": job.kind,
+        "user_id": job.user_id,
+        "date_from": job.date_from.isoformat() if job.date_from else None,
+        "date_to": job.date_to.isoformat() if job.date_to else None,
+        "state": job.state,
+        "rows": job.rows,
+        "size": job.size,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+
+
+class ReportJobs:
+    """Builds reports in a pool of ``REPORT_WORKERS`` processes per app worker.
+
+    A job row is committed on the primary, then one of the processes streams
+    the ledger rows with its own engine, writes them gzip-compressed to
+    ``REPORT_DIRECTORY`` and records the outcome on the job row, so request
+    workers never spend CPU on a report. At most ``REPORT_MAX_PENDING`` jobs
+    wait or run per app worker, and at most ``REPORT_MAX_PENDING_PER_USER`` per
+    requester across all workers. The files stay on the host that built them;
+    with several hosts the directory has to be shared. Jobs of a worker that
+    died while building stay queued or running until ``prune`` deletes them
+    with the reports older than ``REPORT_RETENTION_DAYS``.
+    """
+
+    def __init__(self, app=None):
+        self.app = None
+        self._executor = None
+        self._pending = set()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("REPORT_DIRECTORY", "/tmp/goldenia-reports")
+        app.config.setdefault("REPORT_WORKERS", 2)
+        app.config.setdefault("REPORT_MAX_PENDING", 20)
+        app.config.setdefault("REPORT_MAX_PENDING_PER_USER", 3)
+        app.config.setdefault("REPORT_RETENTION_DAYS", 7)
+        # "spawn" starts clean interpreters, without the sockets and threads of the app worker
+        app.config.setdefault("REPORT_START_METHOD", "spawn")
+
+        self.app = app
+        app.extensions["report_jobs"] = self
+
+    def path(self, job):
+        return os.path.join(self.app.config["REPORT_DIRECTORY"], f"{job.id}.csv.gz")
+
+    def create(self, user, kind, user_id=None, date_from=None, date_to=None):
+        """Queue a report. Users may only ask for their own statement."""
+        if kind not in REPORT_KINDS:
+            return {"message": f"kind must be one of {', '.join(REPORT_KINDS)}"}, 400
+        try:
+            date_from = _parse_datetime(date_from)
+            date_to = _parse_datetime(date_to)
+        except (ValueError, TypeError):
+            return {"message": "Invalid date_from or date_to"}, 400
+        if date_from and date_to and date_from >= date_to:
+            return {"message": "date_from must be before date_to"}, 400
+
+        if not user.is_admin:
+            if kind != "statement" or user_id not in (None, user.id):
+                return {"message": "Access forbidden: Admins only"}, 403
+            user_id = user.id
+        elif kind == "statement" and user_id is None:
+            return {"message": "user_id is required for a statement"}, 400
+        if user_id is not None and (
+            isinstance(user_id, bool) or not isinstance(user_id, int) or db.session.get(User, user_id) is None
+        ):
+            return {"message": "User not found"}, 404
+
+        # Counted on the job rows, so that the limit holds across app workers
+        waiting = db.session.scalar(
+            select(func.count(ReportJob.id))
+            .where(ReportJob.requested_by == user.id, ReportJob.state.in_(("queued", "running")))
+        )
+        if waiting >= self.app.config["REPORT_MAX_PENDING_PER_USER"]:
+            return {"message": "Too many of your reports are being built, try again later"}, 429
+
+        with self._lock:
+            if len(self._pending) >= self.app.config["REPORT_MAX_PENDING"]:
+                return {"message": "Too many reports are being built, try again later"}, 429
+
+            job = ReportJob(
+                id=uuid.uuid4().hex, kind=kind, requested_by=user.id, user_id=user_id,
+                date_from=date_from, date_to=date_to, state="queued"
+            )
+            db.session.add(job)
+            db.session.commit()
+            self._submit(job)
+
+        return _serialize(job), 202
+
+    def get(self, user, job_id):
+        job = db.session.get(ReportJob, job_id)
+        if job is None or (job.requested_by != user.id and not user.is_admin):
+            return None
+        return job
+
+    def status(self, user, job_id):
+        job = self.get(user, job_id)
+        if job is None:
+            return {"message": "Report not found"}, 404
+        return _serialize(job), 200
+
+    def prune(self):
+        """Delete the jobs and report files older than ``REPORT_RETENTION_DAYS``.
+
+        Files are matched by modification time, so files of jobs whose rows are
+        already gone, e.g. deleted from another host, are removed too. Returns
+        (jobs, files) deleted.
+        """
+        cutoff = utc_now() - timedelta(days=self.app.config["REPORT_RETENTION_DAYS"])
+        jobs = ReportJob.query.filter(ReportJob.created_at < cutoff).delete()
+        db.session.commit()
+
+        files = 0
+        directory = self.app.config["REPORT_DIRECTORY"]
+        if os.path.isdir(directory):
+            oldest = cutoff.replace(tzinfo=timezone.utc).timestamp()
+            for entry in os.scandir(directory):
+                if not entry.name.endswith((".csv.gz", ".csv.gz.part")) or entry.stat().st_mtime >= oldest:
+                    continue
+                try:
+                    os.remove(entry.path)
+                except FileNotFoundError:
+                    # Removed by a concurrent prune
+                    continue
+                files += 1
+        return jobs, files
+
+    def _submit(self, job):
+        os.makedirs(self.app.config["REPORT_DIRECTORY"], exist_ok=True)
+        arguments = (
+            job.id, job.kind, job.user_id, job.date_from, job.date_to,
+            _url(db.engine), _ledger_urls(job.user_id), self.path(job),
+        )
+        try:
+            future = self._pool().submit(build_report, *arguments)
+        except BrokenProcessPool:
+            # A process of the pool died, e.g. killed for memory; start a new pool
+            self._executor = None
+            future = self._pool().submit(build_report, *arguments)
+
+        self._pending.add(future)
+        future.add_done_callback(lambda done: self._finished(done, job.id))
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.app.config["REPORT_WORKERS"],
+                mp_context=multiprocessing.get_context(self.app.config["REPORT_START_METHOD"])
+            )
+        return self._executor
+
+    def _finished(self, future, job_id):
+        with self._lock:
+            self._pending.discard(future)
+
+        error = future.exception()
+        if error is None:
+            return
+        # build_report records its own failures, this is a process that died
+        logger.error("Report %s could not be built", job_id, exc_info=error)
+        with self.app.app_context():
+            db.session.execute(
+                update(ReportJob)
+                .where(ReportJob.id == job_id, ReportJob.state.in_(("queued", "running")))
+                .values(state="failed", error=str(error)[:255] or type(error).__name__, finished_at=utc_now())
+            )
+            db.session.commit()
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+def _url(engine):
+    return engine.url.render_as_string(hide_password=False)
+
+
+def _ledger_urls(user_id):
+    """(url, shard) of the databases holding the ledger rows to report on; shard is None without shards."""
+    shards = current_app.extensions.get("shard_router")
+    if shards is None:
+        return [(_url(db.engine), None)]
+    if user_id is not None:
+        shard = shards.shard_for(user_id)
+        return [(_url(shards.engine(shard)), shard)]
+    return [(_url(engine), shard) for shard, engine in enumerate(shards.engines)]
+
+
+def build_report(job_id, kind, user_id, date_from, date_to, database_url, ledger_urls, path):
+    """Build one report; runs in a process of the pool, without the Flask app."""
+    primary = sa.create_engine(database_url)
+    partial = f"{path}.part"
+    try:
+        _set_state(primary, job_id, state="running")
+        with gzip.open(partial, "wt", newline="") as file:
+            writer = csv.writer(file)
+            if kind == "statement":
+                rows = _write_statement(writer, ledger_urls[0][0], user_id, date_from, date_to)
+            else:
+                rows = _write_transactions(writer, ledger_urls, user_id, date_from, date_to)
+        # Downloads never see a half-written file
+        os.replace(partial, path)
+    except Exception as error:
+        logger.exception("Report %s failed", job_id)
+        if os.path.exists(partial):
+            os.remove(partial)
+        _set_state(primary, job_id, state="failed", error=str(error)[:255], finished_at=utc_now())
+    else:
+        _set_state(primary, job_id, state="done", rows=rows, size=os.path.getsize(path), finished_at=utc_now())
+    finally:
+        primary.dispose()
+
+
+def _set_state(engine, job_id, **values):
+    with engine.begin() as connection:
+        connection.execute(update(ReportJob.__table__).where(ReportJob.id == job_id).values(**values))
+
+
+def _within(statement, date_from, date_to):
+    if date_from:
+        statement = statement.where(Transaction.created_at >= date_from)
+    if date_to:
+        statement = statement.where(Transaction.created_at < date_to)
+    return statement
+
+
+def _write_transactions(writer, ledger_urls, user_id, date_from, date_to):
+    statement = select(*(getattr(Transaction, field) for field in TRANSACTION_FIELDS))
+    if user_id is not None:
+        statement = statement.where(or_(Transaction.user_id == user_id, Transaction.target_user_id == user_id))
+    statement = _within(statement, date_from, date_to).order_by(Transaction.seq)
+
+    writer.writerow(TRANSACTION_FIELDS)
+    count = 0
+    for url, shard in ledger_urls:
+        engine = sa.create_engine(url)
+        try:
+            with engine.connect() as connection:
+                rows = connection.execution_options(yield_per=REPORT_BATCH_SIZE).execute(statement)
+                for row in rows:
+                    # A transfer between shards is recorded on both, report it on the sender's
+                    # (ShardRouter.shard_for)
+                    if user_id is None and shard is not None and row.user_id % len(ledger_urls) != shard:
+                        continue
+                    writer.writerow([_csv_value(value) for value in row])
+                    count += 1
+        finally:
+            engine.dispose()
+    return count
+
+
+def _write_statement(writer, url, user_id, date_from, date_to):
+    involved = or_(Transaction.user_id == user_id, Transaction.target_user_id == user_id)
+    statement = _within(select(Transaction).where(involved), date_from, date_to)
+
+    writer.writerow(STATEMENT_FIELDS)
+    count = 0
+    engine = sa.create_engine(url)
+    try:
+        with engine.connect() as connection:
+            # The opening balances and the rows are read in one snapshot, see ledger_snapshot
+            connection = connection.execution_options(**snapshot_options(engine.dialect))
+            first = connection.execute(
+                _within(select(func.min(Transaction.seq)).where(involved), date_from, date_to)
+            ).scalar()
+            if first is None:
+                return 0
+
+            opening = []
+            for balances in balance_statements(user_id, first):
+                opening.extend(connection.execute(balances))
+
+            rows = connection.execution_options(yield_per=REPORT_BATCH_SIZE).execute(
+                statement.order_by(Transaction.seq)
+            )
+            for t, status, balances in project(rows, user_id, sum_balances(opening)):
+                writer.writerow([_csv_value(value) for value in (
+                    t.seq, t.created_at, t.type, status, t.amount, t.currency, t.currency_from, t.currency_to,
+                    t.converted_amount,
+                    t.target_user_id if t.user_id == user_id else t.user_id,
+                    round(balances[t.currency], 2),
+                    round(balances.get(t.currency_to, 0.0), 2) if t.type == "exchange" else None,
+                )])
+                count += 1
+    finally:
+        engine.dispose()
+    return count
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
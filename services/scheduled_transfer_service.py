@@ -0,0 +1,268 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import update
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import db, User
+from models.scheduled_transfer import ScheduledTransfer
+from services.transaction_service import TransactionService
+from services.velocity import within_velocity_limits
+from utils.events import publish_events
+from utils.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+MIN_INTERVAL_SECONDS = 60
+DEFAULT_BATCH_SIZE = 100
+
+
+def _parse_start(value):
+    if not value:
+        return utc_now()
+    start = datetime.fromisoformat(value)
+    if start.tzinfo is not None:
+        start = start.astimezone(timezone.utc).replace(tzinfo=None)
+    return start
+
+
+def _serialize(scheduled):
+    return {
+        "id": scheduled.id,
+        "target_user_id": scheduled.target_user_id,
+        "amount": round(scheduled.amount, 2),
+        "currency": scheduled.currency,
+        "interval_seconds": scheduled.interval_seconds,
+        "next_run_at": scheduled.next_run_at.isoformat(),
+        "active": scheduled.active,
+        "last_run_at": scheduled.last_run_at.isoformat() if scheduled.last_run_at else None,
+        "last_status": scheduled.last_status
+    }
+
+
+class ScheduledTransferService:
+
+    @staticmethod
+    def create(user, target_user_id, amount, currency, interval_seconds=None, start_at=None):
+
+        if not all([amount, target_user_id, currency]):
+            return {"message": "Amount, target_user_id, and currency are required"}, 400
+        if amount <= 0:
+            return {"message": "Amount must be greater than 0"}, 400
+        if interval_seconds is not None and (
+            not isinstance(interval_seconds, int) or interval_seconds < MIN_INTERVAL_SECONDS
+        ):
+            return {"message": f"interval_seconds must be at least {MIN_INTERVAL_SECONDS}"}, 400
+
+        try:
+            next_run_at = _parse_start(start_at)
+        except (ValueError, TypeError):
+            return {"message": "Invalid start_at"}, 400
+
+        target_user = db.session.get(User, target_user_id)
+        if not user or not target_user:
+            return {"message": "User not found"}, 404
+        if target_user.id == user.id:
+            return {"message": "Cannot schedule a transfer to yourself"}, 400
+
+        scheduled = ScheduledTransfer(
+            user_id=user.id,
+            target_user_id=target_user.id,
+            amount=amount,
+            currency=currency,
+            interval_seconds=interval_seconds,
+            next_run_at=next_run_at,
+            active=True
+        )
+        db.session.add(scheduled)
+        db.session.commit()
+
+        return _serialize(scheduled), 201
+
+    @staticmethod
+    def list_for_user(user):
+        scheduled = ScheduledTransfer.query.filter_by(user_id=user.id).order_by(ScheduledTransfer.id).all()
+        return {"scheduled_transfers": [_serialize(item) for item in scheduled]}, 200
+
+    @staticmethod
+    def cancel(user, scheduled_id):
+        scheduled = db.session.get(ScheduledTransfer, scheduled_id)
+        if not scheduled or scheduled.user_id != user.id:
+            return {"message": "Scheduled transfer not found"}, 404
+
+        scheduled.active = False
+        db.session.commit()
+        return _serialize(scheduled), 200
+
+    @staticmethod
+    def run_due(batch_size=DEFAULT_BATCH_SIZE):
+        """Execute every transfer that is due, one commit per batch.
+
+        Each transfer runs in a savepoint so one failure does not undo the rest
+        of its batch. With shards every transfer commits on its own, so the
+        batch is claimed and rescheduled first, see ``_run_sharded``. Returns
+        how many transfers succeeded and failed.
+        """
+        if current_app.extensions.get("shard_router") is not None:
+            return ScheduledTransferService._run_sharded(batch_size)
+
+        executed = failed = 0
+
+        while True:
+            now = utc_now()
+            due = ScheduledTransferService._due(now, batch_size)
+            if not due:
+                break
+
+            users = ScheduledTransferService._users(due)
+            events = []
+            for scheduled in due:
+                result, status_code, transfer_events = ScheduledTransferService._run(scheduled, users)
+
+                if status_code == 200:
+                    executed += 1
+                    events.extend(transfer_events)
+                else:
+                    failed += 1
+
+                scheduled.last_run_at = now
+                scheduled.last_status = result["message"]
+                ScheduledTransferService._reschedule(scheduled, now)
+
+            db.session.commit()
+            publish_events(events)
+
+        return {"executed": executed, "failed": failed}
+
+    @staticmethod
+    def _run_sharded(batch_size):
+        """``run_due`` when wallets live on shards.
+
+        Transfers commit on their shards, and a saga commits the primary session
+        in the middle of the batch, releasing the row locks. So each row is
+        claimed first: one conditional UPDATE moves its ``next_run_at`` and
+        only the runner whose UPDATE matched the old value executes it. The
+        claims are committed before any transfer runs, a run interrupted in
+        between is skipped rather than paid twice.
+        """
+        executed = failed = 0
+
+        while True:
+            now = utc_now()
+            due = ScheduledTransferService._due(now, batch_size)
+            if not due:
+                break
+
+            claimed = []
+            for scheduled in due:
+                next_run_at = ScheduledTransferService._following_run(scheduled, now)
+                claim = db.session.execute(
+                    update(ScheduledTransfer)
+                    .where(ScheduledTransfer.id == scheduled.id,
+                           ScheduledTransfer.next_run_at == scheduled.next_run_at,
+                           ScheduledTransfer.active.is_(True))
+                    .values(next_run_at=next_run_at or scheduled.next_run_at,
+                            active=next_run_at is not None, last_run_at=now)
+                    .execution_options(synchronize_session=False)
+                )
+                if claim.rowcount == 1:
+                    claimed.append(scheduled.id)
+            db.session.commit()
+
+            # The objects were expired by the commit, reload what this runner claimed
+            due = ScheduledTransfer.query.filter(ScheduledTransfer.id.in_(claimed)).all() if claimed else []
+            users = ScheduledTransferService._users(due)
+            for scheduled in due:
+                result, status_code, _ = ScheduledTransferService._run(scheduled, users)
+                if status_code == 200:
+                    executed += 1
+                else:
+                    failed += 1
+                db.session.execute(
+                    update(ScheduledTransfer)
+                    .where(ScheduledTransfer.id == scheduled.id)
+                    .values(last_status=result["message"])
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+
+        return {"executed": executed, "failed": failed}
+
+    @staticmethod
+    def _due(now, batch_size):
+        # skip_locked lets several workers share the queue on PostgreSQL
+        return (
+            ScheduledTransfer.query
+            .filter(ScheduledTransfer.active.is_(True), ScheduledTransfer.next_run_at <= now)
+            .order_by(ScheduledTransfer.next_run_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+            .all()
+        )
+
+    @staticmethod
+    def _users(due):
+        user_ids = {item.user_id for item in due} | {item.target_user_id for item in due}
+        if not user_ids:
+            return {}
+        return {user.id: user for user in User.query.filter(User.id.in_(user_ids))}
+
+    @staticmethod
+    def _run(scheduled, users):
+        sender = users.get(scheduled.user_id)
+        target_user = users.get(scheduled.target_user_id)
+        if not sender or not target_user:
+            return {"message": "User not found"}, 404, []
+        return ScheduledTransferService._execute(scheduled, sender, target_user)
+
+    @staticmethod
+    def _execute(scheduled, sender, target_user):
+        """Run one transfer within the sender's velocity limits, like POST /user/transfer.
+
+        Returns the response, its status code and the events to publish once the
+        batch is committed; over a limit the transfer fails with 429.
+        """
+        events = []
+
+        def transfer():
+            if current_app.extensions.get("shard_router") is not None:
+                # Wallets live on the shards, each transfer commits (and publishes) on its own
+                return TransactionService._execute_transfer(
+                    sender, target_user, scheduled.amount, scheduled.currency
+                )
+            try:
+                with db.session.begin_nested():
+                    result, status_code, transfer_events = TransactionService.apply_transfer(
+                        sender, target_user, scheduled.amount, scheduled.currency
+                    )
+            except SQLAlchemyError:
+                logger.exception("Scheduled transfer %s failed", scheduled.id)
+                return {"message": "Transfer failed"}, 500
+            events.extend(transfer_events)
+            return result, status_code
+
+        result, status_code = within_velocity_limits(
+            sender.id, "transfer", scheduled.currency, scheduled.amount, transfer
+        )
+        # A cross-shard transfer whose credit is still pending has debited the sender
+        return result, 200 if status_code == 202 else status_code, events
+
+    @staticmethod
+    def _reschedule(scheduled, now):
+        next_run_at = ScheduledTransferService._following_run(scheduled, now)
+        if next_run_at is None:
+            scheduled.active = False
+        else:
+            scheduled.next_run_at = next_run_at
+
+    @staticmethod
+    def _following_run(scheduled, now):
+        """When a recurring transfer runs next, None for a one-off transfer."""
+        if not scheduled.interval_seconds:
+            return None
+
+        interval = timedelta(seconds=scheduled.interval_seconds)
+        # Runs missed while no worker was running are skipped, not paid out in a burst
+        missed = (now - scheduled.next_run_at) // interval
+        return scheduled.next_run_at + (missed + 1) * interval
@@ -0,0 +1,154 @@
+import contextvars
+from contextlib import contextmanager
+
+import sqlalchemy as sa
+from flask import current_app, has_app_context
+from sqlalchemy.sql.util import find_tables
+
+from models.user import db
+
+# Tables whose rows live on the shard of their user; everything else stays on the primary
+SHARDED_TABLES = frozenset(("user_balance", "transaction", "posting", "transfer_saga_step"))
+
+_current_shard = contextvars.ContextVar("current_shard", default=None)
+
+
+class ShardRouter:
+    """Spreads the wallets and ledgers of users over ``SHARD_DATABASE_URLS``.
+
+    A user's ``user_balance``, ``transaction`` and ``posting`` rows live on shard
+    ``user_id % shard_count``; users themselves, and every other table, stay on
+    the primary database, which acts as the directory. Code inside
+    ``shard_scope(user_id)`` gets a session of its own whose statements on the
+    sharded tables go to that user's shard, so the services run unchanged and
+    a commit there is a single local transaction. Transfers between shards go
+    through ``TransferSagaService``.
+
+    Without ``SHARD_DATABASE_URLS`` the router is not registered and
+    ``shard_scope`` does nothing.
+    """
+
+    def __init__(self, app=None):
+        self.engines = []
+        self.shard_count = 0
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("SHARD_DATABASE_URLS", [])
+        app.config.setdefault("SHARD_ENGINE_OPTIONS", {})
+
+        urls = app.config["SHARD_DATABASE_URLS"]
+        if not urls:
+            return
+
+        self.engines = [sa.create_engine(url, **app.config["SHARD_ENGINE_OPTIONS"]) for url in urls]
+        self.shard_count = len(self.engines)
+        app.extensions["shard_router"] = self
+
+    def shard_for(self, user_id):
+        return int(user_id) % self.shard_count
+
+    def same_shard(self, user_id, other_user_id):
+        return self.shard_for(user_id) == self.shard_for(other_user_id)
+
+    def engine(self, shard):
+        return self.engines[shard]
+
+    def bind_for(self, mapper, clause):
+        """The shard engine for a statement of the current scope, or None for the primary."""
+        shard = _current_shard.get()
+        if shard is None:
+            return None
+
+        if mapper is not None:
+            tables = mapper.tables
+        elif clause is not None:
+            tables = find_tables(clause, include_crud=True)
+        else:
+            return None
+
+        if any(table.name in SHARDED_TABLES for table in tables):
+            return self.engine(shard)
+        return None
+
+    def create_schema(self):
+        """Create the sharded tables on every shard that does not have them yet."""
+        metadata = _shard_metadata()
+        for shard in range(self.shard_count):
+            metadata.create_all(self.engine(shard))
+
+
+def _shard_metadata():
+    # A shard has no user table, and rows reference users of other shards
+    metadata = sa.MetaData()
+    for name in SHARDED_TABLES:
+        table = db.metadata.tables[name].to_metadata(metadata)
+        for constraint in list(table.foreign_key_constraints):
+            table.constraints.discard(constraint)
+        table.foreign_keys.clear()
+        for column in table.columns:
+            column.foreign_keys.clear()
+    return metadata
+
+
+@contextmanager
+def _scope(shard):
+    if _current_shard.get() == shard:
+        yield shard
+        return
+
+    # A session per shard keeps rows with the same primary key on different shards apart
+    outer = db.session.registry()
+    session = db.session.session_factory()
+    db.session.registry.set(session)
+    token = _current_shard.set(shard)
+    try:
+        yield shard
+    finally:
+        _current_shard.reset(token)
+        session.close()
+        db.session.registry.set(outer)
+
+
+@contextmanager
+def shard_scope(user_id):
+    """Run the block against the shard of ``user_id``. Commit inside the block;
+    uncommitted changes are discarded when it ends."""
+    router = current_app.extensions.get("shard_router")
+    if router is None:
+        yield None
+        return
+
+    with _scope(router.shard_for(user_id)) as shard:
+        yield shard
+
+
+def is_local(user_id):
+    """Whether the rows of ``user_id`` belong to the shard of the current scope; always outside one."""
+    shard = _current_shard.get()
+    if shard is None or not has_app_context():
+        return True
+    return current_app.extensions["shard_router"].shard_for(user_id) == shard
+
+
+def each_shard():
+    """Enter the scope of every shard in turn, or yield once without shards."""
+    router = current_app.extensions.get("shard_router")
+    if router is None:
+        yield None
+        return
+
+    for shard in range(router.shard_count):
+        with _scope(shard):
+            yield shard
+
+
+def is_sharded():
+    """Whether wallets and ledgers live on shards, i.e. SHARD_DATABASE_URLS is set."""
+    return current_app.extensions.get("shard_router") is not None
+
+
+def unavailable_when_sharded():
+    """Response of the whole-ledger reports that only exist on a single database."""
+    return {"message": "Not available while wallets and ledgers are sharded"}, 501
@@ -0,0 +1,159 @@
+from datetime import datetime, timedelta
+
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.exc import IntegrityError
+
+from models.user import db
+from models.transaction import Transaction
+from models.transaction_rollup import TransactionRollup
+from services.sharding import is_sharded, unavailable_when_sharded
+
+# Buckets this many hours before the newest one are recomputed on every refresh,
+# so transactions that commit late still land in their hour
+ROLLUP_REOPEN_HOURS = 1
+
+GROUP_BY_FIELDS = ("type", "currency", "day")
+
+
+def _hour_bucket(column):
+    if db.engine.dialect.name == "postgresql":
+        return func.date_trunc("hour", column)
+    # Matches the format SQLAlchemy uses for DateTime values on SQLite
+    return func.strftime("%Y-%m-%d %H:00:00.000000", column)
+
+
+def _parse_datetime(value):
+    if not value:
+        return None
+    return datetime.fromisoformat(value)
+
+
+class StatsService:
+
+    @staticmethod
+    def refresh_rollups():
+        """Bring the hourly rollup table up to date with the transaction table.
+
+        Only the newest buckets are rebuilt, so the cost is proportional to the
+        transactions written since the previous refresh. Run by the
+        ``refresh-rollups`` command, e.g. from cron; /admin/stats only reads.
+        """
+        last_hour = db.session.query(func.max(TransactionRollup.hour)).scalar()
+        if last_hour is None:
+            since = db.session.query(func.min(Transaction.created_at)).scalar()
+            if since is None:
+                return
+            since = since.replace(minute=0, second=0, microsecond=0)
+        else:
+            since = last_hour - timedelta(hours=ROLLUP_REOPEN_HOURS)
+
+        bucket = _hour_bucket(Transaction.created_at)
+        rollups = (
+            select(
+                bucket,
+                Transaction.type,
+                Transaction.currency,
+                func.count(Transaction.id),
+                func.sum(Transaction.amount),
+            )
+            .where(Transaction.created_at >= since)
+            .group_by(bucket, Transaction.type, Transaction.currency)
+        )
+
+        try:
+            db.session.execute(delete(TransactionRollup).where(TransactionRollup.hour >= since))
+            db.session.execute(
+                insert(TransactionRollup).from_select(
+                    ["hour", "type", "currency", "count", "volume"], rollups
+                )
+            )
+            db.session.commit()
+        except IntegrityError:
+            # Another process refreshed the same buckets concurrently
+            db.session.rollback()
+
+    @staticmethod
+    def get_stats(start=None, end=None, group_by=None, transaction_type=None, currency=None):
+
+        # The rollups are built from the primary's ledger, which is empty once it is sharded
+        if is_sharded():
+            return unavailable_when_sharded()
+
+        try:
+            start = _parse_datetime(start)
+            end = _parse_datetime(end)
+        except ValueError:
+            return {"message": "start and end must be ISO 8601 dates"}, 400
+
+        group_by = [field for field in (group_by or "").split(",") if field]
+        unknown = [field for field in group_by if field not in GROUP_BY_FIELDS]
+        if unknown:
+            return {"message": f"Unsupported group_by field(s): {', '.join(unknown)}"}, 400
+
+        filters = []
+        if start:
+            filters.append(TransactionRollup.hour >= start)
+        if end:
+            filters.append(TransactionRollup.hour < end)
+        if transaction_type:
+            filters.append(TransactionRollup.type == transaction_type)
+        if currency:
+            filters.append(TransactionRollup.currency == currency)
+
+        count = func.sum(TransactionRollup.count)
+        volume = func.sum(TransactionRollup.volume)
+
+        totals = (
+            db.session.query(TransactionRollup.currency, count, volume)
+            .filter(*filters)
+            .group_by(TransactionRollup.currency)
+            .order_by(TransactionRollup.currency)
+            .all()
+        )
+
+        # Volumes are only comparable within a currency, so it is always a group key
+        columns = {
+            "type": TransactionRollup.type,
+            "currency": TransactionRollup.currency,
+            "day": func.date(TransactionRollup.hour),
+        }
+        keys = [field for field in GROUP_BY_FIELDS if field in group_by or field == "currency"]
+        key_columns = [columns[field] for field in keys]
+
+        groups = (
+            db.session.query(*key_columns, count, volume)
+            .filter(*filters)
+            .group_by(*key_columns)
+            .order_by(*key_columns)
+            .all()
+        )
+
+        # The newest hour the last refresh saw transactions in, tells how stale the figures are
+        rollup_through = db.session.query(func.max(TransactionRollup.hour)).scalar()
+
+        return {
+            "totals": [
+                {
+                    "currency": row_currency,
+                    "count": int(row_count),
+                    "volume": round(row_volume, 2)
+                }
+                for row_currency, row_count, row_volume in totals
+            ],
+            "count": sum(int(row[1]) for row in totals),
+            "groups": [
+                {
+                    **{
+                        field: value.isoformat() if hasattr(value, "isoformat") else value
+                        for field, value in zip(keys, row[:len(keys)])
+                    },
+                    "count": int(row[len(keys)]),
+                    "volume": round(row[len(keys) + 1], 2)
+                }
+                for row in groups
+            ],
+            "group_by": keys,
+            "start": start.isoformat() if start else None,
+            "end": end.isoformat() if end else None,
+            "rollup_through": rollup_through.isoformat() if rollup_through else None
+        }, 200
@@ -0,0 +1,176 @@
+import logging
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import or_, select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import db
+from models.revoked_token import RevokedToken
+from models.sql_functions import utcnow
+from utils.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+# Issue time with sub-second precision, "iat" only has whole seconds
+ISSUED_AT_CLAIM = "iat_precise"
+
+
+def _epoch(value):
+    return value.replace(tzinfo=timezone.utc).timestamp() if value is not None else None
+
+
+class TokenRevocation:
+    """Answers the JWT blocklist check from memory.
+
+    Revocations are rows of the ``revoked_token`` table: either one token (jti),
+    or every token of a user issued before a point in time (logout everywhere,
+    password change). Each worker mirrors the rows that have not expired into a
+    dict of jtis and a dict of per-user cutoffs. The check itself never queries
+    the database; at most once per ``REVOCATION_SYNC_SECONDS`` a request reads
+    the rows created since the last sync. Revocations made by this worker apply
+    immediately, those of other workers within the sync interval.
+    """
+
+    def __init__(self, app=None, jwt=None):
+        self._jtis = {}
+        self._cutoffs = {}
+        self._high_water = None
+        self._synced_at = None
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, jwt)
+
+    def init_app(self, app, jwt):
+        app.config.setdefault("REVOCATION_SYNC_SECONDS", 1.0)
+        app.config.setdefault("REVOCATION_SYNC_OVERLAP_SECONDS", 5.0)
+
+        self.sync_interval = app.config["REVOCATION_SYNC_SECONDS"]
+        self.overlap = timedelta(seconds=app.config["REVOCATION_SYNC_OVERLAP_SECONDS"])
+        self.identity_claim = app.config["JWT_IDENTITY_CLAIM"]
+        self.token_lifetime = app.config["JWT_ACCESS_TOKEN_EXPIRES"]
+
+        jwt.additional_claims_loader(_issued_at_claim)
+        jwt.token_in_blocklist_loader(self._check)
+        app.extensions["token_revocation"] = self
+
+    def is_revoked(self, payload):
+        self.sync()
+        return self.is_listed(payload)
+
+    def is_listed(self, payload):
+        """The check against the rows mirrored so far, without syncing."""
+        if payload.get("jti") in self._jtis:
+            return True
+
+        cutoff = self._cutoffs.get(str(payload.get(self.identity_claim)))
+        if cutoff is None:
+            return False
+        return payload.get(ISSUED_AT_CLAIM, payload.get("iat", 0)) < cutoff[0]
+
+    def revoke_token(self, payload):
+        """Revoke one token, e.g. on logout."""
+        expires_at = payload.get("exp")
+        if expires_at is not None:
+            expires_at = datetime.fromtimestamp(expires_at, timezone.utc).replace(tzinfo=None)
+
+        user_id = int(payload[self.identity_claim])
+        db.session.add(RevokedToken(jti=payload["jti"], user_id=user_id, expires_at=expires_at))
+        db.session.commit()
+        self._apply(payload["jti"], user_id, None, expires_at)
+
+    def revoke_user(self, user_id):
+        """Revoke every token issued to the user so far. Commits the session."""
+        now = utc_now()
+        expires_at = now + self.token_lifetime if self.token_lifetime else None
+        db.session.add(RevokedToken(user_id=user_id, revoked_before=now, expires_at=expires_at))
+        db.session.commit()
+        self._apply(None, user_id, now, expires_at)
+
+    def sync_due(self):
+        """Whether the next ``sync`` would read the table."""
+        return self._synced_at is None or time.monotonic() - self._synced_at >= self.sync_interval
+
+    def sync(self, force=False):
+        now = time.monotonic()
+        if not force and not self.sync_due():
+            return
+        # Another thread is already syncing, its result is at most one interval away
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            statement = select(
+                RevokedToken.jti, RevokedToken.user_id, RevokedToken.revoked_before,
+                RevokedToken.expires_at, RevokedToken.created_at
+            )
+            if self._high_water is None:
+                statement = statement.where(
+                    or_(RevokedToken.expires_at.is_(None), RevokedToken.expires_at > utc_now())
+                )
+            else:
+                # Rows do not commit in created_at order, re-read a window before the newest one seen
+                statement = statement.where(RevokedToken.created_at >= self._high_water - self.overlap)
+
+            try:
+                # Always the primary, a lagging replica would delay revocations
+                with db.engine.connect() as connection:
+                    # created_at comes from the database clock, so does the watermark:
+                    # compared with this host's clock, skew could skip other workers' rows
+                    started_at = connection.execute(select(utcnow())).scalar()
+                    rows = connection.execute(statement).all()
+            except SQLAlchemyError:
+                # Keep the current state and retry after the next interval
+                logger.warning("Could not sync revoked tokens", exc_info=True)
+                self._synced_at = now
+                return
+
+            high_water = self._high_water or started_at
+            for jti, user_id, revoked_before, expires_at, created_at in rows:
+                self._apply(jti, user_id, revoked_before, expires_at)
+                high_water = max(high_water, created_at)
+            self._high_water = high_water
+
+            self._synced_at = now
+            if now - self._pruned_at > 60:
+                self._prune()
+                self._pruned_at = now
+        finally:
+            self._lock.release()
+
+    def prune_table(self):
+        """Delete the rows whose tokens have all expired, returns how many."""
+        count = RevokedToken.query.filter(RevokedToken.expires_at < utc_now()).delete()
+        db.session.commit()
+        return count
+
+    def _check(self, jwt_header, jwt_payload):
+        return self.is_revoked(jwt_payload)
+
+    def _apply(self, jti, user_id, revoked_before, expires_at):
+        expires_at = _epoch(expires_at)
+        if jti:
+            self._jtis[jti] = expires_at
+        if revoked_before is not None:
+            key = str(user_id)
+            cutoff = _epoch(revoked_before)
+            current = self._cutoffs.get(key)
+            if current is None or cutoff > current[0]:
+                self._cutoffs[key] = (cutoff, expires_at)
+
+    def _prune(self):
+        now = time.time()
+        self._jtis = {
+            jti: expires_at for jti, expires_at in self._jtis.items()
+            if expires_at is None or expires_at > now
+        }
+        self._cutoffs = {
+            user_id: cutoff for user_id, cutoff in self._cutoffs.items()
+            if cutoff[1] is None or cutoff[1] > now
+        }
+
+
+def _issued_at_claim(identity):
+    return {ISSUED_AT_CLAIM: time.time()}
@@ -1,10 +1,22 @@
 # services/transaction_service.py
 from models.user import db, User
-from models.user_balance import UserBalance
 from models.transaction import Transaction
-from datetime import datetime
-from flask import jsonify
+from sqlalchemy import func, or_, select
+from sqlalchemy.orm import selectinload
+from flask import Response, current_app, g, jsonify, stream_with_context
 from utils.utils import get_currency_symbol 
+from utils.events import transaction_event, publish_events
+from services.balance_service import BalanceService, Wallet
+from services.ledger_projection import balances_at, ledger_snapshot, project
+from services.velocity import within_velocity_limits
+from services.sharding import shard_scope
+from services.transfer_saga import TransferSagaService
+
+MAX_HISTORY_PAGE_SIZE = 500
+
+# Rows fetched per round trip, and entries written per chunk, of a streamed history
+HISTORY_BATCH_SIZE = 500
+
 
 class TransactionService:
 
@@ -21,27 +33,24 @@ class TransactionService:
        
         currency = user.currency  
 
-        user_balance = UserBalance.query.filter_by(user_id=user.id, currency=currency).first()
-        
-        if not user_balance:
-            user_balance = UserBalance(user_id=user.id, currency=user.currency, balance=0.0)
-            db.session.add(user_balance)
+        with shard_scope(user.id):
+            balance = BalanceService.credit(user, currency, amount)
 
-        user_balance.balance += amount
-
-        transaction = Transaction(
-            user_id=user.id,
-            type="top_up",
-            amount=amount,
-            currency=user.currency,
-            currency_symbol="$",
-            created_at=datetime.utcnow()
-        )
-        db.session.add(transaction)
-        db.session.commit()
+            transaction = Transaction(
+                user_id=user.id,
+                type="top_up",
+                amount=amount,
+                currency=currency,
+                currency_symbol="$"
+            )
+            db.session.add(transaction)
+            db.session.flush()
+            events = [(user.id, transaction_event(transaction, "credited", [Wallet(currency, balance)]))]
+            db.session.commit()
+        publish_events(events)
 
         return {
-            "balance": round(user_balance.balance, 2),
+            "balance": round(balance, 2),
             "currency_symbol": "$",
             "message": "Top-up successful",
         },200
@@ -65,21 +74,51 @@ class TransactionService:
         if not current_user or not target_user:
             return {"message": "User not found"}, 404
 
-    
-        sender_balance = UserBalance.query.filter_by(user_id=current_user.id, currency=currency).first()
-        receiver_balance = UserBalance.query.filter_by(user_id=target_user.id, currency=currency).first()
+        return within_velocity_limits(
+            current_user.id, "transfer", currency, amount,
+            lambda: TransactionService._execute_transfer(current_user, target_user, amount, currency)
+        )
 
-        if not sender_balance or sender_balance.balance < amount:
-            return {"message": f"Insufficient balance in {currency}"}, 400
+    @staticmethod
+    def _execute_transfer(current_user, target_user, amount, currency):
+        shards = current_app.extensions.get("shard_router")
+        if shards is not None and not shards.same_shard(current_user.id, target_user.id):
+            return TransferSagaService.start(current_user, target_user, amount, currency)
+
+        writer = current_app.extensions.get("ledger_writer")
+        # Shards already spread the writes, the batching writer only knows the primary
+        if shards is None and writer is not None and writer.is_hot(target_user.id) and target_user.id != current_user.id:
+            if BalanceService.get_balance(current_user.id, currency) < amount:
+                return {"message": f"Insufficient balance in {currency}"}, 400
+            # Contended merchant accounts are credited in group-committed batches
+            return writer.transfer(current_user.id, target_user, amount, currency)
+
+        with shard_scope(current_user.id):
+            result, status_code, events = TransactionService.apply_transfer(
+                current_user, target_user, amount, currency
+            )
+            if status_code != 200:
+                return result, status_code
 
-    
-        if not receiver_balance:
-            receiver_balance = UserBalance(user_id=target_user.id, currency=currency, balance=0.0)
-            db.session.add(receiver_balance)
+            db.session.commit()
+        publish_events(events)
+
+        return result, status_code
+
+    @staticmethod
+    def apply_transfer(current_user, target_user, amount, currency):
+        """Move the funds and add the Transaction without committing.
 
-        sender_balance.balance -= amount
-        receiver_balance.balance += amount
+        Returns the response, its status code and the events to publish once the
+        caller committed. Nothing is changed when the balance is too low.
+        """
+        sender_balance = BalanceService.debit(current_user, currency, amount)
+        if sender_balance is None:
+            return {"message": f"Insufficient balance in {currency}"}, 400, []
 
+        receiver_balance = BalanceService.credit(target_user, currency, amount)
+        if target_user.id == current_user.id:
+            sender_balance = receiver_balance
 
         transaction = Transaction(
             user_id=current_user.id,
@@ -92,67 +131,125 @@ class TransactionService:
         )
 
         db.session.add(transaction)
-        db.session.commit()
+        db.session.flush()
+        events = [
+            (current_user.id, transaction_event(transaction, "debited", [Wallet(currency, sender_balance)])),
+            (target_user.id, transaction_event(transaction, "credited", [Wallet(currency, receiver_balance)])),
+        ]
 
         return{
             "message": "Transfer successful",
-            "balance": round(sender_balance.balance, 2),
+            "balance": round(sender_balance, 2),
             "currency": currency,
             "target_user_id": target_user.id,
             "target_username": target_user.username ,
             "amount": round(amount, 2)
-        },200
+        },200, events
+    
+
     
 
     @staticmethod
-    def transaction(user):
+    def history_statement(user_id, limit=None, before=None):
+        """History rows newest first; with a limit one page plus one row to tell if there is a next one."""
+        statement = (
+            select(Transaction)
+            .options(selectinload(Transaction.user), selectinload(Transaction.target_user))
+            .where(or_(Transaction.user_id == user_id, Transaction.target_user_id == user_id))
+            .order_by(Transaction.seq.desc())
+        )
+        if not limit:
+            return statement
+
+        if before:
+            statement = statement.where(Transaction.seq < before)
+        return statement.limit(limit + 1)
+
+    @staticmethod
+    def history_page(rows, limit):
+        """The rows of ``history_statement`` to show, and the cursor of the next page."""
+        if not limit:
+            return rows, None
+        next_cursor = rows[limit - 1].seq if len(rows) > limit else None
+        return rows[:limit], next_cursor
+
+    @staticmethod
+    def transaction(user, limit=None, before=None):
 
         if not user:
             return jsonify({"error": "User not found"}), 404
 
-        transactions = (
-            Transaction.query
-            .filter(
-                (Transaction.user_id == user.id) | (Transaction.target_user_id == user.id)
+        if not limit:
+            # The full history is streamed, it is neither built in memory nor cached
+            return TransactionService.stream_history(user), 200
+
+        limit = min(limit, MAX_HISTORY_PAGE_SIZE)
+
+        cache = current_app.extensions.get("history_cache")
+        if cache is not None:
+            cached = cache.get(user.id, limit, before)
+            if cached is not None:
+                return cached, 200
+            generation = cache.generation(user.id)
+
+        with shard_scope(user.id), ledger_snapshot():
+            rows = db.session.scalars(TransactionService.history_statement(user.id, limit, before)).all()
+            transactions, next_cursor = TransactionService.history_page(rows, limit)
+            closing = balances_at(user.id, transactions[0].seq, inclusive=True) if transactions else {}
+            result = {
+                "transactions": list(TransactionService.serialize_history(user.id, transactions, closing)),
+                "next_cursor": next_cursor
+            }
+
+        # Pages read from a lagging replica could be older than the last invalidation
+        if cache is not None and not g.get("_use_replica"):
+            cache.set(user.id, limit, before, result, generation)
+
+        return result, 200
+
+    @staticmethod
+    def stream_history(user):
+        """The whole history as a JSON response written while the rows are fetched."""
+        with shard_scope(user.id):
+            # Rows committed while streaming are left out
+            newest = db.session.scalar(
+                select(func.max(Transaction.seq))
+                .where(or_(Transaction.user_id == user.id, Transaction.target_user_id == user.id))
             )
-            .order_by(Transaction.created_at.asc())  
-            .all()
-        )
-    
-        user_balances = {} 
-        transactions_response = []
 
-    
-        for t in transactions:
-            
-            currency = t.currency
-
-            if currency not in user_balances:
-                user_balances[currency] = 0.0
-
-            status = "unknown"  
-
-            if t.type == "top_up":
-            
-                user_balances[currency] += t.amount
-                status = "credited"
-            
-            elif t.type == "exchange" and t.converted_amount:
-            
-                user_balances[t.currency_from] = user_balances.get(t.currency_from, 0) - t.amount
-                user_balances[t.currency_to] = user_balances.get(t.currency_to, 0) + t.converted_amount
-                status = "debited" if t.currency_from == currency else "credited"
-
-            elif t.type == "transfer":
-                if t.target_user_id == user.id:  # This means the user is the recipient
-                    user_balances[t.currency] += t.amount
-                    status = "credited"
-                else:  # This means the user is the sender
-                    user_balances[t.currency] -= t.amount
-                    status = "debited"
+        def chunks():
+            yield '{"transactions": ['
+            if newest is not None:
+                # The closing balances are read with the rows so both cover the same rows up to newest
+                with shard_scope(user.id), ledger_snapshot():
+                    closing = balances_at(user.id, newest, inclusive=True)
+                    rows = db.session.scalars(
+                        TransactionService.history_statement(user.id).where(Transaction.seq <= newest),
+                        execution_options={"yield_per": HISTORY_BATCH_SIZE}
+                    )
+                    entries = TransactionService.serialize_history(user.id, rows, closing)
+                    batch = []
+                    separator = ""
+                    for entry in entries:
+                        batch.append(current_app.json.dumps(entry))
+                        if len(batch) >= HISTORY_BATCH_SIZE:
+                            yield separator + ", ".join(batch)
+                            batch = []
+                            separator = ", "
+                    if batch:
+                        yield separator + ", ".join(batch)
+            yield "]}"
+
+        return Response(stream_with_context(chunks()), mimetype="application/json")
+
+    @staticmethod
+    def serialize_history(user_id, transactions, closing):
+        """Response rows for ``transactions``, newest first, with the running balances
+        after each one. ``closing`` holds the balances after the first (newest) row."""
+        for t, status, balances in project(transactions, user_id, closing, descending=True):
 
             if t.type == "transfer":
-                if t.target_user_id == user.id:
+                if t.target_user_id == user_id:
                     direction_field = {
                         "received_from": t.user.username if t.user else None,
                         "target_user_id": None,
@@ -169,9 +266,14 @@ class TransactionService:
                     "to": "-",
                     "target_user_id": None,
                     "target_username": None
-                }        
+                }
 
-            transactions_response.append({
+            if t.type == "exchange" and t.currency_from != t.currency:
+                balance = balances.get(t.currency_to, 0.0)
+            else:
+                balance = balances[t.currency]
+
+            yield {
                 "id": t.id,
                 "type": t.type,
                 "amount": round(t.amount, 2),
@@ -181,21 +283,10 @@ class TransactionService:
                 "target_user_id": t.target_user_id,
                 "currency_symbol": t.currency_symbol,
                 "currency": t.currency,
-               "balance": round(
-                    user_balances[t.currency_from] if t.type == "exchange" and t.currency_from == t.currency 
-                    else user_balances[t.currency_to] if t.type == "exchange" 
-                    else user_balances[t.currency],
-                    2
-                ),
+                "balance": round(balance, 2),
                 "timestamp": t.created_at.isoformat(),
                 "to": f"{t.amount:.2f}{t.currency_symbol}" if t.type == "transfer" else "-",
                 "target_username": t.target_user.username if t.target_user_id else None,
-                "status": status ,
+                "status": status,
                 **direction_field,
-            })
-
-        transactions_response.reverse()
-
-        return{
-            "transactions": transactions_response
-        },200
+            }
@@ -0,0 +1,216 @@
+import logging
+import uuid
+from datetime import timedelta
+
+from sqlalchemy.exc import IntegrityError, SQLAlchemyError
+
+from models.user import db, User
+from models.transaction import Transaction
+from models.transfer_saga import TransferSaga, TransferSagaStep
+from services.balance_service import BalanceService, Wallet
+from services.sharding import shard_scope
+from utils.events import transaction_event, publish_events
+from utils.utils import get_currency_symbol, utc_now
+
+logger = logging.getLogger(__name__)
+
+MAX_CREDIT_ATTEMPTS = 5
+# Sagas untouched for this long are assumed abandoned by the worker that started them
+RESUME_AFTER_SECONDS = 60
+
+
+class TransferSagaService:
+    """Transfers between users on different shards.
+
+    The sender's shard is debited and the recipient's shard credited in two
+    local transactions, each recording its step in ``transfer_saga_step``; the
+    saga row on the primary tracks which steps have committed. Each shard keeps
+    its own copy of the Transaction row, so both users' histories stay local
+    to their shard. ``resume`` finishes sagas a crashed or failing request left
+    behind: it credits the recipient, or refunds the sender after
+    ``MAX_CREDIT_ATTEMPTS``. Steps that may still be in flight are fenced off
+    first by recording them as aborted.
+    """
+
+    @staticmethod
+    def start(sender, target_user, amount, currency):
+        saga = TransferSaga(
+            id=uuid.uuid4().hex,
+            sender_id=sender.id,
+            target_user_id=target_user.id,
+            amount=amount,
+            currency=currency,
+            state="pending"
+        )
+        db.session.add(saga)
+        db.session.commit()
+
+        sender_balance, error = TransferSagaService._debit(saga, sender)
+        if error:
+            saga.state = "failed"
+            saga.last_error = error
+            db.session.commit()
+            return {"message": error}, 400
+
+        saga.state = "debited"
+        db.session.commit()
+
+        response = {
+            "message": "Transfer successful",
+            "balance": round(sender_balance, 2),
+            "currency": currency,
+            "target_user_id": target_user.id,
+            "target_username": target_user.username,
+            "amount": round(amount, 2)
+        }
+        if not TransferSagaService._complete(saga, target_user):
+            response["message"] = "Transfer accepted, the recipient will be credited shortly"
+            response["saga_id"] = saga.id
+            return response, 202
+        return response, 200
+
+    @staticmethod
+    def resume(limit=100):
+        """Drive unfinished sagas to completion or compensation. Returns how many were handled."""
+        stale = utc_now() - timedelta(seconds=RESUME_AFTER_SECONDS)
+        sagas = (
+            TransferSaga.query
+            .filter(TransferSaga.state.in_(("pending", "debited")), TransferSaga.updated_at < stale)
+            .order_by(TransferSaga.updated_at)
+            .limit(limit)
+            .all()
+        )
+
+        for saga in sagas:
+            if saga.state == "pending":
+                if TransferSagaService._fence(saga, saga.sender_id, "debit"):
+                    saga.state = "failed"
+                    saga.last_error = "Abandoned before the debit"
+                    db.session.commit()
+                    continue
+                saga.state = "debited"
+                db.session.commit()
+
+            target_user = db.session.get(User, saga.target_user_id)
+            if TransferSagaService._complete(saga, target_user):
+                continue
+            if saga.attempts >= MAX_CREDIT_ATTEMPTS:
+                TransferSagaService._compensate(saga)
+
+        return len(sagas)
+
+    @staticmethod
+    def _complete(saga, target_user):
+        """Credit the recipient and finish the saga. False if it has to be retried."""
+        try:
+            outcome = TransferSagaService._credit(saga, target_user)
+        except SQLAlchemyError as error:
+            logger.exception("Crediting transfer saga %s failed", saga.id)
+            db.session.rollback()
+            saga.attempts += 1
+            saga.last_error = str(error)[:255]
+            db.session.commit()
+            return False
+
+        if outcome == "aborted":
+            # A compensation fenced off the credit, make sure it also refunded
+            TransferSagaService._compensate(saga)
+        else:
+            saga.state = "completed"
+            db.session.commit()
+        return True
+
+    @staticmethod
+    def _compensate(saga):
+        if not TransferSagaService._fence(saga, saga.target_user_id, "credit"):
+            # The credit went through after all
+            saga.state = "completed"
+            db.session.commit()
+            return
+
+        sender = db.session.get(User, saga.sender_id)
+        with shard_scope(sender.id):
+            if db.session.get(TransferSagaStep, (saga.id, "refund")) is None:
+                balance = BalanceService.credit(sender, saga.currency, saga.amount)
+                transaction = TransferSagaService._transaction(saga, type="refund", user_id=sender.id)
+                db.session.add_all([transaction, TransferSagaStep(saga_id=saga.id, step="refund")])
+                db.session.flush()
+                events = [(sender.id, transaction_event(transaction, "credited", [Wallet(saga.currency, balance)]))]
+                db.session.commit()
+                publish_events(events)
+
+        saga.state = "compensated"
+        db.session.commit()
+
+    @staticmethod
+    def _debit(saga, sender):
+        """Debit the sender on their shard. Returns the new balance, or an error message."""
+        with shard_scope(sender.id):
+            balance = BalanceService.debit(sender, saga.currency, saga.amount)
+            if balance is None:
+                db.session.rollback()
+                return None, f"Insufficient balance in {saga.currency}"
+
+            transaction = TransferSagaService._transaction(saga)
+            db.session.add_all([transaction, TransferSagaStep(saga_id=saga.id, step="debit")])
+            db.session.flush()
+            events = [(sender.id, transaction_event(transaction, "debited", [Wallet(saga.currency, balance)]))]
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return None, "Transfer was aborted"
+
+        publish_events(events)
+        return balance, None
+
+    @staticmethod
+    def _credit(saga, target_user):
+        """Credit the recipient on their shard. Returns "done", or "aborted" if fenced off."""
+        with shard_scope(target_user.id):
+            step = db.session.get(TransferSagaStep, (saga.id, "credit"))
+            if step is not None:
+                return step.outcome
+
+            balance = BalanceService.credit(target_user, saga.currency, saga.amount)
+            transaction = TransferSagaService._transaction(saga)
+            db.session.add_all([transaction, TransferSagaStep(saga_id=saga.id, step="credit")])
+            db.session.flush()
+            events = [(target_user.id, transaction_event(transaction, "credited", [Wallet(saga.currency, balance)]))]
+            try:
+                db.session.commit()
+            except IntegrityError:
+                # Fenced off or credited concurrently, the step row tells which
+                db.session.rollback()
+                return db.session.get(TransferSagaStep, (saga.id, "credit")).outcome
+
+        publish_events(events)
+        return "done"
+
+    @staticmethod
+    def _fence(saga, user_id, step):
+        """Record ``step`` as aborted unless it already happened. True if it was fenced off."""
+        with shard_scope(user_id):
+            existing = db.session.get(TransferSagaStep, (saga.id, step))
+            if existing is not None:
+                return existing.outcome == "aborted"
+
+            db.session.add(TransferSagaStep(saga_id=saga.id, step=step, outcome="aborted"))
+            try:
+                db.session.commit()
+            except IntegrityError:
+                db.session.rollback()
+                return db.session.get(TransferSagaStep, (saga.id, step)).outcome == "aborted"
+            return True
+
+    @staticmethod
+    def _transaction(saga, type="transfer", user_id=None):
+        return Transaction(
+            user_id=user_id or saga.sender_id,
+            type=type,
+            amount=saga.amount,
+            currency=saga.currency,
+            target_user_id=saga.target_user_id if type == "transfer" else None,
+            currency_symbol=get_currency_symbol(saga.currency),
+            currency_from=saga.currency
+        )
@@ -1,7 +1,60 @@
 
+import base64
+import json
+from datetime import datetime
+
+from sqlalchemy import and_, func, or_, select, tuple_
+
+from models.user import db, User
+from models.user_balance import UserBalance
+from services.balance_service import BalanceService
+from services.sharding import is_sharded, unavailable_when_sharded
 from utils.utils import get_currency_symbol 
 from flask import jsonify
 
+USER_SORT_FIELDS = {
+    "id": User.id,
+    "created_at": User.created_at,
+    "username": User.username,
+}
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+
+
+def _prefix_filter(column, prefix):
+    """Case-insensitive prefix match that can use the lower() expression indexes."""
+    expression = func.lower(column)
+    prefix = prefix.lower()
+
+    if db.engine.dialect.name == "postgresql":
+        escaped = prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        return expression.like(f"{escaped}%", escape="\\")
+
+    # SQLite only uses an index for LIKE with special collations, a range always works
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return and_(expression >= prefix, expression < upper)
+
+
+def _encode_cursor(sort, user):
+    value = getattr(user, sort)
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    raw = json.dumps([value, user.id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+
+def _decode_cursor(sort, cursor):
+    value, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    if sort == "created_at":
+        value = datetime.fromisoformat(value)
+    return value, int(user_id)
+
+
+def _parse_datetime(value):
+    return datetime.fromisoformat(value) if value else None
+
+
 class UserService:
 
     @staticmethod
@@ -11,17 +64,104 @@ class UserService:
             return jsonify({"message": "User not found"}), 404
 
 
+        return UserService.profile_response(user, BalanceService.wallets(user.id))
+
+    @staticmethod
+    def profile_response(user, wallets):
         balances = [
             {
-                "currency": balance.currency,
-                "amount": round(balance.balance, 2),
-                "symbol": get_currency_symbol(balance.currency)
+                "currency": wallet.currency,
+                "amount": round(wallet.balance, 2),
+                "symbol": get_currency_symbol(wallet.currency)
             }
-            for balance in user.balances
+            for wallet in wallets
         ]
 
         return {
             "id": user.id,
             "username": user.username,
             "balances": balances
-        }
\ No newline at end of file
+        }
+
+    @staticmethod
+    def search_users(q=None, username=None, email=None, created_from=None, created_to=None,
+                     is_admin=None, min_balance=None, max_balance=None, currency=None,
+                     sort="id", order="asc", limit=DEFAULT_PAGE_SIZE, cursor=None):
+        """Filtered admin user listing with keyset pagination on (sort, id)."""
+
+        if sort not in USER_SORT_FIELDS:
+            return {"message": f"sort must be one of {', '.join(USER_SORT_FIELDS)}"}, 400
+        if order not in ("asc", "desc"):
+            return {"message": "order must be asc or desc"}, 400
+
+        try:
+            created_from = _parse_datetime(created_from)
+            created_to = _parse_datetime(created_to)
+            after = _decode_cursor(sort, cursor) if cursor else None
+        except (ValueError, TypeError):
+            return {"message": "Invalid date or cursor"}, 400
+
+        limit = max(1, min(limit or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE))
+
+        query = User.query
+
+        if q:
+            query = query.filter(or_(_prefix_filter(User.username, q), _prefix_filter(User.email, q)))
+        if username:
+            query = query.filter(_prefix_filter(User.username, username))
+        if email:
+            query = query.filter(_prefix_filter(User.email, email))
+        if created_from:
+            query = query.filter(User.created_at >= created_from)
+        if created_to:
+            query = query.filter(User.created_at < created_to)
+        if is_admin is not None:
+            query = query.filter(User.is_admin == is_admin)
+
+        if min_balance is not None or max_balance is not None:
+            # The filter joins users with their wallets, which are on other databases once sharded
+            if is_sharded():
+                return unavailable_when_sharded()
+            # Thresholds apply to the wallet total, summed over its slots
+            wallet = select(UserBalance.currency).where(UserBalance.user_id == User.id)
+            if currency:
+                wallet = wallet.where(UserBalance.currency == currency)
+            wallet = wallet.group_by(UserBalance.currency)
+            if min_balance is not None:
+                wallet = wallet.having(func.sum(UserBalance.balance) >= min_balance)
+            if max_balance is not None:
+                wallet = wallet.having(func.sum(UserBalance.balance) <= max_balance)
+            query = query.filter(wallet.exists())
+
+        sort_column = USER_SORT_FIELDS[sort]
+        key = tuple_(sort_column, User.id)
+
+        if after:
+            query = query.filter(key > tuple_(*after) if order == "asc" else key < tuple_(*after))
+
+        if order == "asc":
+            query = query.order_by(sort_column.asc(), User.id.asc())
+        else:
+            query = query.order_by(sort_column.desc(), User.id.desc())
+
+        # Fetch one extra row to know whether another page exists
+        users = query.limit(limit + 1).all()
+        has_more = len(users) > limit
+        users = users[:limit]
+        wallets = BalanceService.balances_by_user([u.id for u in users]) if users else {}
+
+        return {
+            "users": [
+                {
+                    "id": u.id,
+                    "username": u.username,
+                    "email": u.email,
+                    "balances": wallets.get(u.id, []),
+                    "is_admin": u.is_admin,
+                    "created_at": u.created_at.isoformat()
+                }
+                for u in users
+            ],
+            "limit": limit,
+            "next_cursor": _encode_cursor(sort, users[-1]) if has_more else None
+        }, 200
@@ -0,0 +1,213 @@
+import logging
+import threading
+import time
+from collections import deque
+from datetime import timedelta, timezone
+
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import SQLAlchemyError
+
+from models.user import db
+from models.transaction import Transaction
+from services.sharding import each_shard
+from utils.utils import utc_now
+
+logger = logging.getLogger(__name__)
+
+# Per user, kind and currency over the window: at most "count" operations
+# and at most "amount" moved (in that currency)
+DEFAULT_VELOCITY_LIMITS = {
+    "transfer": {"count": 100, "amount": 50000.0},
+    "exchange": {"count": 100, "amount": 50000.0},
+}
+
+
+class SlidingWindowCounter:
+    """Count and sum of the events of one key, kept in fixed-width time buckets."""
+
+    __slots__ = ("buckets", "count", "amount")
+
+    def __init__(self):
+        self.buckets = deque()
+        self.count = 0
+        self.amount = 0.0
+
+    def expire(self, oldest_bucket):
+        while self.buckets and self.buckets[0][0] < oldest_bucket:
+            _, count, amount = self.buckets.popleft()
+            self.count -= count
+            self.amount -= amount
+
+    def add(self, bucket, count, amount):
+        if not self.buckets or self.buckets[-1][0] < bucket:
+            self.buckets.append([bucket, count, amount])
+        else:
+            # An older bucket, e.g. a reservation released after the minute turned
+            for entry in reversed(self.buckets):
+                if entry[0] == bucket:
+                    entry[1] += count
+                    entry[2] += amount
+                    break
+            else:
+                return
+        self.count += count
+        self.amount += amount
+
+
+class VelocityLimiter:
+    """Sliding-window limits on how often and how much a user transfers or exchanges.
+
+    Counters live in memory, split into ``VELOCITY_BUCKET_SECONDS`` buckets over
+    ``VELOCITY_WINDOW_SECONDS``, so a check costs the same however long the
+    user's history is. On first use a worker rebuilds them from the ledger rows
+    of the current window; afterwards it only counts its own traffic, so with
+    several workers the limits hold per worker plus what was in the ledger at
+    startup.
+    """
+
+    def __init__(self, app=None):
+        self._counters = {}
+        self._built = False
+        self._pruned_at = time.monotonic()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("VELOCITY_LIMITS", DEFAULT_VELOCITY_LIMITS)
+        app.config.setdefault("VELOCITY_WINDOW_SECONDS", 3600)
+        app.config.setdefault("VELOCITY_BUCKET_SECONDS", 60)
+
+        self.limits = app.config["VELOCITY_LIMITS"]
+        self.window = app.config["VELOCITY_WINDOW_SECONDS"]
+        self.bucket_seconds = app.config["VELOCITY_BUCKET_SECONDS"]
+        app.extensions["velocity_limiter"] = self
+
+    def acquire(self, user_id, kind, currency, amount):
+        """Reserve an operation against the user's limits.
+
+        Returns ``(reservation, None)``, or ``(None, message)`` when a limit would
+        be exceeded. Release the reservation if the operation does not go through.
+        """
+        limits = self.limits.get(kind)
+        if not limits:
+            return None, None
+        self._ensure_built()
+
+        bucket = self._bucket(time.time())
+        key = (int(user_id), kind, currency)
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is None:
+                counter = self._counters[key] = SlidingWindowCounter()
+            counter.expire(bucket - self._bucket_count() + 1)
+
+            if limits.get("count") is not None and counter.count + 1 > limits["count"]:
+                return None, f"Limit of {limits['count']} {kind}s per {self._window_text()} reached"
+            if limits.get("amount") is not None and counter.amount + amount > limits["amount"]:
+                return None, (
+                    f"Limit of {limits['amount']:.2f} {currency} in {kind}s per {self._window_text()} reached"
+                )
+
+            counter.add(bucket, 1, amount)
+            if time.monotonic() - self._pruned_at > self.window:
+                self._prune(bucket)
+        return (key, bucket, amount), None
+
+    def release(self, reservation):
+        if reservation is None:
+            return
+        key, bucket, amount = reservation
+        with self._lock:
+            counter = self._counters.get(key)
+            if counter is not None:
+                counter.add(bucket, -1, -amount)
+
+    def rebuild(self):
+        """Reload the counters from the ledger rows of the current window."""
+        since = utc_now() - timedelta(seconds=self.window)
+        statement = (
+            select(
+                Transaction.user_id, Transaction.type, Transaction.currency,
+                Transaction.amount, Transaction.created_at
+            )
+            .where(Transaction.created_at >= since, Transaction.type.in_(list(self.limits)))
+            .order_by(Transaction.created_at)
+        )
+        shards = current_app.extensions.get("shard_router")
+        rows = []
+        for shard in each_shard():
+            # A transfer between shards is recorded on both, count it on the sender's
+            rows.extend(
+                row for row in db.session.execute(statement)
+                if shards is None or shards.shard_for(row.user_id) == shard
+            )
+        rows.sort(key=lambda row: row.created_at)
+
+        counters = {}
+        for user_id, kind, currency, amount, created_at in rows:
+            key = (user_id, kind, currency)
+            counter = counters.get(key)
+            if counter is None:
+                counter = counters[key] = SlidingWindowCounter()
+            epoch = created_at.replace(tzinfo=timezone.utc).timestamp()
+            counter.add(self._bucket(epoch), 1, amount)
+
+        with self._lock:
+            self._counters = counters
+            self._built = True
+
+    def _ensure_built(self):
+        if self._built:
+            return
+        try:
+            self.rebuild()
+        except SQLAlchemyError:
+            # Retried on the next check
+            logger.warning("Could not rebuild velocity counters from the ledger", exc_info=True)
+
+    def _prune(self, bucket):
+        # Users idle for a whole window have nothing left to count
+        oldest = bucket - self._bucket_count() + 1
+        for counter in self._counters.values():
+            counter.expire(oldest)
+        self._counters = {key: counter for key, counter in self._counters.items() if counter.buckets}
+        self._pruned_at = time.monotonic()
+
+    def _bucket(self, epoch):
+        return int(epoch // self.bucket_seconds)
+
+    def _bucket_count(self):
+        return max(1, self.window // self.bucket_seconds)
+
+    def _window_text(self):
+        if self.window % 3600 == 0:
+            hours = self.window // 3600
+            return "hour" if hours == 1 else f"{hours} hours"
+        return f"{self.window} seconds"
+
+
+def within_velocity_limits(user_id, kind, currency, amount, execute):
+    """Run ``execute()`` if the user is within the limits for ``kind``.
+
+    ``execute`` returns a ``(result, status_code)`` pair; the reservation is
+    released again if it returns an error status. A 202, e.g. a cross-shard
+    transfer whose credit is still pending, has moved the funds and counts.
+    """
+    limiter = current_app.extensions.get("velocity_limiter")
+    if limiter is None:
+        return execute()
+
+    reservation, error = limiter.acquire(user_id, kind, currency, amount)
+    if error:
+        return {"message": error}, 429
+
+    try:
+        result, status_code = execute()
+    except Exception:
+        limiter.release(reservation)
+        raise
+    if status_code >= 400:
+        limiter.release(reservation)
+    return result, status_code
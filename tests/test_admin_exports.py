@@ -0,0 +1,81 @@
+import csv
+import io
+import json
+import unittest
+from tests.base_test import BaseTestCase
+from models.user import User
+from app import db
+
+
+class AdminExportTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            admin = User(username='exportadmin', email='exportadmin@example.com', is_admin=True)
+            admin.set_password('password123')
+            db.session.add(admin)
+            for name in ('exporter', 'exportee'):
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.commit()
+            cls.exportee_id = User.query.filter_by(username='exportee').first().id
+
+        exporter = cls.login("exporter@example.com")
+        cls.client.post('/user/top-up', json={"amount": 100}, headers=exporter)
+        cls.client.post('/user/transfer', headers=exporter, json={
+            "target_user_id": cls.exportee_id, "amount": 30, "currency": "USD"
+        })
+        cls.client.post('/user/top-up', json={"amount": 5}, headers=cls.login("exportadmin@example.com"))
+
+    @classmethod
+    def login(cls, email):
+        response = cls.client.post('/auth/login', json={"email": email, "password": "password123"})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def export(self, path):
+        response = self.client.get(path, headers=self.login("exportadmin@example.com"))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_users_as_csv(self):
+        response = self.export('/admin/export/users')
+        self.assertEqual(response.mimetype, "text/csv")
+        self.assertIn("filename=users.csv", response.headers["Content-Disposition"])
+
+        rows = {row["username"]: row for row in csv.DictReader(io.StringIO(response.get_data(as_text=True)))}
+        self.assertEqual(set(rows), {'exportadmin', 'exporter', 'exportee'})
+        self.assertEqual(rows['exporter']['balances'], "USD=70.00")
+        self.assertEqual(rows['exportee']['balances'], "USD=30.00")
+
+    def test_transactions_as_ndjson(self):
+        response = self.export('/admin/export/transactions?format=ndjson')
+        self.assertEqual(response.mimetype, "application/x-ndjson")
+
+        records = [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+        self.assertEqual([r['type'] for r in records], ['top_up', 'transfer', 'top_up'])
+        self.assertEqual([r['seq'] for r in records], sorted(r['seq'] for r in records))
+
+    def test_transactions_filtered_by_user(self):
+        response = self.export(f'/admin/export/transactions?user_id={self.exportee_id}')
+        rows = list(csv.DictReader(io.StringIO(response.get_data(as_text=True))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['type'], 'transfer')
+        self.assertEqual(int(rows[0]['target_user_id']), self.exportee_id)
+
+    def test_rejects_unknown_format(self):
+        headers = self.login("exportadmin@example.com")
+        for path in ('/admin/export/users', '/admin/export/transactions'):
+            response = self.client.get(f'{path}?format=xlsx', headers=headers)
+            self.assertEqual(response.status_code, 400)
+
+    def test_exports_forbidden_for_users(self):
+        headers = self.login("exporter@example.com")
+        for path in ('/admin/export/users', '/admin/export/transactions'):
+            self.assertEqual(self.client.get(path, headers=headers).status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import unittest
+from tests.base_test import BaseTestCase
+from models.user import User
+from app import db
+
+
+class AdminStatsTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            admin = User(username='statsadmin', email='statsadmin@example.com', is_admin=True)
+            admin.set_password('password123')
+            user = User(username='statsuser', email='statsuser@example.com')
+            user.set_password('password123')
+            db.session.add_all([admin, user])
+            db.session.commit()
+
+    def login(self, email):
+        response = self.client.post('/auth/login', json={"email": email, "password": "password123"})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_stats_group_by_type(self):
+        user_headers = self.login("statsuser@example.com")
+        self.client.post('/user/top-up', json={"amount": 40}, headers=user_headers)
+        self.client.post('/user/top-up', json={"amount": 60}, headers=user_headers)
+        self.app.test_cli_runner().invoke(args=['refresh-rollups'])
+
+        response = self.client.get('/admin/stats?group_by=type', headers=self.login("statsadmin@example.com"))
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+
+        self.assertEqual(data['count'], 2)
+        self.assertEqual(data['totals'], [{"currency": "USD", "count": 2, "volume": 100}])
+        self.assertEqual(data['groups'], [{"type": "top_up", "currency": "USD", "count": 2, "volume": 100}])
+
+    def test_stats_only_read_the_rollups(self):
+        admin_headers = self.login("statsadmin@example.com")
+        self.app.test_cli_runner().invoke(args=['refresh-rollups'])
+        before = self.client.get('/admin/stats', headers=admin_headers).get_json()
+
+        self.client.post('/user/top-up', json={"amount": 5}, headers=self.login("statsuser@example.com"))
+        stale = self.client.get('/admin/stats', headers=admin_headers).get_json()
+        self.assertEqual(stale['count'], before['count'])
+        self.assertIsNotNone(stale['rollup_through'])
+
+        result = self.app.test_cli_runner().invoke(args=['refresh-rollups'])
+        self.assertEqual(result.exit_code, 0)
+        fresh = self.client.get('/admin/stats', headers=admin_headers).get_json()
+        self.assertEqual(fresh['count'], before['count'] + 1)
+
+    def test_stats_rejects_unknown_group(self):
+        response = self.client.get('/admin/stats?group_by=week', headers=self.login("statsadmin@example.com"))
+        self.assertEqual(response.status_code, 400)
+
+    def test_stats_forbidden_for_users(self):
+        response = self.client.get('/admin/stats', headers=self.login("statsuser@example.com"))
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,91 @@
+import unittest
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.user_balance import UserBalance
+from services import balance_service
+from app import db
+
+
+class AdminUserListingTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            admin = User(username='listadmin', email='listadmin@example.com', is_admin=True)
+            admin.set_password('password123')
+            db.session.add(admin)
+            for name, balance in (('Alice', 10.0), ('alfred', 500.0), ('bob', 75.0)):
+                user = User(username=name, email=f"{name.lower()}@example.com")
+                user.set_password('password123')
+                user.balances.append(UserBalance(currency="USD", balance=balance))
+                db.session.add(user)
+            db.session.commit()
+
+        response = cls.client.post('/auth/login', json={
+            "email": "listadmin@example.com", "password": "password123"
+        })
+        cls.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def usernames(self, query):
+        response = self.client.get(f'/admin/users?{query}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        return [u['username'] for u in response.get_json()['users']]
+
+    def test_prefix_search_is_case_insensitive(self):
+        self.assertEqual(self.usernames('username=AL&sort=username'), ['Alice', 'alfred'])
+
+    def test_balance_threshold(self):
+        self.assertEqual(self.usernames('min_balance=50&currency=USD'), ['alfred', 'bob'])
+
+    def test_keyset_pagination(self):
+        seen = []
+        cursor = ''
+        while True:
+            response = self.client.get(f'/admin/users?limit=2&is_admin=false&cursor={cursor}',
+                                       headers=self.headers)
+            data = response.get_json()
+            seen.extend(u['username'] for u in data['users'])
+            if not data['next_cursor']:
+                break
+            cursor = data['next_cursor']
+
+        self.assertEqual(seen, ['Alice', 'alfred', 'bob'])
+
+    def test_batch_balances(self):
+        with self.app.app_context():
+            ids = [db.session.query(User.id).filter_by(username=name).scalar() for name in ('bob', 'Alice')]
+            bob = db.session.get(User, ids[0])
+            bob.balances.append(UserBalance(currency="EUR", balance=5.0))
+            # A second slot of the same wallet is summed
+            bob.balances.append(UserBalance(currency="USD", slot=1, balance=25.0))
+            db.session.commit()
+
+        original_chunk_size = balance_service.BATCH_BALANCE_CHUNK_SIZE
+        balance_service.BATCH_BALANCE_CHUNK_SIZE = 1
+        try:
+            response = self.client.post('/admin/balances', headers=self.headers,
+                                        json={"user_ids": ids + [999999]})
+        finally:
+            balance_service.BATCH_BALANCE_CHUNK_SIZE = original_chunk_size
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['users'], [
+            {"user_id": ids[0], "balances": [{"currency": "EUR", "balance": 5.0},
+                                             {"currency": "USD", "balance": 100.0}]},
+            {"user_id": ids[1], "balances": [{"currency": "USD", "balance": 10.0}]},
+            {"user_id": 999999, "balances": []},
+        ])
+
+        response = self.client.post('/admin/balances', headers=self.headers,
+                                    json={"user_ids": ids[:1], "currencies": ["eur"]})
+        self.assertEqual(response.get_json()['users'][0]['balances'], [{"currency": "EUR", "balance": 5.0}])
+
+        response = self.client.post('/admin/balances', headers=self.headers, json={"user_ids": ["1"]})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.post('/admin/balances', headers=self.headers, json=ids)
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import unittest
+from unittest import mock
+from tests.base_test import BaseTestCase
+from models.user import User
+from app import create_app, db
+
+
+class AdmissionControlTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            for name in ('limited', 'neighbour'):
+                user = User(username=name, email=f'{name}@example.com')
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.commit()
+
+    def login(self, name):
+        response = self.client.post('/auth/login', json={"email": f"{name}@example.com", "password": "password123"},
+                                    environ_base={'REMOTE_ADDR': f'10.1.0.{len(name)}'})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_login_is_rate_limited_per_ip(self):
+        store = self.app.extensions['admission_control'].store
+        credentials = {"email": "limited@example.com", "password": "wrong"}
+        # A stopped clock, so the bucket does not refill while passwords are hashed
+        with mock.patch.object(store, 'clock', return_value=1000.0):
+            statuses = [self.client.post('/auth/login', json=credentials).status_code for _ in range(11)]
+            self.assertNotIn(429, statuses[:10])
+            self.assertEqual(statuses[10], 429)
+
+            response = self.client.post('/auth/login', json=credentials)
+            self.assertEqual(response.status_code, 429)
+            self.assertGreaterEqual(int(response.headers['Retry-After']), 1)
+
+            # Other addresses have their own bucket
+            response = self.client.post('/auth/login', json=credentials,
+                                        environ_base={'REMOTE_ADDR': '10.0.0.2'})
+            self.assertNotEqual(response.status_code, 429)
+
+    def test_users_behind_one_address_have_their_own_buckets(self):
+        admission = self.app.extensions['admission_control']
+        headers = {name: self.login(name) for name in ('limited', 'neighbour')}
+        limits = {"transaction.top_up": {"user": (0.001, 1), "ip": (0.001, 1)}}
+        with mock.patch.dict(admission.limits, limits), \
+                mock.patch.object(admission.store, 'clock', return_value=2000.0):
+            for name in ('limited', 'neighbour'):
+                response = self.client.post('/user/top-up', json={"amount": 1}, headers=headers[name])
+                self.assertEqual(response.status_code, 200)
+            response = self.client.post('/user/top-up', json={"amount": 1}, headers=headers['limited'])
+            self.assertEqual(response.status_code, 429)
+
+    def test_proxy_fix_gives_anonymous_clients_their_own_address(self):
+        with mock.patch.dict(os.environ, {"PROXY_FIX_X_FOR": "1"}):
+            app = create_app('testing')
+        client = app.test_client()
+        with app.app_context():
+            db.create_all()
+        try:
+            store = app.extensions['admission_control'].store
+            credentials = {"email": "nobody@example.com", "password": "wrong"}
+            with mock.patch.object(store, 'clock', return_value=1000.0):
+                for _ in range(10):
+                    client.post('/auth/login', json=credentials, headers={"X-Forwarded-For": "192.0.2.1"})
+                response = client.post('/auth/login', json=credentials, headers={"X-Forwarded-For": "192.0.2.1"})
+                self.assertEqual(response.status_code, 429)
+                response = client.post('/auth/login', json=credentials, headers={"X-Forwarded-For": "192.0.2.2"})
+                self.assertNotEqual(response.status_code, 429)
+        finally:
+            with app.app_context():
+                db.session.remove()
+                db.drop_all()
+
+    def test_rate_limit_does_not_check_the_blocklist(self):
+        response = self.client.post('/auth/login', json={"email": "limited@example.com", "password": "password123"})
+        headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+        revocation = self.app.extensions['token_revocation']
+        with mock.patch.object(revocation, 'is_revoked', return_value=False) as is_revoked:
+            response = self.client.post('/user/top-up', json={"amount": 5}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+        # Only the view's own check
+        self.assertEqual(is_revoked.call_count, 1)
+
+    def test_expensive_endpoints_share_a_concurrency_cap(self):
+        admission = self.app.extensions['admission_control']
+        limit = self.app.config['MAX_CONCURRENT_EXPENSIVE']
+        for _ in range(limit):
+            admission._slots.acquire()
+        try:
+            response = self.client.get('/user/transactions')
+            self.assertEqual(response.status_code, 429)
+            self.assertEqual(response.headers['Retry-After'], '1')
+        finally:
+            for _ in range(limit):
+                admission._slots.release()
+
+        response = self.client.get('/user/transactions')
+        self.assertEqual(response.status_code, 401)
+
+    def test_admin_reports_are_expensive(self):
+        expensive = self.app.extensions['admission_control'].expensive_endpoints
+        for endpoint in ("admin.get_stats", "admin.export_users", "admin.export_transactions"):
+            self.assertIn(endpoint, expensive)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+import asyncio
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+from asgiref.testing import ApplicationCommunicator
+
+from app import create_app, db
+from models.user import User
+from models.user_balance import UserBalance
+from utils.asgi import AsyncReadApp, async_database_url
+
+
+class AsyncReadTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The async engine needs a database it can open too, not a private :memory: one
+        cls.directory = tempfile.mkdtemp()
+        environment = {
+            "DATABASE_URL": f"sqlite:///{os.path.join(cls.directory, 'wallet.db')}",
+            "SECRET_KEY": "supersecretkey",
+        }
+        with mock.patch.dict(os.environ, environment):
+            cls.app = create_app()
+        cls.client = cls.app.test_client()
+        cls.asgi = AsyncReadApp(cls.app)
+
+        with cls.app.app_context():
+            db.create_all()
+            for name in ("reader", "friend"):
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password("password123")
+                user.balances.append(UserBalance(currency="USD", balance=100.0))
+                db.session.add(user)
+            db.session.commit()
+            cls.friend_id = User.query.filter_by(username="friend").first().id
+            cls.reader_id = User.query.filter_by(username="reader").first().id
+
+        response = cls.client.post('/auth/login', json={"email": "reader@example.com", "password": "password123"})
+        cls.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+        for amount in (10, 20, 30):
+            cls.client.post('/user/transfer', headers=cls.headers, json={
+                "target_user_id": cls.friend_id, "amount": amount, "currency": "USD"
+            })
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        asyncio.run(cls.asgi.engine.dispose())
+        shutil.rmtree(cls.directory)
+
+    def get(self, path, query="", headers=None):
+        async def request():
+            communicator = ApplicationCommunicator(self.asgi, {
+                "type": "http",
+                "asgi": {"version": "3.0"},
+                "http_version": "1.1",
+                "method": "GET",
+                "scheme": "http",
+                "path": path,
+                "raw_path": path.encode(),
+                "query_string": query.encode(),
+                "root_path": "",
+                "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+                "client": ("127.0.0.1", 1234),
+                "server": ("localhost", 80),
+            })
+            await communicator.send_input({"type": "http.request", "body": b"", "more_body": False})
+            start = await communicator.receive_output(5)
+            body = b""
+            self.messages = 0
+            self.response_headers = dict(start["headers"])
+            while True:
+                message = await communicator.receive_output(5)
+                body += message.get("body", b"")
+                self.messages += 1
+                if not message.get("more_body"):
+                    break
+            return start["status"], json.loads(body)
+
+        return asyncio.run(request())
+
+    def test_profile_matches_sync_endpoint(self):
+        status, body = self.get("/user/profile", headers=self.headers)
+        self.assertEqual(status, 200)
+        self.assertEqual(body, self.client.get('/user/profile', headers=self.headers).get_json())
+        self.assertEqual(body["balances"][0]["amount"], 40.0)
+
+    def test_transactions_match_sync_endpoint(self):
+        for query in ("", "limit=2"):
+            self.app.extensions["history_cache"].invalidate(self.reader_id)
+            status, body = self.get("/user/transactions", query=query, headers=self.headers)
+            self.assertEqual(status, 200)
+            self.app.extensions["history_cache"].invalidate(self.reader_id)
+            expected = self.client.get(f'/user/transactions?{query}', headers=self.headers).get_json()
+            self.assertEqual(body, expected)
+
+        status, body = self.get("/user/transactions", query="limit=2", headers=self.headers)
+        self.assertEqual(len(body["transactions"]), 2)
+        self.assertIsNotNone(body["next_cursor"])
+
+    def test_full_history_is_streamed(self):
+        with mock.patch("services.async_read_service.HISTORY_BATCH_SIZE", 1):
+            status, body = self.get("/user/transactions", headers=self.headers)
+        self.assertEqual(status, 200)
+        self.assertNotIn(b"content-length", self.response_headers)
+        # Opening, one chunk per row, closing and the final empty message
+        self.assertEqual(self.messages, len(body["transactions"]) + 3)
+        self.assertEqual(body, self.client.get('/user/transactions', headers=self.headers).get_json())
+
+    def test_token_is_required(self):
+        status, body = self.get("/user/profile")
+        self.assertEqual(status, 401)
+
+        status, body = self.get("/user/profile", headers={"Authorization": "Bearer not-a-token"})
+        self.assertEqual(status, 422)
+
+    def test_revocations_sync_off_the_event_loop(self):
+        revocation = self.app.extensions["token_revocation"]
+        threads = []
+        revocation._synced_at = None
+        with mock.patch.object(revocation, "sync", side_effect=lambda: threads.append(threading.get_ident())):
+            status, body = self.get("/user/profile", headers=self.headers)
+        self.assertEqual(status, 200)
+        self.assertEqual(len(threads), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_admission_control_applies(self):
+        admission = self.app.extensions["admission_control"]
+        with mock.patch.dict(admission.limits, {"user.get_profile": {"user": (0.001, 1)}}):
+            self.assertEqual(self.get("/user/profile", headers=self.headers)[0], 200)
+            status, body = self.get("/user/profile", headers=self.headers)
+        self.assertEqual(status, 429)
+
+        with mock.patch.object(admission._slots, "acquire", return_value=False):
+            status, body = self.get("/user/transactions", headers=self.headers)
+        self.assertEqual(status, 429)
+
+    def test_stream_token_is_refused(self):
+        response = self.client.post('/user/events/token', headers=self.headers)
+        stream_headers = {"Authorization": f"Bearer {response.get_json()['stream_token']}"}
+        status, body = self.get("/user/profile", headers=stream_headers)
+        self.assertEqual(status, 400)
+
+    def test_other_requests_go_to_flask(self):
+        status, body = self.get("/admin/users", headers=self.headers)
+        self.assertEqual(status, 403)
+
+    def test_async_url(self):
+        self.assertEqual(
+            async_database_url("postgresql://user:secret@db/wallet"), "postgresql+asyncpg://user:secret@db/wallet"
+        )
+        self.assertEqual(async_database_url("sqlite:////tmp/wallet.db"), "sqlite+aiosqlite:////tmp/wallet.db")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,101 @@
+import unittest
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.user_balance import UserBalance
+from services.balance_service import BalanceService
+from app import db
+
+
+class BalanceSlotsTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            admin = User(username='slotadmin', email='slotadmin@example.com', is_admin=True)
+            admin.set_password('password123')
+            shop = User(username='shop', email='shop@example.com')
+            shop.set_password('password123')
+            payer = User(username='payer', email='payer@example.com')
+            payer.set_password('password123')
+            shop.balances.append(UserBalance(currency="USD", balance=10.0))
+            payer.balances.append(UserBalance(currency="USD", balance=100.0))
+            db.session.add_all([admin, shop, payer])
+            db.session.commit()
+            cls.shop_id = shop.id
+
+        cls.admin_headers = cls.login('slotadmin@example.com')
+        cls.payer_headers = cls.login('payer@example.com')
+        cls.shop_headers = cls.login('shop@example.com')
+
+    @classmethod
+    def login(cls, email):
+        response = cls.client.post('/auth/login', json={"email": email, "password": "password123"})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_sharded_wallet_sums_slots(self):
+        response = self.client.put(f'/admin/user/{self.shop_id}/balance-slots',
+                                   headers=self.admin_headers, json={"slots": 4})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['balances'], [{"currency": "USD", "balance": 10.0}])
+
+        for _ in range(6):
+            response = self.client.post('/user/transfer', headers=self.payer_headers, json={
+                "target_user_id": self.shop_id, "amount": 5, "currency": "USD"
+            })
+            self.assertEqual(response.status_code, 200)
+
+        with self.app.app_context():
+            self.assertEqual(UserBalance.query.filter_by(user_id=self.shop_id).count(), 4)
+
+        profile = self.client.get('/user/profile', headers=self.shop_headers).get_json()
+        self.assertEqual(profile['balances'][0]['amount'], 40.0)
+
+        # A debit larger than any single slot draws from several of them
+        response = self.client.post('/user/transfer', headers=self.shop_headers, json={
+            "target_user_id": 1, "amount": 35, "currency": "USD"
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['balance'], 5.0)
+
+        response = self.client.post('/user/transfer', headers=self.shop_headers, json={
+            "target_user_id": 1, "amount": 6, "currency": "USD"
+        })
+        self.assertEqual(response.status_code, 400)
+
+        self.client.put(f'/admin/user/{self.shop_id}/balance-slots',
+                        headers=self.admin_headers, json={"slots": 1})
+        with self.app.app_context():
+            self.assertEqual(BalanceService.consolidate(), 1)
+            slots = UserBalance.query.filter_by(user_id=self.shop_id).all()
+            self.assertEqual([(slot.slot, slot.balance) for slot in slots], [(0, 5.0)])
+
+    def test_single_slot_debit_reads_the_locked_row(self):
+        with self.app.app_context():
+            payer = User.query.filter_by(username='payer').first()
+            wallet = UserBalance.query.filter_by(user_id=payer.id, currency="USD").first()
+            # Another worker's credit, committed after this session loaded the row
+            with db.engine.begin() as connection:
+                connection.execute(
+                    UserBalance.__table__.update()
+                    .where(UserBalance.__table__.c.id == wallet.id)
+                    .values(balance=UserBalance.__table__.c.balance + 1000)
+                )
+
+            balance = BalanceService.debit(payer, "USD", 500)
+            self.assertIsNotNone(balance)
+            self.assertEqual(wallet.balance, balance)
+            db.session.rollback()
+
+    def test_invalid_slot_count(self):
+        response = self.client.put(f'/admin/user/{self.shop_id}/balance-slots',
+                                   headers=self.admin_headers, json={"slots": 0})
+        self.assertEqual(response.status_code, 400)
+
+        response = self.client.put(f'/admin/user/{self.shop_id}/balance-slots',
+                                   headers=self.admin_headers, json=[4])
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
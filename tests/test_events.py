@@ -0,0 +1,92 @@
+import json
+import unittest
+from flask_jwt_extended import decode_token
+from tests.base_test import BaseTestCase
+from models.user import User
+from app import db
+
+
+def read_event(chunks):
+    lines = next(chunks).decode().strip().splitlines()
+    return lines[0].split(": ", 1)[1], json.loads(lines[1].split(": ", 1)[1])
+
+
+class BalanceEventsTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            for name in ('eventsender', 'eventreceiver'):
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.commit()
+            cls.receiver_id = User.query.filter_by(username='eventreceiver').first().id
+
+    def login(self, email):
+        response = self.client.post('/auth/login', json={"email": email, "password": "password123"})
+        return response.get_json()['access_token']
+
+    def test_receiver_is_notified_of_transfer(self):
+        sender_token = self.login("eventsender@example.com")
+        receiver_token = self.login("eventreceiver@example.com")
+
+        response = self.client.post('/user/events/token', headers={"Authorization": f"Bearer {receiver_token}"})
+        stream_token = response.get_json()['stream_token']
+
+        response = self.client.get(f'/user/events?jwt={stream_token}', buffered=False)
+        self.assertEqual(response.status_code, 200)
+        chunks = response.response
+
+        event_type, data = read_event(chunks)
+        self.assertEqual(event_type, "profile")
+        self.assertEqual(data['balances'], [])
+
+        sender_headers = {"Authorization": f"Bearer {sender_token}"}
+        self.client.post('/user/top-up', json={"amount": 100}, headers=sender_headers)
+        self.client.post('/user/transfer', headers=sender_headers, json={
+            "target_user_id": self.receiver_id, "amount": 30, "currency": "USD"
+        })
+
+        event_type, data = read_event(chunks)
+        self.assertEqual(event_type, "transaction")
+        self.assertEqual(data['transaction']['status'], "credited")
+        self.assertEqual(data['balances'], [{"currency": "USD", "amount": 30}])
+        response.close()
+
+    def test_access_token_is_refused_in_the_url(self):
+        token = self.login("eventreceiver@example.com")
+        response = self.client.get(f'/user/events?jwt={token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_stream_token_only_opens_streams(self):
+        token = self.login("eventreceiver@example.com")
+        response = self.client.post('/user/events/token', headers={"Authorization": f"Bearer {token}"})
+        stream_headers = {"Authorization": f"Bearer {response.get_json()['stream_token']}"}
+        with self.app.app_context():
+            claims = decode_token(response.get_json()['stream_token'])
+        # An access token restricted by its own claim, the reserved "type" is left alone
+        self.assertEqual((claims['type'], claims['scope']), ("access", "events"))
+
+        self.assertEqual(self.client.get('/user/profile', headers=stream_headers).status_code, 400)
+        self.assertEqual(self.client.post('/user/events/token', headers=stream_headers).status_code, 400)
+
+    def test_open_streams_are_capped_per_user(self):
+        headers = {"Authorization": f"Bearer {self.login('eventsender@example.com')}"}
+        hub = self.app.extensions['event_hub']
+        streams = [self.client.get('/user/events', headers=headers, buffered=False)
+                   for _ in range(hub.max_streams_per_user)]
+        self.assertTrue(all(stream.status_code == 200 for stream in streams))
+
+        self.assertEqual(self.client.get('/user/events', headers=headers).status_code, 429)
+
+        streams.pop().close()
+        stream = self.client.get('/user/events', headers=headers, buffered=False)
+        self.assertEqual(stream.status_code, 200)
+        for stream in streams + [stream]:
+            stream.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
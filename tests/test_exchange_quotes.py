@@ -0,0 +1,78 @@
+import unittest
+from unittest import mock
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.user_balance import UserBalance
+from services.exchange_service import EXCHANGE_RATES
+from app import db
+
+
+class ExchangeQuoteTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            user = User(username='quoter', email='quoter@example.com')
+            user.set_password('password123')
+            user.balances.append(UserBalance(currency="USD", balance=100.0))
+            db.session.add(user)
+            db.session.commit()
+
+        response = cls.client.post('/auth/login', json={
+            "email": "quoter@example.com", "password": "password123"
+        })
+        cls.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def request_quote(self, amount=10):
+        response = self.client.post('/user/exchange/quote', headers=self.headers, json={
+            "amount": amount, "currency_from": "USD", "currency_to": "EUR"
+        })
+        self.assertEqual(response.status_code, 201)
+        return response.get_json()
+
+    def test_exchange_uses_locked_rate_once(self):
+        quote = self.request_quote()
+
+        with mock.patch.dict(EXCHANGE_RATES, {("USD", "EUR"): 2.0}):
+            response = self.client.post('/user/exchange', headers=self.headers,
+                                        json={"quote_id": quote['quote_id']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['converted_amount'], quote['converted_amount'])
+
+        response = self.client.post('/user/exchange', headers=self.headers,
+                                    json={"quote_id": quote['quote_id']})
+        self.assertEqual(response.status_code, 400)
+
+    def test_expired_quote_is_rejected(self):
+        self.app.config['EXCHANGE_QUOTE_TTL_SECONDS'] = 0
+        try:
+            quote = self.request_quote()
+        finally:
+            self.app.config['EXCHANGE_QUOTE_TTL_SECONDS'] = 30
+
+        response = self.client.post('/user/exchange', headers=self.headers,
+                                    json={"quote_id": quote['quote_id']})
+        self.assertEqual(response.status_code, 400)
+
+    def test_quote_id_must_be_a_string(self):
+        for quote_id in ({"a": 1}, [1, 2], 7):
+            response = self.client.post('/user/exchange', headers=self.headers, json={"quote_id": quote_id})
+            self.assertEqual(response.status_code, 400)
+
+    def test_failed_exchange_leaves_quote_usable(self):
+        quote = self.request_quote(amount=1000)
+        response = self.client.post('/user/exchange', headers=self.headers,
+                                    json={"quote_id": quote['quote_id']})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('Insufficient balance', response.get_json()['message'])
+
+        response = self.client.post('/user/top-up', headers=self.headers, json={"amount": 1000})
+        self.assertEqual(response.status_code, 200)
+        response = self.client.post('/user/exchange', headers=self.headers,
+                                    json={"quote_id": quote['quote_id']})
+        self.assertEqual(response.status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
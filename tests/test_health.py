@@ -0,0 +1,43 @@
+import unittest
+from unittest import mock
+
+from sqlalchemy.exc import OperationalError
+
+from tests.base_test import BaseTestCase
+
+
+class HealthTestCase(BaseTestCase):
+
+    def test_ready_only_after_warm_up(self):
+        warm_up = self.app.extensions['warm_up']
+        self.assertEqual(self.client.get('/health/ready').status_code, 200)
+
+        warm_up.status = "pending"
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 503)
+
+        warm_up.run()
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        data = response.get_json()
+        self.assertEqual(data['status'], "ready")
+        self.assertTrue(all(step['ok'] for step in data['steps'].values()))
+        self.assertIn('primary', data['pools'])
+        self.assertIn('hit_rate', data['caches']['history'])
+
+    def test_failed_warm_up_is_retried(self):
+        warm_up = self.app.extensions['warm_up']
+        self.app.config['WARMUP_RETRY_SECONDS'] = 0
+        limiter = self.app.extensions['velocity_limiter']
+        with mock.patch.object(limiter, 'rebuild', side_effect=OperationalError("SELECT", {}, None)):
+            warm_up.run()
+        self.assertEqual(warm_up.status, "failed")
+        self.assertFalse(warm_up.steps['velocity']['ok'])
+
+        response = self.client.get('/health/ready')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['status'], "ready")
+
+
+if __name__ == '__main__':
+    unittest.main()
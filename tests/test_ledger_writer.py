@@ -0,0 +1,59 @@
+import os
+import unittest
+from unittest import mock
+from app import create_app, db
+from models.user import User
+from models.user_balance import UserBalance
+from models.transaction import Transaction
+
+
+class LedgerWriterTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        with mock.patch.dict(os.environ, {"LEDGER_WRITER_ENABLED": "true", "LEDGER_HOT_ACCOUNTS": "1"}):
+            cls.app = create_app('testing')
+        cls.client = cls.app.test_client()
+        with cls.app.app_context():
+            db.create_all()
+            for name in ('merchant', 'customer'):
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.commit()
+            customer = User.query.filter_by(username='customer').first()
+            db.session.add(UserBalance(user_id=customer.id, currency="USD", balance=50.0))
+            db.session.commit()
+
+        response = cls.client.post('/auth/login', json={
+            "email": "customer@example.com", "password": "password123"
+        })
+        cls.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+
+    def test_transfers_to_hot_account_are_batched(self):
+        response = self.client.post('/user/transfer', headers=self.headers, json={
+            "target_user_id": 1, "amount": 20, "currency": "USD"
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()['balance'], 30)
+        self.assertEqual(response.get_json()['target_username'], "merchant")
+
+        response = self.client.post('/user/transfer', headers=self.headers, json={
+            "target_user_id": 1, "amount": 40, "currency": "USD"
+        })
+        self.assertEqual(response.status_code, 400)
+
+        with self.app.app_context():
+            merchant_balance = UserBalance.query.filter_by(user_id=1, currency="USD").first()
+            self.assertEqual(merchant_balance.balance, 20)
+            self.assertEqual(Transaction.query.filter_by(target_user_id=1).count(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import unittest
+from tests.base_test import BaseTestCase
+from sqlalchemy import func, insert, select
+from models.user import User
+from models.posting import Posting
+from models.transaction import Transaction
+from services import postings
+from services.balance_service import BalanceService
+from app import db
+
+
+class PostingTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.headers = {}
+        for name in ('poster', 'postee'):
+            with cls.app.app_context():
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password('password123')
+                db.session.add(user)
+                db.session.commit()
+            response = cls.client.post('/auth/login', json={
+                "email": f"{name}@example.com", "password": "password123"
+            })
+            cls.headers[name] = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+        with cls.app.app_context():
+            cls.postee_id = User.query.filter_by(username='postee').first().id
+            cls.poster_id = User.query.filter_by(username='poster').first().id
+
+        cls.client.post('/user/top-up', json={"amount": 100}, headers=cls.headers['poster'])
+        cls.client.post('/user/exchange', headers=cls.headers['poster'], json={
+            "amount": 40, "currency_from": "USD", "currency_to": "EUR"
+        })
+        cls.client.post('/user/transfer', headers=cls.headers['poster'], json={
+            "target_user_id": cls.postee_id, "amount": 25, "currency": "USD"
+        })
+
+    def account_balances(self, user_id):
+        statement = postings.balances_statement(postings.user_account(user_id))
+        return {currency: round(amount, 2) for currency, amount in db.session.execute(statement)}
+
+    def test_every_ledger_row_balances(self):
+        with self.app.app_context():
+            unbalanced = db.session.execute(
+                select(Posting.transaction_id, Posting.currency)
+                .group_by(Posting.transaction_id, Posting.currency)
+                .having(func.abs(func.sum(Posting.amount)) > 1e-9)
+            ).all()
+            self.assertEqual(unbalanced, [])
+            self.assertEqual(
+                db.session.scalar(select(func.count(func.distinct(Posting.transaction_id)))),
+                Transaction.query.count()
+            )
+
+    def test_account_balances_match_wallets(self):
+        with self.app.app_context():
+            for user_id in (self.poster_id, self.postee_id):
+                wallets = {wallet.currency: round(wallet.balance, 2) for wallet in BalanceService.wallets(user_id)}
+                self.assertEqual(self.account_balances(user_id), wallets)
+
+    def test_backfill_posts_rows_written_without_legs(self):
+        with self.app.app_context():
+            # A Core insert skips the session, like rows written before postings existed
+            db.session.execute(insert(Transaction).values(
+                seq=1000, user_id=self.postee_id, type="top_up", amount=7.0,
+                currency="USD", currency_symbol="$"
+            ))
+            db.session.commit()
+            before = self.account_balances(self.postee_id)["USD"]
+
+            self.assertEqual(postings.backfill(batch_size=1), 1)
+            self.assertEqual(self.account_balances(self.postee_id)["USD"], before + 7)
+            self.assertEqual(postings.backfill(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
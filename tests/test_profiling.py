@@ -0,0 +1,74 @@
+import unittest
+from tests.base_test import BaseTestCase
+from models.user import User
+from app import db
+
+
+class RequestProfilingTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            for name, is_admin in (('profadmin', True), ('profuser', False)):
+                user = User(username=name, email=f"{name}@example.com", is_admin=is_admin)
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.commit()
+
+        cls.admin_headers = cls.login('profadmin@example.com')
+        cls.client.post('/user/top-up', json={"amount": 10}, headers=cls.admin_headers)
+        cls.user_headers = cls.login('profuser@example.com')
+
+    @classmethod
+    def login(cls, email):
+        response = cls.client.post('/auth/login', json={"email": email, "password": "password123"})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_admin_request_is_profiled(self):
+        response = self.client.get('/user/transactions',
+                                   headers={**self.admin_headers, "X-Profile": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.get_json()['transactions']), 1)
+        response.close()
+        profile_id = response.headers['X-Profile-Id']
+
+        response = self.client.get(f'/admin/profiles/{profile_id}', headers=self.admin_headers)
+        self.assertEqual(response.status_code, 200)
+        profile = response.get_json()
+        self.assertEqual(profile['endpoint'], 'transaction.get_transactions')
+        self.assertGreater(profile['sql_count'], 0)
+        # The history rows are read while the streamed body is written, after the view returned
+        self.assertTrue(any('"transaction".seq <=' in s['statement'] and 'ORDER BY' in s['statement']
+                            for s in profile['statements']), profile['statements'])
+        self.assertTrue(profile['functions'])
+
+        summaries = self.client.get('/admin/profiles', headers=self.admin_headers).get_json()
+        self.assertEqual(summaries['profiles'][0]['id'], profile_id)
+
+    def test_only_the_slowest_statements_are_kept(self):
+        profiler = self.app.extensions['request_profiler']
+        profiler.max_statements = 1
+        try:
+            response = self.client.get('/admin/users', headers={**self.admin_headers, "X-Profile": "1"})
+        finally:
+            profiler.max_statements = self.app.config['PROFILE_MAX_STATEMENTS']
+
+        profile = profiler.get(response.headers['X-Profile-Id'])
+        self.assertGreater(profile['sql_count'], 1)
+        self.assertEqual(len(profile['statements']), 1)
+        self.assertEqual(profile['statements_dropped'], profile['sql_count'] - 1)
+        self.assertGreaterEqual(profile['sql_ms'], profile['statements'][0]['duration_ms'])
+
+    def test_header_is_ignored_for_non_admins(self):
+        response = self.client.get('/user/transactions',
+                                   headers={**self.user_headers, "X-Profile": "1"})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response.headers)
+
+        response = self.client.get('/admin/profiles', headers=self.user_headers)
+        self.assertEqual(response.status_code, 403)
+
+
+if __name__ == '__main__':
+    unittest.main()
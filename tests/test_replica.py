@@ -0,0 +1,75 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from app import create_app, db
+from models.user import User
+
+
+class ReplicaRoutingTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.replica_dir = tempfile.TemporaryDirectory()
+        replica_url = f"sqlite:///{os.path.join(cls.replica_dir.name, 'replica.db')}"
+        with mock.patch.dict(os.environ, {"REPLICA_DATABASE_URL": replica_url}):
+            cls.app = create_app('testing')
+        cls.client = cls.app.test_client()
+        with cls.app.app_context():
+            db.create_all()
+            db.metadata.create_all(cls.app.extensions['replica_router'].engine)
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            cls.app.extensions['replica_router'].engine.dispose()
+        cls.replica_dir.cleanup()
+
+    def test_profile_reads_follow_replica_and_own_writes(self):
+        """Profile reads go to the primary right after a write, then to the replica"""
+
+        self.client.post('/auth/signup', json={
+            "username": "replicauser",
+            "email": "replicauser@example.com",
+            "password": "password123"
+        })
+        response = self.client.post('/auth/login', json={
+            "email": "replicauser@example.com", "password": "password123"
+        })
+        token = response.get_json()['access_token']
+        headers = {"Authorization": f"Bearer {token}"}
+
+        # The replica has the user but has not caught up with the balance yet
+        with self.app.app_context():
+            user = User.query.filter_by(username="replicauser").first()
+            with self.app.extensions['replica_router'].engine.begin() as connection:
+                connection.execute(User.__table__.insert().values(
+                    id=user.id,
+                    username=user.username,
+                    email=user.email,
+                    password_hash=user.password_hash,
+                    is_admin=False,
+                    created_at=user.created_at,
+                    currency="USD"
+                ))
+
+        response = self.client.post('/user/top-up', json={"amount": 25}, headers=headers)
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/user/profile', headers=headers)
+        self.assertEqual(response.get_json()['balances'][0]['amount'], 25)
+
+        # Another worker does not know about the write, the client's cookie keeps it on the primary
+        self.app.extensions['replica_router']._recent_writers.clear()
+        response = self.client.get('/user/profile', headers=headers)
+        self.assertEqual(response.get_json()['balances'][0]['amount'], 25)
+
+        self.client.delete_cookie(self.app.config['REPLICA_WRITE_COOKIE'])
+        response = self.client.get('/user/profile', headers=headers)
+        self.assertEqual(response.get_json()['balances'], [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import csv
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from app import create_app, db
+from models.user import User
+from models.report_job import ReportJob
+from utils.utils import utc_now
+
+
+class ReportJobTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        # The pool's processes open the database themselves, so it cannot be :memory:
+        cls.directory = tempfile.mkdtemp()
+        environment = {
+            "DATABASE_URL": f"sqlite:///{os.path.join(cls.directory, 'wallet.db')}",
+            "SECRET_KEY": "supersecretkey",
+            "REPORT_DIRECTORY": os.path.join(cls.directory, "reports"),
+            "WARMUP_ENABLED": "false",
+        }
+        with mock.patch.dict(os.environ, environment):
+            cls.app = create_app()
+        cls.client = cls.app.test_client()
+
+        with cls.app.app_context():
+            db.create_all()
+            for name, is_admin in (("reporter", False), ("payee", False), ("auditor", True)):
+                user = User(username=name, email=f"{name}@example.com", is_admin=is_admin)
+                user.set_password("password123")
+                db.session.add(user)
+            db.session.commit()
+            cls.payee_id = User.query.filter_by(username="payee").first().id
+
+        cls.headers = {}
+        for name in ("reporter", "payee", "auditor"):
+            response = cls.client.post('/auth/login', json={"email": f"{name}@example.com", "password": "password123"})
+            cls.headers[name] = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+        cls.client.post('/user/top-up', json={"amount": 100}, headers=cls.headers["reporter"])
+        cls.client.post('/user/transfer', headers=cls.headers["reporter"], json={
+            "target_user_id": cls.payee_id, "amount": 30, "currency": "USD"
+        })
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.app.extensions['report_jobs'].shutdown()
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+            db.engine.dispose()
+        shutil.rmtree(cls.directory)
+
+    def build(self, name, **request):
+        response = self.client.post('/reports', headers=self.headers[name], json=request)
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["id"]
+
+        deadline = time.monotonic() + 60
+        while True:
+            job = self.client.get(f'/reports/{job_id}', headers=self.headers[name]).get_json()
+            if job["state"] in ("done", "failed") or time.monotonic() > deadline:
+                break
+            time.sleep(0.1)
+        self.assertEqual(job["state"], "done", job)
+
+        response = self.client.get(f'/reports/{job_id}/download', headers=self.headers[name])
+        self.assertEqual(response.status_code, 200)
+        rows = list(csv.DictReader(io.StringIO(gzip.decompress(response.data).decode())))
+        self.assertEqual(len(rows), job["rows"])
+        return job_id, rows
+
+    def test_statement_has_running_balances(self):
+        job_id, rows = self.build("reporter", kind="statement")
+        self.assertEqual([row["status"] for row in rows], ["credited", "debited"])
+        self.assertEqual([float(row["balance"]) for row in rows], [100.0, 70.0])
+
+        # Another user cannot see it, an admin can
+        self.assertEqual(self.client.get(f'/reports/{job_id}', headers=self.headers["payee"]).status_code, 404)
+        self.assertEqual(self.client.get(f'/reports/{job_id}', headers=self.headers["auditor"]).status_code, 200)
+
+    def test_admin_transaction_report_for_a_date_range(self):
+        _, rows = self.build("auditor", kind="transactions", date_from="2000-01-01T00:00:00")
+        self.assertEqual([row["type"] for row in rows], ["top_up", "transfer"])
+
+        _, rows = self.build("auditor", kind="transactions", date_to="2000-01-01T00:00:00")
+        self.assertEqual(rows, [])
+
+    def test_users_only_get_their_own_statement(self):
+        response = self.client.post('/reports', headers=self.headers["reporter"], json={"kind": "transactions"})
+        self.assertEqual(response.status_code, 403)
+        response = self.client.post('/reports', headers=self.headers["reporter"], json={
+            "kind": "statement", "user_id": self.payee_id
+        })
+        self.assertEqual(response.status_code, 403)
+
+    def test_requester_has_a_limit_of_pending_reports(self):
+        with self.app.app_context():
+            for n in range(self.app.config["REPORT_MAX_PENDING_PER_USER"]):
+                db.session.add(ReportJob(id=f"pending{n}", kind="statement", requested_by=self.payee_id,
+                                         user_id=self.payee_id, state="queued"))
+            db.session.commit()
+        try:
+            response = self.client.post('/reports', headers=self.headers["payee"], json={"kind": "statement"})
+            self.assertEqual(response.status_code, 429)
+        finally:
+            with self.app.app_context():
+                ReportJob.query.filter(ReportJob.id.like("pending%")).delete(synchronize_session=False)
+                db.session.commit()
+
+    def test_prune_deletes_old_reports(self):
+        fresh_id, _ = self.build("reporter", kind="statement")
+        with self.app.app_context():
+            db.session.add(ReportJob(id="expired", kind="statement", requested_by=self.payee_id,
+                                     user_id=self.payee_id, state="done",
+                                     created_at=utc_now() - timedelta(days=30)))
+            db.session.commit()
+            reports = self.app.extensions['report_jobs']
+            expired_path = reports.path(db.session.get(ReportJob, "expired"))
+            fresh_path = reports.path(db.session.get(ReportJob, fresh_id))
+        with gzip.open(expired_path, "wt") as file:
+            file.write("seq\n")
+        old = time.time() - 30 * 86400
+        os.utime(expired_path, (old, old))
+
+        result = self.app.test_cli_runner().invoke(args=["prune-reports"])
+        self.assertIn("Pruned 1 report jobs and 1 report files", result.output)
+        self.assertFalse(os.path.exists(expired_path))
+        self.assertTrue(os.path.exists(fresh_path))
+        self.assertEqual(self.client.get('/reports/expired', headers=self.headers["auditor"]).status_code, 404)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,98 @@
+import unittest
+from datetime import timedelta
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.user_balance import UserBalance
+from models.scheduled_transfer import ScheduledTransfer
+from models.transaction import Transaction
+from services.balance_service import BalanceService
+from services.scheduled_transfer_service import ScheduledTransferService
+from utils.utils import utc_now
+from app import db
+
+
+class ScheduledTransferTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            for name, balance in (('payroll', 100.0), ('employee', 0.0), ('landlord', 0.0)):
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password('password123')
+                user.balances.append(UserBalance(currency="USD", balance=balance))
+                db.session.add(user)
+            db.session.commit()
+            cls.ids = {user.username: user.id for user in User.query.all()}
+
+        response = cls.client.post('/auth/login', json={
+            "email": "payroll@example.com", "password": "password123"
+        })
+        cls.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_due_transfers_run_in_a_batch_and_reschedule(self):
+        response = self.client.post('/user/scheduled-transfers', headers=self.headers, json={
+            "target_user_id": self.ids['employee'], "amount": 30, "currency": "USD",
+            "interval_seconds": 3600
+        })
+        self.assertEqual(response.status_code, 201)
+        recurring_id = response.get_json()['id']
+
+        # Larger than what is left after the recurring one, fails without undoing it
+        response = self.client.post('/user/scheduled-transfers', headers=self.headers, json={
+            "target_user_id": self.ids['landlord'], "amount": 80, "currency": "USD"
+        })
+        one_off_id = response.get_json()['id']
+
+        with self.app.app_context():
+            # Make the one-off due after the recurring transfer
+            one_off = db.session.get(ScheduledTransfer, one_off_id)
+            one_off.next_run_at = utc_now() - timedelta(seconds=1)
+            recurring = db.session.get(ScheduledTransfer, recurring_id)
+            recurring.next_run_at = utc_now() - timedelta(hours=2, minutes=30)
+            db.session.commit()
+
+            result = ScheduledTransferService.run_due()
+            self.assertEqual(result, {"executed": 1, "failed": 1})
+
+            self.assertEqual(BalanceService.get_balance(self.ids['employee'], "USD"), 30)
+            self.assertEqual(BalanceService.get_balance(self.ids['payroll'], "USD"), 70)
+            self.assertEqual(Transaction.query.filter_by(target_user_id=self.ids['employee']).count(), 1)
+
+            recurring = db.session.get(ScheduledTransfer, recurring_id)
+            self.assertTrue(recurring.active)
+            # Missed runs are skipped, the next one is in the future
+            self.assertGreater(recurring.next_run_at, utc_now())
+            self.assertLess(recurring.next_run_at, utc_now() + timedelta(hours=1))
+
+            one_off = db.session.get(ScheduledTransfer, one_off_id)
+            self.assertFalse(one_off.active)
+            self.assertEqual(one_off.last_status, "Insufficient balance in USD")
+
+            self.assertEqual(ScheduledTransferService.run_due(), {"executed": 0, "failed": 0})
+
+    def test_cancel(self):
+        response = self.client.post('/user/scheduled-transfers', headers=self.headers, json={
+            "target_user_id": self.ids['landlord'], "amount": 5, "currency": "USD",
+            "interval_seconds": 86400, "start_at": "2999-01-01T00:00:00+00:00"
+        })
+        scheduled_id = response.get_json()['id']
+
+        response = self.client.delete(f'/user/scheduled-transfers/{scheduled_id}', headers=self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.get_json()['active'])
+
+        response = self.client.get('/user/scheduled-transfers', headers=self.headers)
+        listed = {item['id']: item for item in response.get_json()['scheduled_transfers']}
+        self.assertFalse(listed[scheduled_id]['active'])
+
+    def test_rejects_short_interval(self):
+        response = self.client.post('/user/scheduled-transfers', headers=self.headers, json={
+            "target_user_id": self.ids['landlord'], "amount": 5, "currency": "USD",
+            "interval_seconds": 5
+        })
+        self.assertEqual(response.status_code, 400)
+
+
+if __name__ == '__main__':
+    unittest.main()
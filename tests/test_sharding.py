@@ -0,0 +1,257 @@
+import os
+import shutil
+import tempfile
+import unittest
+from datetime import timedelta
+from unittest import mock
+
+from sqlalchemy import func, select
+from sqlalchemy.exc import OperationalError
+
+from app import create_app, db
+from models.user import User
+from models.user_balance import UserBalance
+from models.transaction import Transaction
+from models.posting import Posting
+from models.transfer_saga import TransferSaga
+from models.scheduled_transfer import ScheduledTransfer
+from services.balance_service import BalanceService
+from services.transfer_saga import TransferSagaService, MAX_CREDIT_ATTEMPTS
+from services.scheduled_transfer_service import ScheduledTransferService
+from utils.utils import utc_now
+
+
+class ShardingTestCase(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.mkdtemp()
+        urls = ",".join(f"sqlite:///{os.path.join(cls.directory, f'shard{n}.db')}" for n in range(2))
+        with mock.patch.dict(os.environ, {"SHARD_DATABASE_URLS": urls}):
+            cls.app = create_app('testing')
+        cls.client = cls.app.test_client()
+        with cls.app.app_context():
+            db.create_all()
+            cls.app.extensions['shard_router'].create_schema()
+
+        # Ids 1 and 3 share shard 1, id 2 lives on shard 0
+        cls.headers = {}
+        for name in ("alice", "bob", "carol"):
+            response = cls.client.post('/auth/signup', json={
+                "username": name, "email": f"{name}@example.com", "password": "password123"
+            })
+            assert response.status_code == 201
+            response = cls.client.post('/auth/login', json={
+                "email": f"{name}@example.com", "password": "password123"
+            })
+            cls.headers[name] = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+        response = cls.client.post('/auth/signup', json={
+            "username": "admin", "email": "admin@example.com", "password": "password123"
+        })
+        assert response.status_code == 201
+        with cls.app.app_context():
+            User.query.filter_by(username="admin").update({"is_admin": True})
+            db.session.commit()
+            cls.ids = {user.username: user.id for user in User.query}
+        response = cls.client.post('/auth/login', json={"email": "admin@example.com", "password": "password123"})
+        cls.headers["admin"] = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+        response = cls.client.post('/user/top-up', headers=cls.headers["alice"], json={"amount": 100})
+        assert response.status_code == 200
+
+    @classmethod
+    def tearDownClass(cls):
+        with cls.app.app_context():
+            db.session.remove()
+            db.drop_all()
+        for engine in cls.app.extensions['shard_router'].engines:
+            engine.dispose()
+        shutil.rmtree(cls.directory)
+
+    def shard_rows(self, shard, model, **filters):
+        engine = self.app.extensions['shard_router'].engine(shard)
+        with engine.connect() as connection:
+            return connection.execute(select(func.count()).select_from(model).filter_by(**filters)).scalar()
+
+    def transfer(self, sender, target, amount):
+        return self.client.post('/user/transfer', headers=self.headers[sender], json={
+            "target_user_id": self.ids[target], "amount": amount, "currency": "USD"
+        })
+
+    def balance(self, name):
+        response = self.client.get('/user/profile', headers=self.headers[name])
+        balances = {item["currency"]: item["amount"] for item in response.get_json()["balances"]}
+        return balances.get("USD", 0.0)
+
+    def test_wallets_live_on_the_user_shard(self):
+        with self.app.app_context():
+            shard = self.app.extensions['shard_router'].shard_for(self.ids["alice"])
+            primary_rows = UserBalance.query.count()
+        self.assertEqual(primary_rows, 0)
+        self.assertEqual(self.shard_rows(shard, UserBalance, user_id=self.ids["alice"]), 1)
+        self.assertEqual(self.shard_rows(1 - shard, UserBalance, user_id=self.ids["alice"]), 0)
+
+    def test_same_shard_and_cross_shard_transfers(self):
+        before = {name: self.balance(name) for name in ("alice", "bob", "carol")}
+
+        response = self.transfer("alice", "carol", 10)
+        self.assertEqual(response.status_code, 200)
+        response = self.transfer("alice", "bob", 15)
+        self.assertEqual(response.status_code, 200)
+
+        self.assertEqual(self.balance("alice"), before["alice"] - 25)
+        self.assertEqual(self.balance("bob"), before["bob"] + 15)
+        self.assertEqual(self.balance("carol"), before["carol"] + 10)
+
+        with self.app.app_context():
+            saga = TransferSaga.query.filter_by(target_user_id=self.ids["bob"], amount=15).one()
+            self.assertEqual(saga.state, "completed")
+
+        response = self.client.get('/user/transactions', headers=self.headers["bob"])
+        received = response.get_json()["transactions"][0]
+        self.assertEqual(received["status"], "credited")
+        self.assertEqual(received["received_from"], "alice")
+
+    def test_postings_balance_on_each_shard(self):
+        self.assertEqual(self.transfer("alice", "bob", 1).status_code, 200)
+
+        router = self.app.extensions['shard_router']
+        for shard, engine in enumerate(router.engines):
+            with engine.connect() as connection:
+                totals = connection.execute(
+                    select(Posting.currency, func.sum(Posting.amount)).group_by(Posting.currency)
+                ).all()
+                accounts = set(connection.execute(select(Posting.account).distinct()).scalars())
+            self.assertTrue(all(abs(total) < 1e-9 for _, total in totals), totals)
+            # Users of the other shard only appear through the transit account
+            self.assertIn("transit", accounts)
+            for account in accounts:
+                if account.startswith("user:"):
+                    self.assertEqual(router.shard_for(int(account[len("user:"):])), shard)
+
+    def test_cross_shard_transfer_with_insufficient_balance(self):
+        response = self.transfer("bob", "alice", 10000)
+        self.assertEqual(response.status_code, 400)
+        with self.app.app_context():
+            saga = TransferSaga.query.filter_by(sender_id=self.ids["bob"]).first()
+            self.assertEqual(saga.state, "failed")
+
+    def test_failed_credit_is_refunded(self):
+        before = self.balance("alice")
+        with mock.patch.object(BalanceService, "credit", side_effect=OperationalError("", {}, Exception())):
+            response = self.transfer("alice", "bob", 5)
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(self.balance("alice"), before - 5)
+
+        saga_id = response.get_json()["saga_id"]
+        with self.app.app_context():
+            saga = db.session.get(TransferSaga, saga_id)
+            saga.attempts = MAX_CREDIT_ATTEMPTS
+            saga.updated_at = saga.updated_at - timedelta(hours=1)
+            db.session.commit()
+
+            # The recipient's shard keeps failing, so the saga refunds the sender
+            original_credit = BalanceService.credit
+
+            def credit_sender_only(user, currency, amount):
+                if user.id == self.ids["bob"]:
+                    raise OperationalError("", {}, Exception())
+                return original_credit(user, currency, amount)
+
+            with mock.patch.object(BalanceService, "credit", side_effect=credit_sender_only):
+                self.assertEqual(TransferSagaService.resume(), 1)
+            self.assertEqual(db.session.get(TransferSaga, saga_id).state, "compensated")
+
+        self.assertEqual(self.balance("alice"), before)
+
+    def test_abandoned_pending_saga_is_fenced(self):
+        with self.app.app_context():
+            db.session.add(TransferSaga(
+                id="abandoned", sender_id=self.ids["alice"], target_user_id=self.ids["bob"],
+                amount=1.0, currency="USD", state="pending"
+            ))
+            db.session.commit()
+            saga = db.session.get(TransferSaga, "abandoned")
+            saga.updated_at = saga.updated_at - timedelta(hours=1)
+            db.session.commit()
+
+            TransferSagaService.resume()
+            self.assertEqual(db.session.get(TransferSaga, "abandoned").state, "failed")
+
+    def test_ledger_rows_stay_off_the_primary(self):
+        with self.app.app_context():
+            self.assertEqual(Transaction.query.count(), 0)
+
+    def test_whole_ledger_reports_are_refused(self):
+        for path in ('/admin/stats', '/admin/export/users', '/admin/export/transactions',
+                     '/admin/transactions', '/admin/users?min_balance=1'):
+            response = self.client.get(path, headers=self.headers["admin"])
+            self.assertEqual(response.status_code, 501, path)
+
+    def test_admin_reads_come_from_the_user_shard(self):
+        response = self.client.get('/admin/users', headers=self.headers["admin"])
+        self.assertEqual(response.status_code, 200)
+        alice = next(user for user in response.get_json()["users"] if user["username"] == "alice")
+        balances = {item["currency"]: item["balance"] for item in alice["balances"]}
+        self.assertEqual(balances["USD"], self.balance("alice"))
+
+        response = self.client.get(f'/admin/transactions?user_id={self.ids["alice"]}',
+                                   headers=self.headers["admin"])
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(response.get_json()["total"], 0)
+
+    def test_slots_are_kept_on_the_user_shard(self):
+        admin_id = self.ids["admin"]
+        response = self.client.post('/user/top-up', headers=self.headers["admin"], json={"amount": 20})
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.put(f'/admin/user/{admin_id}/balance-slots',
+                                   headers=self.headers["admin"], json={"slots": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.get_json()["balances"], [{"currency": "USD", "balance": 20.0}])
+        shard = self.app.extensions['shard_router'].shard_for(admin_id)
+        self.assertEqual(self.shard_rows(shard, UserBalance, user_id=admin_id), 3)
+
+        self.client.put(f'/admin/user/{admin_id}/balance-slots',
+                        headers=self.headers["admin"], json={"slots": 1})
+        with self.app.app_context():
+            self.assertEqual(BalanceService.consolidate(admin_id), 1)
+        self.assertEqual(self.shard_rows(shard, UserBalance, user_id=admin_id), 1)
+        self.assertEqual(self.balance("admin"), 20.0)
+
+    def test_scheduled_transfers_are_paid_once_by_concurrent_runners(self):
+        before = {name: self.balance(name) for name in ("alice", "bob")}
+        with self.app.app_context():
+            for _ in range(3):
+                db.session.add(ScheduledTransfer(
+                    user_id=self.ids["alice"], target_user_id=self.ids["bob"], amount=1.0, currency="USD",
+                    next_run_at=utc_now() - timedelta(minutes=1), active=True
+                ))
+            db.session.commit()
+
+        # A second runner starts while the first one is in the middle of its batch
+        original_start = TransferSagaService.start
+        second = []
+
+        def start_with_second_runner(*args):
+            if not second:
+                second.append(None)
+                with self.app.app_context():
+                    second[0] = ScheduledTransferService.run_due()
+            return original_start(*args)
+
+        with self.app.app_context(), \
+                mock.patch.object(TransferSagaService, "start", side_effect=start_with_second_runner):
+            first = ScheduledTransferService.run_due()
+
+        self.assertEqual(first["executed"] + second[0]["executed"], 3)
+        self.assertEqual(self.balance("alice"), before["alice"] - 3)
+        self.assertEqual(self.balance("bob"), before["bob"] + 3)
+        with self.app.app_context():
+            scheduled = ScheduledTransfer.query.filter_by(user_id=self.ids["alice"]).all()
+            self.assertTrue(all(not item.active and item.last_status for item in scheduled))
+
+
+if __name__ == '__main__':
+    unittest.main()
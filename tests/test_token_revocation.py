@@ -0,0 +1,98 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.revoked_token import RevokedToken
+from app import db
+
+
+class TokenRevocationTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            for name, is_admin in (('revadmin', True), ('revuser', False)):
+                user = User(username=name, email=f"{name}@example.com", is_admin=is_admin)
+                user.set_password('password123')
+                db.session.add(user)
+            db.session.commit()
+            cls.user_id = User.query.filter_by(username='revuser').first().id
+
+    def login(self, email, password='password123'):
+        response = self.client.post('/auth/login', json={"email": email, "password": password})
+        return {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_logout_revokes_only_that_token(self):
+        first = self.login('revuser@example.com')
+        second = self.login('revuser@example.com')
+
+        self.assertEqual(self.client.post('/auth/logout', headers=first).status_code, 200)
+        self.assertEqual(self.client.get('/user/profile', headers=first).status_code, 401)
+        self.assertEqual(self.client.get('/user/profile', headers=second).status_code, 200)
+
+    def test_admin_force_logout(self):
+        headers = self.login('revuser@example.com')
+        admin_headers = self.login('revadmin@example.com')
+
+        response = self.client.post(f'/admin/user/{self.user_id}/logout', headers=admin_headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/user/profile', headers=headers).status_code, 401)
+
+        # Tokens issued afterwards are valid
+        headers = self.login('revuser@example.com')
+        self.assertEqual(self.client.get('/user/profile', headers=headers).status_code, 200)
+
+    def test_password_change_revokes_existing_tokens(self):
+        with self.app.app_context():
+            user = User(username='revpass', email='revpass@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.commit()
+
+        headers = self.login('revpass@example.com')
+        response = self.client.post('/auth/change-password', headers=headers, json={
+            "current_password": "password123", "new_password": "newpassword456"
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.client.get('/user/profile', headers=headers).status_code, 401)
+
+        headers = self.login('revpass@example.com', 'newpassword456')
+        self.assertEqual(self.client.get('/user/profile', headers=headers).status_code, 200)
+
+    def test_revocations_of_other_workers_are_synced(self):
+        headers = self.login('revadmin@example.com')
+        revocation = self.app.extensions['token_revocation']
+
+        with self.app.app_context():
+            admin = User.query.filter_by(username='revadmin').first()
+            # Written straight to the table, as another worker would
+            db.session.add(RevokedToken(user_id=admin.id, revoked_before=datetime.now(timezone.utc).replace(tzinfo=None)))
+            db.session.commit()
+            revocation.sync(force=True)
+
+        self.assertEqual(self.client.get('/user/profile', headers=headers).status_code, 401)
+
+    def test_sync_watermark_ignores_the_app_clock(self):
+        revocation = self.app.extensions['token_revocation']
+        ahead = datetime.now(timezone.utc).replace(tzinfo=None) + timedelta(hours=1)
+
+        with self.app.app_context(), mock.patch('services.token_revocation.utc_now', return_value=ahead):
+            user = User(username='revskew', email='revskew@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.commit()
+            # A fresh worker whose clock runs an hour ahead of the database
+            revocation._high_water = None
+            revocation.sync(force=True)
+
+            db.session.add(RevokedToken(jti='skewed-jti', user_id=user.id))
+            db.session.commit()
+            revocation.sync(force=True)
+
+        self.assertTrue(revocation.is_revoked({"jti": "skewed-jti"}))
+
+
+if __name__ == '__main__':
+    unittest.main()
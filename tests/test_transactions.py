@@ -0,0 +1,151 @@
+import unittest
+from sqlalchemy import insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.exc import IntegrityError
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.transaction import Transaction
+from services.ledger_projection import snapshot_options
+from utils.cache import LRUCache
+from app import db
+
+
+class TransactionHistoryTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        with cls.app.app_context():
+            user = User(username='historyuser', email='historyuser@example.com')
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.commit()
+
+        response = cls.client.post('/auth/login', json={
+            "email": "historyuser@example.com", "password": "password123"
+        })
+        cls.headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+        for amount in (10, 20, 30):
+            cls.client.post('/user/top-up', json={"amount": amount}, headers=cls.headers)
+
+    def test_history_pages_keep_running_balances(self):
+        """Cursor pages return newest first with the same balances as the full history"""
+
+        full = self.client.get('/user/transactions', headers=self.headers).get_json()['transactions']
+        self.assertEqual([t['balance'] for t in full], [60, 30, 10])
+
+        first = self.client.get('/user/transactions?limit=2', headers=self.headers).get_json()
+        self.assertEqual([t['balance'] for t in first['transactions']], [60, 30])
+        self.assertIsNotNone(first['next_cursor'])
+
+        second = self.client.get(f"/user/transactions?limit=2&before={first['next_cursor']}",
+                                 headers=self.headers).get_json()
+        self.assertEqual([t['balance'] for t in second['transactions']], [10])
+        self.assertIsNone(second['next_cursor'])
+
+    def login(self, username):
+        with self.app.app_context():
+            user = User(username=username, email=f"{username}@example.com")
+            user.set_password('password123')
+            db.session.add(user)
+            db.session.commit()
+            user_id = user.id
+
+        response = self.client.post('/auth/login', json={
+            "email": f"{username}@example.com", "password": "password123"
+        })
+        return user_id, {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def test_cached_history_is_invalidated_by_incoming_transfer(self):
+        cache = self.app.extensions['history_cache'].pages
+        receiver_id, receiver_headers = self.login('cachereceiver')
+        _, sender_headers = self.login('cachesender')
+
+        self.client.get('/user/transactions?limit=5', headers=receiver_headers)
+        hits = cache.hits
+        self.client.get('/user/transactions?limit=5', headers=receiver_headers)
+        self.assertEqual(cache.hits, hits + 1)
+
+        self.client.post('/user/top-up', json={"amount": 5}, headers=sender_headers)
+        self.client.post('/user/transfer', headers=sender_headers, json={
+            "target_user_id": receiver_id, "amount": 5, "currency": "USD"
+        })
+
+        page = self.client.get('/user/transactions?limit=5', headers=receiver_headers).get_json()
+        self.assertEqual(page['transactions'][0]['status'], "credited")
+
+    def test_admin_history_keeps_balances_of_every_currency_across_pages(self):
+        user_id, _ = self.login('ledgeruser')
+        with self.app.app_context():
+            admin = User(username='ledgeradmin', email='ledgeradmin@example.com', is_admin=True)
+            admin.set_password('password123')
+            db.session.add(admin)
+            db.session.add(Transaction(user_id=user_id, type="top_up", amount=100, currency="GBP",
+                                       currency_symbol="£"))
+            db.session.add(Transaction(user_id=user_id, type="exchange", amount=40, currency="GBP",
+                                       currency_symbol="£", currency_from="GBP", currency_to="JPY",
+                                       converted_amount=7000))
+            db.session.add(Transaction(user_id=user_id, type="top_up", amount=5, currency="GBP",
+                                       currency_symbol="£"))
+            db.session.commit()
+
+        response = self.client.post('/auth/login', json={
+            "email": "ledgeradmin@example.com", "password": "password123"
+        })
+        admin_headers = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+        pages = [
+            self.client.get(f'/admin/transactions?user_id={user_id}&page={page}&page_size=2',
+                            headers=admin_headers).get_json()
+            for page in (1, 2)
+        ]
+        self.assertEqual([p['pages'] for p in pages], [2, 2])
+        self.assertEqual([t['balance'] for t in pages[1]['transactions']], [65])
+        self.assertEqual([t['balance'] for t in pages[0]['transactions']], [7000, 100])
+
+        # Three pages of one row: the first is read oldest first, the last newest first
+        pages = [
+            self.client.get(f'/admin/transactions?user_id={user_id}&page={page}&page_size=1',
+                            headers=admin_headers).get_json()['transactions']
+            for page in (1, 2, 3)
+        ]
+        self.assertEqual([t['balance'] for page in pages for t in page], [100, 7000, 65])
+
+        # The whole ledger has no running balance
+        everyone = self.client.get('/admin/transactions', headers=admin_headers).get_json()
+        self.assertTrue(everyone['transactions'])
+        self.assertTrue(all(t['balance'] is None for t in everyone['transactions']))
+
+        full = self.client.get('/user/transactions', headers=self.login('ledgerreader')[1])
+        self.assertEqual(full.get_json(), {"transactions": []})
+
+    def test_cache_forgets_generations_of_old_groups(self):
+        cache = LRUCache(maxsize=2)
+        pending = cache.generation("a")
+        for group in ("a", "b", "c", "d"):
+            cache.invalidate_group(group)
+        self.assertEqual(cache.stats()["generations"], 2)
+
+        # "a" was forgotten, but a value built before its invalidation is still refused
+        cache.set("page", "stale", group="a", generation=pending)
+        self.assertIsNone(cache.get("page"))
+        cache.set("page", "fresh", group="a", generation=cache.generation("a"))
+        self.assertEqual(cache.get("page"), "fresh")
+
+    def test_colliding_ledger_positions_fail(self):
+        """Without sequences seq is numbered per process, a second process must not reuse a number"""
+        user_id, _ = self.login('sequser')
+        with self.app.app_context():
+            taken = db.session.get(Transaction, 1).seq
+            with self.assertRaises(IntegrityError):
+                db.session.execute(insert(Transaction).values(
+                    seq=taken, user_id=user_id, type="top_up", amount=1.0, currency="USD", currency_symbol="$"
+                ))
+            db.session.rollback()
+
+    def test_history_reads_share_a_snapshot_where_seq_is_not_commit_order(self):
+        self.assertEqual(snapshot_options(postgresql.dialect()), {"isolation_level": "REPEATABLE READ"})
+        self.assertEqual(snapshot_options(sqlite.dialect()), {})
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,142 @@
+import unittest
+from datetime import timedelta
+from tests.base_test import BaseTestCase
+from models.user import User
+from models.user_balance import UserBalance
+from models.transaction import Transaction
+from models.scheduled_transfer import ScheduledTransfer
+from services.scheduled_transfer_service import ScheduledTransferService
+from services.velocity import within_velocity_limits
+from utils.utils import utc_now
+from app import db
+
+
+class VelocityLimitTestCase(BaseTestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.app.config['VELOCITY_LIMITS'] = {
+            "transfer": {"count": 3, "amount": 100.0},
+            "exchange": {"count": 2, "amount": None},
+        }
+        cls.limiter = cls.app.extensions['velocity_limiter']
+        cls.limiter.limits = cls.app.config['VELOCITY_LIMITS']
+
+        with cls.app.app_context():
+            for name in ("fast", "slow", "target"):
+                user = User(username=name, email=f"{name}@example.com")
+                user.set_password('password123')
+                user.balances.append(UserBalance(currency="USD", balance=1000.0))
+                db.session.add(user)
+            db.session.commit()
+            cls.target_id = User.query.filter_by(username="target").first().id
+            cls.slow_id = User.query.filter_by(username="slow").first().id
+
+            # Two transfers of the last hour that were made before this worker started
+            for minutes in (5, 30):
+                db.session.add(Transaction(
+                    user_id=cls.slow_id, type="transfer", amount=10.0, currency="USD",
+                    target_user_id=cls.target_id, currency_symbol="$",
+                    created_at=utc_now() - timedelta(minutes=minutes)
+                ))
+            db.session.add(Transaction(
+                user_id=cls.slow_id, type="transfer", amount=10.0, currency="USD",
+                target_user_id=cls.target_id, currency_symbol="$",
+                created_at=utc_now() - timedelta(hours=2)
+            ))
+            db.session.commit()
+
+        cls.headers = {}
+        for name in ("fast", "slow"):
+            response = cls.client.post('/auth/login', json={
+                "email": f"{name}@example.com", "password": "password123"
+            })
+            cls.headers[name] = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+    def transfer(self, name, amount):
+        return self.client.post('/user/transfer', headers=self.headers[name], json={
+            "target_user_id": self.target_id, "amount": amount, "currency": "USD"
+        })
+
+    def test_count_limit(self):
+        for _ in range(3):
+            self.assertEqual(self.transfer("fast", 1).status_code, 200)
+
+        response = self.transfer("fast", 1)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Limit of 3 transfers per hour", response.get_json()['message'])
+
+    def test_counters_rebuilt_from_ledger(self):
+        # The two transfers within the window count, the one from two hours ago does not
+        self.assertEqual(self.transfer("slow", 1).status_code, 200)
+        self.assertEqual(self.transfer("slow", 1).status_code, 429)
+
+    def test_amount_limit_and_release_on_failure(self):
+        with self.app.app_context():
+            user = User(username="big", email="big@example.com")
+            user.set_password('password123')
+            user.balances.append(UserBalance(currency="USD", balance=60.0))
+            db.session.add(user)
+            db.session.commit()
+        response = self.client.post('/auth/login', json={
+            "email": "big@example.com", "password": "password123"
+        })
+        self.headers["big"] = {"Authorization": f"Bearer {response.get_json()['access_token']}"}
+
+        # Insufficient balance: nothing is counted against the limits
+        self.assertEqual(self.transfer("big", 80).status_code, 400)
+        self.assertEqual(self.transfer("big", 60).status_code, 200)
+
+        response = self.transfer("big", 41)
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("100.00 USD", response.get_json()['message'])
+
+    def test_accepted_operations_count(self):
+        with self.app.app_context():
+            user_id = User.query.filter_by(username="target").first().id
+            # A deferred cross-shard transfer answers 202 after the debit committed
+            for _ in range(3):
+                result, status_code = within_velocity_limits(
+                    user_id, "transfer", "EUR", 1.0, lambda: ({"message": "Transfer accepted"}, 202)
+                )
+                self.assertEqual(status_code, 202)
+            result, status_code = within_velocity_limits(
+                user_id, "transfer", "EUR", 1.0, lambda: ({"message": "Transfer accepted"}, 202)
+            )
+            self.assertEqual(status_code, 429)
+
+    def test_scheduled_transfers_are_limited(self):
+        with self.app.app_context():
+            user = User(username="scheduler", email="scheduler@example.com")
+            user.set_password('password123')
+            user.balances.append(UserBalance(currency="USD", balance=1000.0))
+            db.session.add(user)
+            db.session.commit()
+            for _ in range(4):
+                db.session.add(ScheduledTransfer(
+                    user_id=user.id, target_user_id=self.target_id, amount=1.0, currency="USD",
+                    next_run_at=utc_now() - timedelta(minutes=1), active=True
+                ))
+            db.session.commit()
+
+            result = ScheduledTransferService.run_due()
+            self.assertEqual(result, {"executed": 3, "failed": 1})
+            statuses = [item.last_status for item in ScheduledTransfer.query.filter_by(user_id=user.id)]
+            self.assertEqual(sum("Limit of 3 transfers" in status for status in statuses), 1)
+
+    def test_exchange_limit(self):
+        for _ in range(2):
+            response = self.client.post('/user/exchange', headers=self.headers["fast"], json={
+                "amount": 1, "currency_from": "USD", "currency_to": "EUR"
+            })
+            self.assertEqual(response.status_code, 200)
+
+        response = self.client.post('/user/exchange', headers=self.headers["fast"], json={
+            "amount": 1, "currency_from": "USD", "currency_to": "EUR"
+        })
+        self.assertEqual(response.status_code, 429)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,168 @@
+import math
+import threading
+import time
+
+from flask import current_app, g, jsonify, request
+from flask_jwt_extended import decode_token
+
+# (tokens per second, burst) per endpoint, for the caller's user id and/or IP address
+DEFAULT_RATE_LIMITS = {
+    "auth.login": {"ip": (1, 10)},
+    "auth.signup": {"ip": (0.2, 5)},
+    "transaction.transfer": {"user": (5, 20), "ip": (20, 100)},
+    "transaction.top_up": {"user": (2, 10), "ip": (20, 100)},
+    "exchange.exchange_currency": {"user": (5, 20), "ip": (20, 100)},
+    "exchange.exchange_quote": {"user": (5, 20), "ip": (20, 100)},
+    "scheduled_transfer.create_scheduled_transfer": {"user": (1, 10), "ip": (20, 100)},
+}
+
+TOO_MANY_REQUESTS = {"message": "Too many requests, please retry later"}
+
+# Endpoints that share the per-worker concurrency cap
+DEFAULT_EXPENSIVE_ENDPOINTS = (
+    "transaction.get_transactions",
+    "admin.get_all_users",
+    "admin.get_all_transactions_by_id",
+    "admin.get_stats",
+    "admin.export_users",
+    "admin.export_transactions",
+)
+
+
+class InMemoryBucketStore:
+    """Token buckets of the current process.
+
+    A shared store only needs the same ``take`` method, e.g. a Redis script
+    applying the same refill arithmetic, so that all workers draw from one bucket.
+    """
+
+    def __init__(self, max_keys=100000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst):
+        """Take one token. Returns 0 if it was available, else seconds until it will be."""
+        now = self.clock()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (burst, now))
+            tokens = min(burst, tokens + (now - updated) * rate)
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                wait = 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                wait = (1 - tokens) / rate
+            if len(self._buckets) > self.max_keys:
+                self._prune(now)
+        return wait
+
+    def _prune(self, now):
+        # Buckets idle long enough to have refilled carry no state worth keeping
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if now - updated < 60
+        }
+
+
+class AdmissionControl:
+    """Rejects requests with 429 before the view runs.
+
+    Token buckets per user and per IP address limit how often a caller may hit
+    the endpoints in ``RATE_LIMITS``, and a semaphore caps how many requests to
+    ``EXPENSIVE_ENDPOINTS`` run at once in this worker. The user is taken from the
+    access token without touching the database: it is decoded, but the
+    blocklist is left to the view. Anonymous callers are told apart by their
+    address, which is the proxy's unless ``PROXY_FIX_X_FOR`` is set.
+    """
+
+    def __init__(self, app=None, store=None):
+        self.store = store
+        self._slots = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("ADMISSION_CONTROL_ENABLED", True)
+        app.config.setdefault("RATE_LIMITS", DEFAULT_RATE_LIMITS)
+        app.config.setdefault("EXPENSIVE_ENDPOINTS", DEFAULT_EXPENSIVE_ENDPOINTS)
+        app.config.setdefault("MAX_CONCURRENT_EXPENSIVE", 8)
+
+        if self.store is None:
+            self.store = InMemoryBucketStore()
+        self.limits = app.config["RATE_LIMITS"]
+        self.expensive_endpoints = frozenset(app.config["EXPENSIVE_ENDPOINTS"])
+        self._slots = threading.BoundedSemaphore(app.config["MAX_CONCURRENT_EXPENSIVE"])
+        app.extensions["admission_control"] = self
+
+        if app.config["ADMISSION_CONTROL_ENABLED"]:
+            app.before_request(self._admit)
+            app.teardown_request(self._release)
+
+    def wait(self, endpoint, address, identity):
+        """Seconds until the caller's bucket for the endpoint allows a request, 0 if it does now.
+
+        Callers with an access token draw from their user bucket; the address
+        bucket is for anonymous callers, since behind a proxy many users share
+        one address (see ``PROXY_FIX_X_FOR``).
+        """
+        limits = self.limits.get(endpoint)
+        if not limits:
+            return 0.0
+        if identity is not None:
+            if "user" not in limits:
+                return 0.0
+            return self.store.take(f"user:{endpoint}:{identity}", *limits["user"])
+        if "ip" not in limits:
+            return 0.0
+        return self.store.take(f"ip:{endpoint}:{address}", *limits["ip"])
+
+    def acquire(self, endpoint):
+        """Take a concurrency slot if the endpoint needs one. False when all are taken."""
+        if endpoint not in self.expensive_endpoints:
+            return True
+        return self._slots.acquire(blocking=False)
+
+    def release(self, endpoint):
+        if endpoint in self.expensive_endpoints:
+            self._slots.release()
+
+    def _admit(self):
+        identity = _token_identity() if request.endpoint in self.limits else None
+        wait = self.wait(request.endpoint, request.remote_addr, identity)
+        if wait > 0:
+            return _too_many_requests(wait)
+
+        if not self.acquire(request.endpoint):
+            return _too_many_requests(1)
+        g._admission_slot = request.endpoint
+
+    def _release(self, exc):
+        endpoint = g.pop("_admission_slot", None)
+        if endpoint is not None:
+            self.release(endpoint)
+
+
+def _token_identity():
+    parts = request.headers.get("Authorization", "").split()
+    if len(parts) != 2 or parts[0] != "Bearer":
+        return None
+    try:
+        payload = decode_token(parts[1])
+    except Exception:
+        # The view rejects invalid tokens itself
+        return None
+    return payload.get(current_app.config["JWT_IDENTITY_CLAIM"])
+
+
+def retry_after(wait):
+    """The Retry-After header value of a 429 response."""
+    return str(max(1, math.ceil(wait)))
+
+
+def _too_many_requests(wait):
+    response = jsonify(TOO_MANY_REQUESTS)
+    response.status_code = 429
+    response.headers["Retry-After"] = retry_after(wait)
+    return response
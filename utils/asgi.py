@@ -0,0 +1,203 @@
+import asyncio
+import json
+from urllib.parse import parse_qs
+
+from asgiref.wsgi import WsgiToAsgi
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError, InvalidTokenError
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from services.async_read_service import AsyncReadService
+from utils.admission import TOO_MANY_REQUESTS, retry_after
+from utils.events import is_stream_token
+
+# Async drivers for the backends the sync engine may use
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url):
+    """The URL of the same database for its async driver."""
+    url = make_url(url)
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()]).render_as_string(hide_password=False)
+
+
+class AsyncReadApp:
+    """ASGI entry point serving the read-heavy endpoints without pinning a worker.
+
+    ``GET /user/profile`` and ``GET /user/transactions`` run as coroutines on
+    an async engine, so one process can keep many reads waiting on the database
+    at once. Every other request, including all writes, is handed to the Flask
+    app unchanged through a WSGI adapter. The async path checks the access
+    token and its revocation like ``jwt_required`` does, applies the admission
+    control buckets and concurrency cap under the endpoint names of the Flask
+    views, and uses the same history cache, but skips the other Flask hooks
+    (profiling, replica routing). With shards configured everything goes to the
+    Flask app, the async path only knows the primary.
+    """
+
+    def __init__(self, flask_app):
+        flask_app.config.setdefault("ASYNC_DATABASE_URL", None)
+        flask_app.config.setdefault("ASYNC_ENGINE_OPTIONS", {})
+
+        self.flask_app = flask_app
+        self.wsgi = WsgiToAsgi(flask_app)
+        self.engine = None
+        self.routes = {}
+
+        if "shard_router" not in flask_app.extensions:
+            url = flask_app.config["ASYNC_DATABASE_URL"] or async_database_url(
+                flask_app.config["SQLALCHEMY_DATABASE_URI"]
+            )
+            self.engine = create_async_engine(url, **flask_app.config["ASYNC_ENGINE_OPTIONS"])
+            self.sessions = async_sessionmaker(self.engine, expire_on_commit=False)
+            # Path -> (endpoint of the Flask view, handler)
+            self.routes = {
+                "/user/profile": ("user.get_profile", self._profile),
+                "/user/transactions": ("transaction.get_transactions", self._transactions),
+            }
+        flask_app.extensions["async_reads"] = self
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        route = None
+        if scope["type"] == "http" and scope["method"] == "GET":
+            route = self.routes.get(scope["path"])
+        if route is None:
+            await self.wsgi(scope, receive, send)
+            return
+
+        endpoint, handler = route
+        headers = {name.decode("latin-1"): value.decode("latin-1") for name, value in scope["headers"]}
+        origin = headers.get("origin")
+        identity, error = await self._authenticate(headers)
+        if error:
+            body, status = error
+            await self._respond(send, status, body, origin)
+            return
+
+        admission = None
+        if self.flask_app.config["ADMISSION_CONTROL_ENABLED"]:
+            admission = self.flask_app.extensions.get("admission_control")
+        if admission is not None:
+            address = scope["client"][0] if scope.get("client") else None
+            wait = admission.wait(endpoint, address, identity)
+            if wait > 0:
+                await self._respond(send, 429, TOO_MANY_REQUESTS, origin, wait)
+                return
+            if not admission.acquire(endpoint):
+                await self._respond(send, 429, TOO_MANY_REQUESTS, origin, 1)
+                return
+
+        try:
+            query = parse_qs(scope["query_string"].decode("latin-1"))
+            async with self.sessions() as session:
+                body, status = await handler(session, identity, query)
+                # A streamed body still reads from the session
+                await self._respond(send, status, body, origin)
+        finally:
+            if admission is not None:
+                admission.release(endpoint)
+
+    async def _profile(self, session, identity, query):
+        return await AsyncReadService.profile(session, identity)
+
+    async def _transactions(self, session, identity, query):
+        return await AsyncReadService.transactions(
+            session, identity,
+            limit=_int_arg(query, "limit"),
+            before=_int_arg(query, "before"),
+            cache=self.flask_app.extensions.get("history_cache")
+        )
+
+    async def _authenticate(self, headers):
+        """The user id of the bearer token, or an error response as Flask-JWT-Extended sends it."""
+        payload, error = self._decode(headers)
+        if error:
+            return None, error
+
+        revocation = self.flask_app.extensions.get("token_revocation")
+        if revocation is not None:
+            if revocation.sync_due():
+                # The sync reads the revoked_token table, keep it off the event loop
+                await asyncio.to_thread(self._sync_revocations, revocation)
+            if revocation.is_listed(payload):
+                return None, ({"msg": "Token has been revoked"}, 401)
+
+        return payload[self.flask_app.config["JWT_IDENTITY_CLAIM"]], None
+
+    def _decode(self, headers):
+        authorization = headers.get("authorization")
+        if not authorization:
+            return None, ({"msg": "Missing Authorization Header"}, 401)
+
+        parts = authorization.split()
+        if len(parts) != 2 or parts[0] != "Bearer":
+            return None, ({"msg": "Bad Authorization header. Expected 'Authorization: Bearer <JWT>'"}, 422)
+
+        with self.flask_app.app_context():
+            try:
+                payload = decode_token(parts[1])
+            except ExpiredSignatureError:
+                return None, ({"msg": "Token has expired"}, 401)
+            except InvalidTokenError as error:
+                return None, ({"msg": str(error)}, 422)
+
+        if payload.get("type") != "access":
+            return None, ({"msg": "Only non-refresh tokens are allowed"}, 422)
+        if is_stream_token(payload):
+            # As the claims check of the Flask app answers
+            return None, ({"msg": "User claims verification failed"}, 400)
+        return payload, None
+
+    def _sync_revocations(self, revocation):
+        with self.flask_app.app_context():
+            revocation.sync()
+
+    async def _respond(self, send, status, body, origin, wait=None):
+        """Send ``body`` as JSON, or as a chunked body if it is an async iterator of JSON text."""
+        streamed = hasattr(body, "__aiter__")
+        headers = [(b"content-type", b"application/json")]
+        if not streamed:
+            payload = json.dumps(body).encode()
+            headers.append((b"content-length", str(len(payload)).encode()))
+        if wait is not None:
+            headers.append((b"retry-after", retry_after(wait).encode()))
+        # The same headers Flask-CORS adds with its default settings
+        if origin:
+            headers += [(b"access-control-allow-origin", origin.encode("latin-1")), (b"vary", b"Origin")]
+        else:
+            headers.append((b"access-control-allow-origin", b"*"))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        if not streamed:
+            await send({"type": "http.response.body", "body": payload})
+            return
+        async for chunk in body:
+            await send({"type": "http.response.body", "body": chunk.encode(), "more_body": True})
+        await send({"type": "http.response.body", "body": b""})
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                if self.engine is not None:
+                    await self.engine.dispose()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+
+def _int_arg(query, name):
+    # Like request.args.get(name, type=int): missing or invalid values are None
+    try:
+        return int(query[name][0])
+    except (KeyError, ValueError):
+        return None
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache with a time-to-live, for serialized responses.
+
+    Entries can belong to a group (e.g. a user id) so that all of them are
+    invalidated at once. Each invalidation bumps the group's generation; pass the
+    generation read before building a value to ``set`` and the value is dropped
+    if the group was invalidated in the meantime.
+
+    Generations come from one counter and only the ``maxsize`` most recently
+    invalidated groups keep their own; the others share the floor, the newest
+    generation forgotten so far. A forgotten group thus never goes back to a
+    generation a pending ``set`` could still hold.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._groups = {}
+        self._generations = OrderedDict()
+        self._last_generation = 0
+        self._generation_floor = 0
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] < now:
+                if entry is not None:
+                    self._remove(key)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def set(self, key, value, group=None, generation=None):
+        with self._lock:
+            if generation is not None and self._generation(group) != generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.monotonic() + self.ttl, group)
+            if group is not None:
+                self._groups.setdefault(group, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def generation(self, group):
+        with self._lock:
+            return self._generation(group)
+
+    def invalidate_group(self, group):
+        with self._lock:
+            self._last_generation += 1
+            self._generations[group] = self._last_generation
+            self._generations.move_to_end(group)
+            while len(self._generations) > self.maxsize:
+                _, forgotten = self._generations.popitem(last=False)
+                self._generation_floor = forgotten
+            for key in self._groups.pop(group, ()):
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._groups.clear()
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "generations": len(self._generations),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None
+        }
+
+    def _generation(self, group):
+        return self._generations.get(group, self._generation_floor)
+
+    def _remove(self, key):
+        _, _, group = self._entries.pop(key)
+        if group is not None:
+            keys = self._groups.get(group)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._groups[group]
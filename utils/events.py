@@ -0,0 +1,227 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Claim restricting the short-lived access tokens of POST /user/events/token to
+# opening an event stream; every other consumer of access tokens refuses them
+STREAM_TOKEN_CLAIM = "scope"
+STREAM_TOKEN_SCOPE = "events"
+
+
+def is_stream_token(jwt_data):
+    return jwt_data.get(STREAM_TOKEN_CLAIM) == STREAM_TOKEN_SCOPE
+
+
+class InProcessBroker:
+    """Delivers events to the subscribers of the current process only."""
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, user_id, event):
+        self._deliver(user_id, event)
+
+
+class SpoolFileBroker:
+    """Local stand-in for a message broker shared by the workers of one host.
+
+    Every worker appends events to the same file and tails it from a background
+    thread, so an event published by one worker reaches subscribers in all of them.
+    """
+
+    def __init__(self, path, poll_interval=0.2, max_bytes=16 * 1024 * 1024):
+        self.path = path
+        self.poll_interval = poll_interval
+        self.max_bytes = max_bytes
+
+    def start(self, deliver):
+        self._deliver = deliver
+        open(self.path, "a").close()
+        self._offset = os.path.getsize(self.path)
+        threading.Thread(target=self._tail, name="event-spool", daemon=True).start()
+
+    def publish(self, user_id, event):
+        line = json.dumps({"user_id": str(user_id), "event": event}) + "\n"
+        fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        try:
+            if os.fstat(fd).st_size > self.max_bytes:
+                os.ftruncate(fd, 0)
+            os.write(fd, line.encode())
+        finally:
+            os.close(fd)
+
+    def _tail(self):
+        while True:
+            time.sleep(self.poll_interval)
+            try:
+                self._read_new_lines()
+            except OSError:
+                logger.warning("Could not read event spool %s", self.path, exc_info=True)
+
+    def _read_new_lines(self):
+        if os.path.getsize(self.path) < self._offset:
+            # The file was truncated by a publisher
+            self._offset = 0
+
+        with open(self.path, "rb") as spool:
+            spool.seek(self._offset)
+            data = spool.read()
+
+        # Leave a partially written last line for the next poll
+        complete = data[:data.rfind(b"\n") + 1]
+        self._offset += len(complete)
+        for line in complete.splitlines():
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            self._deliver(message["user_id"], message["event"])
+
+
+class EventHub:
+    """Fans balance and transaction events out to the open streams of each user.
+
+    Every open stream holds a worker thread, so a worker serves at most
+    ``EVENT_MAX_STREAMS`` streams and a user at most ``EVENT_MAX_STREAMS_PER_USER``
+    of them; ``subscribe`` returns None beyond that.
+    """
+
+    def __init__(self, app=None):
+        self._subscribers = {}
+        self._count = 0
+        self._lock = threading.Lock()
+        self.broker = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("EVENT_BROKER", "memory")
+        app.config.setdefault("EVENT_SPOOL_PATH", "/tmp/goldenia-events.log")
+        app.config.setdefault("EVENT_QUEUE_SIZE", 100)
+        app.config.setdefault("EVENT_KEEPALIVE_SECONDS", 15)
+        app.config.setdefault("EVENT_MAX_STREAMS", 100)
+        app.config.setdefault("EVENT_MAX_STREAMS_PER_USER", 3)
+        app.config.setdefault("EVENT_STREAM_TOKEN_SECONDS", 60)
+
+        if app.config["EVENT_BROKER"] == "spool":
+            self.broker = SpoolFileBroker(app.config["EVENT_SPOOL_PATH"])
+        else:
+            self.broker = InProcessBroker()
+        self.broker.start(self._deliver)
+        self.queue_size = app.config["EVENT_QUEUE_SIZE"]
+        self.max_streams = app.config["EVENT_MAX_STREAMS"]
+        self.max_streams_per_user = app.config["EVENT_MAX_STREAMS_PER_USER"]
+        app.extensions["event_hub"] = self
+
+    def subscribe(self, user_id):
+        """A new subscription, or None when the worker or the user has too many streams open."""
+        subscription = Subscription(self, str(user_id), self.queue_size)
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.key, set())
+            if self._count >= self.max_streams or len(subscriptions) >= self.max_streams_per_user:
+                return None
+            self._subscribers.setdefault(subscription.key, subscriptions).add(subscription)
+            self._count += 1
+        return subscription
+
+    def _unsubscribe(self, subscription):
+        with self._lock:
+            subscriptions = self._subscribers.get(subscription.key, set())
+            if subscription in subscriptions:
+                subscriptions.discard(subscription)
+                self._count -= 1
+            if not subscriptions:
+                self._subscribers.pop(subscription.key, None)
+
+    def publish(self, user_id, event):
+        try:
+            self.broker.publish(user_id, event)
+        except Exception:
+            # Notifications are best effort, the ledger write already committed
+            logger.exception("Could not publish event for user %s", user_id)
+
+    def _deliver(self, user_id, event):
+        with self._lock:
+            subscriptions = list(self._subscribers.get(str(user_id), ()))
+        for subscription in subscriptions:
+            subscription.put(event)
+
+
+class Subscription:
+    """Queue of pending events for one open stream, closed when the client goes away."""
+
+    def __init__(self, hub, key, maxsize):
+        self.hub = hub
+        self.key = key
+        self._events = queue.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        try:
+            self._events.put_nowait(event)
+        except queue.Full:
+            # A slow client missed events, tell it to reload its state instead
+            self._drain()
+            try:
+                self._events.put_nowait({"type": "resync"})
+            except queue.Full:
+                pass
+
+    def get(self, timeout=None):
+        """Next event, or None when nothing arrived within ``timeout`` seconds."""
+        try:
+            return self._events.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        self.hub._unsubscribe(self)
+
+    def _drain(self):
+        try:
+            while True:
+                self._events.get_nowait()
+        except queue.Empty:
+            pass
+
+
+def transaction_event(transaction, status, balances):
+    """Build the event for a flushed transaction, before the commit expires it."""
+    return {
+        "type": "transaction",
+        "transaction": {
+            "id": transaction.id,
+            "type": transaction.type,
+            "amount": round(transaction.amount, 2),
+            "currency": transaction.currency,
+            "currency_from": transaction.currency_from,
+            "currency_to": transaction.currency_to,
+            "converted_amount": round(transaction.converted_amount, 2) if transaction.converted_amount else None,
+            "target_user_id": transaction.target_user_id,
+            "status": status,
+            "timestamp": transaction.created_at.isoformat()
+        },
+        "balances": [
+            {
+                "currency": balance.currency,
+                "amount": round(balance.balance, 2)
+            }
+            for balance in balances
+        ]
+    }
+
+
+def publish_events(events):
+    """Publish (user_id, event) pairs once the transaction that produced them committed."""
+    hub = current_app.extensions.get("event_hub")
+    if hub is None:
+        return
+
+    for user_id, event in events:
+        hub.publish(user_id, event)
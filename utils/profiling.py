@@ -0,0 +1,205 @@
+import cProfile
+import heapq
+import pstats
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+from flask import g, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from models.user import db, User
+
+
+class RequestProfiler:
+    """Profiles single requests on demand for admins.
+
+    A request carrying the ``PROFILE_HEADER`` header and an admin's access token
+    runs under cProfile, and every SQL statement it executes is timed. The
+    result is kept in a bounded in-memory store and its id is returned in the
+    ``X-Profile-Id`` response header; of its statements only the
+    ``PROFILE_MAX_STATEMENTS`` slowest are kept, the others only count in the
+    totals. A streamed response is profiled until its body was sent. Requests without the header only pay for the header lookup: the
+    SQL timing listeners are registered while at least one profiled request is
+    running and removed afterwards.
+    """
+
+    def __init__(self, app=None):
+        self._profiles = OrderedDict()
+        self._active = {}
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("PROFILING_ENABLED", True)
+        app.config.setdefault("PROFILE_HEADER", "X-Profile")
+        app.config.setdefault("PROFILE_STORE_SIZE", 50)
+        app.config.setdefault("PROFILE_TOP_FUNCTIONS", 30)
+        app.config.setdefault("PROFILE_MAX_STATEMENTS", 100)
+
+        self.header = app.config["PROFILE_HEADER"]
+        self.store_size = app.config["PROFILE_STORE_SIZE"]
+        self.top_functions = app.config["PROFILE_TOP_FUNCTIONS"]
+        self.max_statements = app.config["PROFILE_MAX_STATEMENTS"]
+        app.extensions["request_profiler"] = self
+
+        if app.config["PROFILING_ENABLED"]:
+            app.before_request(self._start)
+            app.after_request(self._finish)
+            app.teardown_request(self._abandon)
+
+    def get(self, profile_id):
+        with self._lock:
+            return self._profiles.get(profile_id)
+
+    def summaries(self):
+        """Summaries of the stored profiles, newest first."""
+        with self._lock:
+            profiles = list(self._profiles.values())
+        return [
+            {key: profile[key] for key in ("id", "method", "path", "endpoint", "status",
+                                           "started_at", "duration_ms", "sql_count", "sql_ms")}
+            for profile in reversed(profiles)
+        ]
+
+    def _start(self):
+        if self.header not in request.headers or not _is_admin():
+            return
+
+        state = {
+            "id": uuid.uuid4().hex,
+            # Kept here, a streamed body may outlive the request context
+            "method": request.method,
+            "path": request.full_path.rstrip("?"),
+            "endpoint": request.endpoint,
+            "profiler": cProfile.Profile(),
+            # Min-heap of (duration, position, statement), the fastest one is dropped first
+            "statements": [],
+            "sql_count": 0,
+            "sql_seconds": 0.0,
+            "pending": [],
+            "started_at": datetime.now(timezone.utc),
+            "wall_start": time.perf_counter(),
+        }
+        self._activate(state)
+        g._profile = state
+        state["profiler"].enable()
+
+    def _finish(self, response):
+        state = g.pop("_profile", None)
+        if state is None:
+            return response
+
+        response.headers["X-Profile-Id"] = state["id"]
+        if response.is_streamed:
+            # The body is generated after this hook, it ends when the server closes the response
+            status = response.status_code
+            response.call_on_close(lambda: self._complete(state, status))
+        else:
+            self._complete(state, response.status_code)
+        return response
+
+    def _complete(self, state, status):
+        state["profiler"].disable()
+        duration = time.perf_counter() - state["wall_start"]
+        self._deactivate(state)
+
+        profile = self._build_profile(state, status, duration)
+        with self._lock:
+            self._profiles[profile["id"]] = profile
+            while len(self._profiles) > self.store_size:
+                self._profiles.popitem(last=False)
+
+    def _abandon(self, exc):
+        # The request failed before after_request ran
+        state = g.pop("_profile", None)
+        if state is not None:
+            state["profiler"].disable()
+            self._deactivate(state)
+
+    def _activate(self, state):
+        with self._lock:
+            if not self._active:
+                event.listen(Engine, "before_cursor_execute", self._before_cursor_execute)
+                event.listen(Engine, "after_cursor_execute", self._after_cursor_execute)
+            state["thread"] = threading.get_ident()
+            self._active[state["thread"]] = state
+
+    def _deactivate(self, state):
+        with self._lock:
+            self._active.pop(state["thread"], None)
+            if not self._active:
+                event.remove(Engine, "before_cursor_execute", self._before_cursor_execute)
+                event.remove(Engine, "after_cursor_execute", self._after_cursor_execute)
+
+    def _before_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        state = self._active.get(threading.get_ident())
+        if state is not None:
+            state["pending"].append(time.perf_counter())
+
+    def _after_cursor_execute(self, conn, cursor, statement, parameters, context, executemany):
+        state = self._active.get(threading.get_ident())
+        if state is not None and state["pending"]:
+            elapsed = time.perf_counter() - state["pending"].pop()
+            state["sql_count"] += 1
+            state["sql_seconds"] += elapsed
+            kept = state["statements"]
+            if len(kept) >= self.max_statements and (not kept or elapsed <= kept[0][0]):
+                return
+            entry = (elapsed, state["sql_count"], {
+                "statement": statement,
+                "duration_ms": round(elapsed * 1000, 3),
+                "bind": conn.engine.url.render_as_string(hide_password=True),
+            })
+            if len(kept) < self.max_statements:
+                heapq.heappush(kept, entry)
+            else:
+                heapq.heapreplace(kept, entry)
+
+    def _build_profile(self, state, status, duration):
+        stats = pstats.Stats(state["profiler"])
+        functions = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in stats.stats.items():
+            functions.append({
+                "function": f"{filename}:{line}({name})",
+                "calls": calls,
+                "total_ms": round(total * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3),
+            })
+        functions.sort(key=lambda function: function["cumulative_ms"], reverse=True)
+
+        # Back in execution order
+        statements = [statement for _, _, statement in sorted(state["statements"], key=lambda entry: entry[1])]
+        return {
+            "id": state["id"],
+            "method": state["method"],
+            "path": state["path"],
+            "endpoint": state["endpoint"],
+            "status": status,
+            "started_at": state["started_at"].isoformat(),
+            "duration_ms": round(duration * 1000, 3),
+            "sql_count": state["sql_count"],
+            "sql_ms": round(state["sql_seconds"] * 1000, 3),
+            "functions": functions[:self.top_functions],
+            "statements": statements,
+            "statements_dropped": state["sql_count"] - len(statements),
+        }
+
+
+def _is_admin():
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+    except Exception:
+        # Invalid tokens are rejected by the view itself
+        return False
+    if identity is None:
+        return False
+
+    user = db.session.get(User, int(identity))
+    return user is not None and bool(user.is_admin)
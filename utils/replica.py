@@ -0,0 +1,195 @@
+import logging
+import math
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app, g, has_app_context, has_request_context, request
+from flask_jwt_extended import get_jwt_identity
+from flask_sqlalchemy.session import Session
+
+logger = logging.getLogger(__name__)
+
+# Endpoints that only read and may be served from the replica bind
+DEFAULT_READ_ENDPOINTS = (
+    "user.get_profile",
+    "transaction.get_transactions",
+    "admin.get_all_users",
+    "admin.get_all_transactions_by_id",
+    "admin.export_users",
+    "admin.export_transactions",
+)
+
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class RoutingSession(Session):
+    """Session that sends the reads of replica-eligible requests to the replica engine.
+
+    Flushes and DML statements always go to the primary, so an object loaded from the
+    replica can still be modified and committed safely. Inside a shard scope,
+    statements on the sharded tables go to the shard instead (see ShardRouter).
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and has_app_context():
+            shards = current_app.extensions.get("shard_router")
+            engine = shards.bind_for(mapper, clause) if shards is not None else None
+            if engine is not None:
+                return engine
+
+        if bind is None and not self._flushing and not _is_write(clause):
+            if _use_replica():
+                return current_app.extensions["replica_router"].engine
+
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+def _is_write(clause):
+    return clause is not None and getattr(clause, "is_dml", False)
+
+
+def _use_replica():
+    """Decide once per request whether reads may go to the replica."""
+    if not has_request_context():
+        return False
+
+    decision = g.get("_use_replica")
+    if decision is None:
+        router = current_app.extensions.get("replica_router")
+        decision = router is not None and router.should_use_replica()
+        # Queries issued before the JWT is verified must not pin the decision,
+        # otherwise the read-your-writes check would be skipped
+        if not decision or _current_identity() is not None:
+            g._use_replica = decision
+    return decision
+
+
+def _current_identity():
+    try:
+        return get_jwt_identity()
+    except RuntimeError:
+        # The JWT has not been verified for this request yet
+        return None
+
+
+class ReplicaRouter:
+    """Routes read-only endpoints to the engine behind ``REPLICA_DATABASE_URL``.
+
+    A user who wrote recently keeps reading from the primary for
+    ``REPLICA_READ_YOUR_WRITES_SECONDS``, and every request falls back to the
+    primary while the replica lags more than ``REPLICA_MAX_LAG_SECONDS``.
+    Recent writers are remembered by the worker that served the write and by
+    the client: the response carries a ``REPLICA_WRITE_COOKIE`` cookie until
+    the window ends, so the next read is kept on the primary whichever worker
+    serves it. Clients that drop cookies only get read-your-writes from the
+    worker that served their write.
+    """
+
+    def __init__(self, app=None):
+        self.engine = None
+        self._recent_writers = {}
+        self._lock = threading.Lock()
+        self._lag = 0.0
+        self._lag_checked_at = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("REPLICA_DATABASE_URL", None)
+        app.config.setdefault("REPLICA_ENGINE_OPTIONS", {})
+        app.config.setdefault("REPLICA_READ_ENDPOINTS", DEFAULT_READ_ENDPOINTS)
+        app.config.setdefault("REPLICA_MAX_LAG_SECONDS", 5.0)
+        app.config.setdefault("REPLICA_LAG_CHECK_INTERVAL", 1.0)
+        app.config.setdefault("REPLICA_READ_YOUR_WRITES_SECONDS", 10.0)
+        app.config.setdefault("REPLICA_WRITE_COOKIE", "recent_write")
+        if app.config["REPLICA_DATABASE_URL"]:
+            self.engine = sa.create_engine(
+                app.config["REPLICA_DATABASE_URL"], **app.config["REPLICA_ENGINE_OPTIONS"]
+            )
+        app.extensions["replica_router"] = self
+        app.after_request(self._track_writes)
+
+    def should_use_replica(self):
+        if self.engine is None:
+            return False
+        if request.method != "GET":
+            return False
+        if request.endpoint not in current_app.config["REPLICA_READ_ENDPOINTS"]:
+            return False
+
+        identity = _current_identity()
+        if identity is not None and self.wrote_recently(identity):
+            return False
+        if _write_cookie_active():
+            return False
+
+        return self.replica_lag() <= current_app.config["REPLICA_MAX_LAG_SECONDS"]
+
+    def mark_write(self, user_id):
+        window = current_app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+        now = time.monotonic()
+        with self._lock:
+            self._recent_writers[str(user_id)] = now + window
+            if len(self._recent_writers) > 10000:
+                self._recent_writers = {
+                    key: until for key, until in self._recent_writers.items() if until > now
+                }
+
+    def wrote_recently(self, user_id):
+        until = self._recent_writers.get(str(user_id))
+        return until is not None and until > time.monotonic()
+
+    def replica_lag(self):
+        """Replication lag in seconds, refreshed at most once per check interval."""
+        now = time.monotonic()
+        interval = current_app.config["REPLICA_LAG_CHECK_INTERVAL"]
+        if self._lag_checked_at is not None and now - self._lag_checked_at < interval:
+            return self._lag
+
+        try:
+            self._lag = _measure_lag(self.engine)
+        except sa.exc.SQLAlchemyError:
+            logger.warning("Replica lag check failed, routing reads to primary", exc_info=True)
+            self._lag = float("inf")
+        self._lag_checked_at = now
+        return self._lag
+
+    def _track_writes(self, response):
+        if request.method in WRITE_METHODS and response.status_code < 400:
+            identity = _current_identity()
+            if identity is not None:
+                self.mark_write(identity)
+                window = current_app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+                # Wall-clock time, the next request may reach another worker or host
+                response.set_cookie(
+                    current_app.config["REPLICA_WRITE_COOKIE"], f"{time.time() + window:.3f}",
+                    max_age=math.ceil(window), httponly=True, samesite="Lax"
+                )
+        return response
+
+
+def _write_cookie_active():
+    """Whether the client wrote within the read-your-writes window, according to its cookie."""
+    value = request.cookies.get(current_app.config["REPLICA_WRITE_COOKIE"])
+    if not value:
+        return False
+    try:
+        until = float(value)
+    except ValueError:
+        return False
+    now = time.time()
+    # A forged value far in the future cannot pin the client to the primary for long
+    return now < until <= now + current_app.config["REPLICA_READ_YOUR_WRITES_SECONDS"]
+
+
+def _measure_lag(engine):
+    if engine.dialect.name != "postgresql":
+        return 0.0
+
+    with engine.connect() as connection:
+        lag = connection.execute(sa.text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        )).scalar()
+    return float(lag or 0.0)
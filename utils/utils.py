@@ -1,3 +1,4 @@
+from datetime import datetime, timezone
 
 def get_currency_symbol(currency: str):
     if currency == "USD":
@@ -5,3 +6,8 @@ def get_currency_symbol(currency: str):
     elif currency == "EUR":
         return "€"
     return ""
+
+
+def utc_now():
+    """Current UTC time as a naive datetime, like the DateTime columns store it."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
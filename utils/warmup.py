@@ -0,0 +1,160 @@
+import logging
+import threading
+import time
+
+import sqlalchemy as sa
+from flask import current_app
+from sqlalchemy.orm import configure_mappers
+
+from models.user import db
+
+logger = logging.getLogger(__name__)
+
+
+class WarmUp:
+    """Pays the first-request costs of a worker before it takes traffic.
+
+    Called at the end of ``create_app``, it configures the mappers, opens
+    ``WARMUP_POOL_CONNECTIONS`` connections per engine (primary, replica,
+    shards), loads the token blocklist and the velocity counters and builds
+    the Swagger spec. ``/health/ready`` answers 503 until this succeeded and
+    retries a failed warm-up, at most once per ``WARMUP_RETRY_SECONDS``, e.g.
+    when the worker started before the database.
+    """
+
+    def __init__(self, app=None, swagger=None):
+        self.status = "pending"
+        self.steps = {}
+        self.duration = None
+        self._attempted_at = None
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app, swagger)
+
+    def init_app(self, app, swagger=None):
+        app.config.setdefault("WARMUP_ENABLED", True)
+        app.config.setdefault("WARMUP_POOL_CONNECTIONS", 5)
+        app.config.setdefault("WARMUP_RETRY_SECONDS", 5.0)
+
+        self.app = app
+        self.swagger = swagger
+        app.extensions["warm_up"] = self
+
+        if app.config["WARMUP_ENABLED"]:
+            self.run()
+        else:
+            self.status = "disabled"
+
+    @property
+    def ready(self):
+        return self.status in ("ready", "disabled")
+
+    def run(self):
+        """Run every step, recording how long each took or why it failed."""
+        if not self._lock.acquire(blocking=False):
+            return
+
+        try:
+            self.status = "warming"
+            self._attempted_at = time.monotonic()
+            started = time.perf_counter()
+            steps = (
+                ("mappers", configure_mappers),
+                ("connections", self._open_connections),
+                ("token_revocation", self._sync_revocations),
+                ("velocity", self._build_velocity_counters),
+                ("swagger", self._build_swagger_spec),
+            )
+            failed = False
+            with self.app.app_context():
+                for name, step in steps:
+                    step_started = time.perf_counter()
+                    try:
+                        step()
+                    except Exception as error:
+                        failed = True
+                        logger.warning("Warm-up step %s failed", name, exc_info=True)
+                        # The details are in the log, the endpoint is public
+                        self.steps[name] = {"ok": False, "error": type(error).__name__}
+                    else:
+                        self.steps[name] = {
+                            "ok": True, "ms": round((time.perf_counter() - step_started) * 1000, 2)
+                        }
+                db.session.remove()
+
+            self.duration = round((time.perf_counter() - started) * 1000, 2)
+            self.status = "failed" if failed else "ready"
+        finally:
+            self._lock.release()
+
+    def retry_if_failed(self):
+        retry_after = current_app.config["WARMUP_RETRY_SECONDS"]
+        if self.status == "failed" and time.monotonic() - self._attempted_at >= retry_after:
+            self.run()
+
+    def report(self):
+        return {
+            "status": self.status,
+            "ready": self.ready,
+            "duration_ms": self.duration,
+            "steps": self.steps,
+        }
+
+    def _open_connections(self):
+        # Checked out together so the pool really holds that many afterwards
+        for engine in engines().values():
+            wanted = current_app.config["WARMUP_POOL_CONNECTIONS"]
+            size = getattr(engine.pool, "size", None)
+            if callable(size):
+                wanted = min(wanted, size())
+
+            connections = []
+            try:
+                for _ in range(max(wanted, 1)):
+                    connection = engine.connect()
+                    connections.append(connection)
+                    connection.execute(sa.text("SELECT 1"))
+            finally:
+                for connection in connections:
+                    connection.close()
+
+    def _sync_revocations(self):
+        revocation = current_app.extensions.get("token_revocation")
+        if revocation is not None:
+            revocation.sync(force=True)
+
+    def _build_velocity_counters(self):
+        limiter = current_app.extensions.get("velocity_limiter")
+        if limiter is not None:
+            limiter.rebuild()
+
+    def _build_swagger_spec(self):
+        if self.swagger is None:
+            return
+        with current_app.test_request_context():
+            for spec in self.swagger.config["specs"]:
+                self.swagger.get_apispecs(spec["endpoint"])
+
+
+def engines():
+    """The engines of this app by name: the primary, and the replica and shards if configured."""
+    named = {"primary": db.engine}
+    replica = current_app.extensions.get("replica_router")
+    if replica is not None and replica.engine is not None:
+        named["replica"] = replica.engine
+    shards = current_app.extensions.get("shard_router")
+    if shards is not None:
+        for shard, engine in enumerate(shards.engines):
+            named[f"shard_{shard}"] = engine
+    return named
+
+
+def pool_stats(engine):
+    """Connection counts of the engine's pool; pools without a fixed size only report their class."""
+    pool = engine.pool
+    stats = {"pool": type(pool).__name__}
+    for name in ("size", "checkedin", "checkedout", "overflow"):
+        counter = getattr(pool, name, None)
+        if callable(counter):
+            stats[name] = counter()
+    return stats